@@ -0,0 +1,98 @@
+"""
+Run a calculate_* function as an anytime search on a background thread.
+
+The exhaustive enumeration publishes the best matrices found so far after every chunk,
+stops when its wall-clock budget runs out or when it is cancelled, and otherwise runs
+to the exact answer. NumPy releases the GIL for the heavy work, so the caller (e.g. the
+Streamlit script thread) stays responsive and can poll latest() while it runs.
+"""
+import threading
+import time
+
+import CandidateEngine
+
+
+class BackgroundSolve:
+    """
+    One calculate_* call running on a daemon thread.
+
+    Example:
+        job = BackgroundSolve(SnSpn.calculate_snspn, 0.85, 0.92, 2000, budget=30)
+        while job.running:
+            show(job.latest())
+            time.sleep(0.5)
+        job.cancel()  # at any point, e.g. once a clear best match has appeared
+    """
+
+    def __init__(self, solve, *args, budget=None, top_k=CandidateEngine.DEFAULT_TOP_K, **kwargs):
+        """
+        Args:
+            solve (callable): calculate_snspn, calculate_ppvnpv or calculate_likelihoodratios
+            *args: Positional arguments for solve (metric values and n)
+            budget (float, optional): Wall-clock seconds before the search stops
+            top_k (int): Best matrices kept and published
+            **kwargs: Other keyword arguments for solve (tolerance, n_pathology, ...)
+        """
+        self.budget = budget
+        self.started = time.monotonic()
+        self.finished = None
+        self.snapshots = 0
+        self.result = None
+        self.error = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._latest = None
+        kwargs.update(method='enumerate', top_k=top_k, budget=budget, cancel=self._cancel,
+                      on_snapshot=self._publish)
+        self._thread = threading.Thread(target=self._run, args=(solve, args, kwargs), daemon=True)
+        self._thread.start()
+
+    def _publish(self, results):
+        with self._lock:
+            self._latest = results
+            self.snapshots += 1
+
+    def _run(self, solve, args, kwargs):
+        try:
+            result = solve(*args, **kwargs)
+            with self._lock:
+                self.result = self._latest = result
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = time.monotonic()
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    def latest(self):
+        """The most recent CandidateResults (the final one once finished), or None."""
+        with self._lock:
+            return self._latest
+
+    def progress(self):
+        """Fraction of the search space scored so far."""
+        latest = self.latest()
+        return latest.summary.get('searched', 0.0) if latest is not None and latest.summary else 0.0
+
+    def status(self):
+        """'running', 'finished', 'cancelled', 'budget' or 'error'."""
+        if self.running:
+            return 'running'
+        if self.error is not None:
+            return 'error'
+        return (self.result.summary or {}).get('stopped') or 'finished'
+
+    def cancel(self):
+        """Ask the search to stop after the current chunk; the best so far is kept."""
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        """Block until the search ends (or timeout); returns the final result or None."""
+        self._thread.join(timeout)
+        return self.result
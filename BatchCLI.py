@@ -0,0 +1,222 @@
+"""
+Batch entry point: solve every row of a study table and stream the top-k matrices to CSV.
+
+Input (CSV, or Parquet when pyarrow is installed) has one study per row:
+    id            optional; the row number is used when the column is missing
+    pair          snspn, ppvnpv or lr (Sn/Sp, PPV/NPV and +LR/-LR are accepted too)
+    value1        first metric of the pair (Sensitivity, PPV or PLR)
+    value2        second metric of the pair (Specificity, NPV or NLR)
+    n             sample size
+    n_pathology   optional; blank means unknown
+    tolerance     optional; defaults to --tolerance
+
+Rows are fanned out to a ProcessPoolExecutor. Each finished row's top-k block is
+written and flushed at once, so a crash keeps every finished row, and a rerun against
+the same output drops any block the crash cut short and skips the complete ones.
+
+    python BatchCLI.py studies.csv results.csv --workers 8 --top-k 10
+"""
+import argparse
+import csv
+import io
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import CandidateEngine
+
+OUTPUT_COLUMNS = ['id', 'pair', 'n', 'n_pathology', 'rank', 'TP', 'TN', 'FP', 'FN',
+                  'Total_Error', 'Exact_Match', 'Error']
+
+PAIR_NAMES = {
+    'snspn': 'snspn', 'sn/sp': 'snspn', 'sensitivity/specificity': 'snspn',
+    'ppvnpv': 'ppvnpv', 'ppv/npv': 'ppvnpv',
+    'lr': 'lr', '+lr/-lr': 'lr', 'plr/nlr': 'lr',
+}
+
+
+def read_table(path):
+    """
+    Load the study table from CSV or Parquet (by file extension).
+    """
+    if str(path).lower().endswith(('.parquet', '.pq')):
+        try:
+            return pd.read_parquet(path)
+        except ImportError as e:
+            raise SystemExit(f"Reading Parquet needs pyarrow: {e}")
+    return pd.read_csv(path)
+
+
+def _optional(value):
+    return None if value is None or (isinstance(value, float) and math.isnan(value)) or value == '' else value
+
+
+def table_rows(table, default_tolerance):
+    """
+    Normalise the table into a list of dicts ready for solve_row.
+    """
+    ids = table['id'] if 'id' in table.columns else pd.Series(range(len(table)))
+    rows = []
+    for row_id, record in zip(ids, table.to_dict('records')):
+        n_pathology = _optional(record.get('n_pathology'))
+        tolerance = _optional(record.get('tolerance'))
+        rows.append({
+            'id': str(row_id),
+            'pair': str(record['pair']).strip().lower(),
+            'values': (float(record['value1']), float(record['value2'])),
+            'n': int(record['n']),
+            'n_pathology': None if n_pathology is None else int(n_pathology),
+            'tolerance': default_tolerance if tolerance is None else float(tolerance),
+        })
+    return rows
+
+
+def _expected_rows(record, top_k):
+    """Rows a complete, error-free block has: top_k, or every matrix when there are fewer."""
+    n_pathology = _optional(record['n_pathology'])
+    space = CandidateEngine.count_candidates(int(record['n']), None if n_pathology is None else int(n_pathology))
+    return min(top_k, space)
+
+
+def resume_output(path, top_k):
+    """
+    Prepare an existing output file for appending and return the ids already finished.
+
+    A study counts as finished only when its whole block is there: an Error row, or
+    every one of its rows. A crash can leave the last block short or the last line cut
+    off, so the file is truncated back to the end of the last complete block (to empty,
+    header included, if even the header is cut off).
+
+    Returns:
+        set: Ids of the complete blocks
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return set()
+    with open(path, 'rb') as f:
+        data = f.read()
+    text = data[:data.rfind(b'\n') + 1].decode('utf-8')
+    consumed = 0
+
+    def lines():
+        nonlocal consumed
+        for line in io.StringIO(text, newline=''):
+            consumed += len(line.encode('utf-8'))
+            yield line
+
+    reader = csv.DictReader(lines())
+    done = set()
+    good_end, block, rows = 0, None, 0
+    for record in reader:
+        if block is None or record['id'] != block['id']:
+            block, rows = record, 0
+        rows += 1
+        if record['Error'] or rows == _expected_rows(record, top_k):
+            done.add(record['id'])
+            good_end, block = consumed, None
+    if reader.fieldnames is not None and not good_end:
+        # Only the header survived (or nothing after it is complete); keep the header.
+        good_end = len(text.split('\n', 1)[0].encode('utf-8')) + 1
+    if good_end != len(data):
+        with open(path, 'r+b') as f:
+            f.truncate(good_end)
+    return done
+
+
+def solve_row(row, method='margin', top_k=CandidateEngine.DEFAULT_TOP_K, index_path=None):
+    """
+    Solve one study row. Runs in a worker process.
+
+    Returns:
+        list: Output records (dicts keyed by OUTPUT_COLUMNS), best first; a single
+        record with 'Error' set if the row could not be solved
+    """
+    base = {'id': row['id'], 'pair': row['pair'], 'n': row['n'], 'n_pathology': row['n_pathology']}
+    try:
+        pair = PAIR_NAMES.get(row['pair'])
+        if pair is None:
+            raise ValueError(f"Unknown pair: {row['pair']!r}")
+        results = CandidateEngine.solve_pair(pair, row['values'], row['n'], tolerance=row['tolerance'],
+                                             n_pathology=row['n_pathology'], method=method, top_k=top_k,
+                                             index_path=index_path)
+    except Exception as e:
+        return [dict(base, Error=f"{type(e).__name__}: {e}")]
+    tp, tn, fp, fn = results.counts()
+    total = results['Total_Error']
+    exact = results['Exact_Match']
+    return [dict(base, rank=i + 1, TP=int(tp[i]), TN=int(tn[i]), FP=int(fp[i]), FN=int(fn[i]),
+                 Total_Error=float(total[i]), Exact_Match=bool(exact[i]))
+            for i in range(len(results))]
+
+
+def _solve(args):
+    return solve_row(*args)
+
+
+def run_batch(input_path, output_path, workers=None, chunk_size=1, method='margin',
+              top_k=CandidateEngine.DEFAULT_TOP_K, tolerance=1e-6, index_path=None, resume=True):
+    """
+    Solve every row of input_path and append the results to output_path.
+
+    Args:
+        input_path (str): Study table (.csv, or .parquet with pyarrow installed)
+        output_path (str): CSV to append to; created with a header if missing
+        workers (int, optional): Worker processes (os.cpu_count() by default; 0 runs inline)
+        chunk_size (int): Rows handed to a worker at a time
+        method (str): Solver method passed to CandidateEngine.solve_pair
+        top_k (int): Matrices written per row
+        tolerance (float): Exact-match tolerance for rows without their own
+        index_path (str, optional): RationalIndex directory for method='index'
+        resume (bool): Skip ids already in output_path
+
+    Returns:
+        tuple: (rows solved, rows skipped)
+    """
+    rows = table_rows(read_table(input_path), tolerance)
+    done = resume_output(output_path, top_k) if resume else set()
+    pending = [row for row in rows if row['id'] not in done]
+    jobs = [(row, method, top_k, index_path) for row in pending]
+
+    new_file = not os.path.exists(output_path) or os.path.getsize(output_path) == 0 or not resume
+    with open(output_path, 'w' if new_file else 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=OUTPUT_COLUMNS)
+        if new_file:
+            writer.writeheader()
+            f.flush()
+
+        def write(records):
+            writer.writerows(records)
+            f.flush()
+            os.fsync(f.fileno())
+
+        if workers == 0:
+            for job in jobs:
+                write(_solve(job))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for records in pool.map(_solve, jobs, chunksize=max(1, chunk_size)):
+                    write(records)
+    return len(pending), len(rows) - len(pending)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estimate confusion matrices for a table of studies.")
+    parser.add_argument('input', help="Study table (.csv or .parquet)")
+    parser.add_argument('output', help="Output CSV (appended to and resumed from)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores, 0: inline)")
+    parser.add_argument('--chunk-size', type=int, default=1, help="Rows sent to a worker at a time")
+    parser.add_argument('--method', default='margin', choices=['margin', 'enumerate', 'index'])
+    parser.add_argument('--top-k', type=int, default=CandidateEngine.DEFAULT_TOP_K)
+    parser.add_argument('--tolerance', type=float, default=1e-6)
+    parser.add_argument('--index', dest='index_path', default=None, help="RationalIndex directory for --method index")
+    parser.add_argument('--no-resume', dest='resume', action='store_false', help="Overwrite output instead of resuming")
+    args = parser.parse_args(argv)
+    solved, skipped = run_batch(args.input, args.output, args.workers, args.chunk_size, args.method,
+                                args.top_k, args.tolerance, args.index_path, args.resume)
+    print(f"Solved {solved} rows ({skipped} already in {args.output})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Offline benchmark and regression suite for calculate_snspn, calculate_ppvnpv and
+calculate_likelihoodratios.
+
+Sweeps n (10 to 10,000 where a method is feasible), with and without n_pathology,
+over typical and edge regimes (Sn/Sp of 0 or 1, infinite likelihood ratios, no exact
+match). Every run records wall time, tracemalloc peak memory, the matrices evaluated
+per second (from Instrumentation) and the phase timings. For small n, every method's
+top-k (rows and Total_Error) is also checked against the nested-loop reference
+(backend='python'); for method 'rounded' the reference is first cut to the matrices
+that round to the targets. 'parallel' runs the sharded enumeration of ParallelSolver
+directly, below the size at which solve_pair would switch to it. Results are saved as
+JSON so runs can be compared:
+
+    python Benchmarks.py --out bench.json
+    python Benchmarks.py --out new.json --compare bench.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+import CandidateEngine
+import Instrumentation
+import LikelihoodRatios
+import PPVNPV
+import SnSpn
+from CountsToMetrics import PROPORTIONS
+
+SOLVERS = {
+    'snspn': lambda targets, n, **kw: SnSpn.calculate_snspn(*targets, n, show_progress=False, **kw),
+    'ppvnpv': lambda targets, n, **kw: PPVNPV.calculate_ppvnpv(*targets, n, **kw),
+    'lr': lambda targets, n, **kw: LikelihoodRatios.calculate_likelihoodratios(*targets, n, **kw),
+}
+
+# (pair, regime, targets)
+CASES = [
+    ('snspn', 'typical', (0.85, 0.92)),
+    ('snspn', 'perfect', (1.0, 1.0)),
+    ('snspn', 'zero_one', (0.0, 1.0)),
+    ('snspn', 'no_exact', (0.8333337, 0.7777771)),
+    ('ppvnpv', 'typical', (0.8, 0.95)),
+    ('ppvnpv', 'perfect', (1.0, 1.0)),
+    ('ppvnpv', 'no_exact', (0.6180339, 0.4142135)),
+    ('lr', 'typical', (4.2, 0.31)),
+    ('lr', 'infinite_plr', (float('inf'), 0.2)),
+    ('lr', 'zero_nlr', (3.0, 0.0)),
+    ('lr', 'no_exact', (2.7182818, 0.3678794)),
+]
+
+SIZES = [10, 30, 100, 300, 1000, 3000, 10000]
+
+# Largest n each method is run at by default (the enumeration grows as n^3, the LR
+# margin solver as n^2 without n_pathology).
+MAX_N = {'enumerate': 300, 'numba': 1000, 'margin': 10000, 'index': 10000, 'pruned': 300, 'rounded': 1000,
+         'parallel': 300}
+MAX_N_LR_MARGIN = 3000
+REFERENCE_MAX_N = 20
+TOP_K = 10
+PARALLEL_WORKERS = 4
+METHODS = ['enumerate', 'margin', 'index', 'numba', 'pruned', 'rounded', 'parallel']
+
+
+def measure(func):
+    """
+    Run func once under tracemalloc.
+
+    Returns:
+        tuple: (result, wall seconds, peak bytes)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func()
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+def top_k_rows(results, k=TOP_K):
+    """The first k (tp, tn, fp, fn, Total_Error) rows of a CandidateResults."""
+    head = results.take(slice(0, k))
+    return np.column_stack(head.counts() + (head['Total_Error'],)).tolist()
+
+
+def reported_decimals(value):
+    """Decimals a target is written with (0.85 -> 2), i.e. the rounding of a published value."""
+    return len(repr(float(value)).partition('.')[2])
+
+
+def rounded_reference(pair, targets, reference):
+    """The reference rows whose metrics round to the targets, in reference order."""
+    import RoundedSolver
+    keep = np.ones(len(reference), dtype=bool)
+    for label, target in zip(CandidateEngine.PAIRS[pair], targets):
+        report = RoundedSolver.Reported(target, reported_decimals(target))
+        keep &= report.matches(*PROPORTIONS[label](*reference.counts()))
+    return reference.take(keep)
+
+
+def method_options(method, index_path, targets):
+    if method == 'index':
+        return {'method': 'index', 'index_path': index_path, 'top_k': TOP_K}
+    if method == 'numba':
+        return {'method': 'enumerate', 'backend': 'numba', 'top_k': TOP_K}
+    if method == 'rounded':
+        return {'method': 'rounded', 'top_k': TOP_K, 'decimals': tuple(reported_decimals(t) for t in targets)}
+    return {'method': method, 'top_k': TOP_K}
+
+
+def feasible(method, pair, n, n_pathology, max_n, index_n_max):
+    if n > max_n[method]:
+        return False
+    if method == 'margin' and pair == 'lr' and n_pathology is None and n > MAX_N_LR_MARGIN:
+        return False
+    if method == 'index' and (index_n_max is None or n > index_n_max):
+        return False
+    if method == 'rounded' and pair not in ('snspn', 'ppvnpv'):
+        return False
+    if method == 'numba':
+        import JitKernels
+        return JitKernels.AVAILABLE
+    return True
+
+
+def run_suite(sizes=SIZES, methods=('enumerate', 'margin'), max_n=None, index_path=None,
+              reference_max_n=REFERENCE_MAX_N, workers=PARALLEL_WORKERS, log=print):
+    """
+    Run every feasible (case, n, n_pathology, method) combination; 'parallel' uses
+    workers processes.
+
+    Returns:
+        dict: {'meta': ..., 'runs': [...], 'parity': [...]}
+    """
+    max_n = dict(MAX_N, **(max_n or {}))
+    index_n_max = None
+    if index_path is not None:
+        import RationalIndex
+        index_n_max = RationalIndex.load_index(str(index_path)).n_max
+    runs, parity = [], []
+    for pair, regime, targets in CASES:
+        for n in sizes:
+            for n_pathology in (None, n // 3):
+                reference = None
+                if n <= reference_max_n:
+                    reference = SOLVERS[pair](targets, n, n_pathology=n_pathology, backend='python')
+                space = CandidateEngine.count_candidates(n, n_pathology)
+                for method in methods:
+                    if not feasible(method, pair, n, n_pathology, max_n, index_n_max):
+                        continue
+                    instrumentation = Instrumentation.Instrumentation()
+                    if method == 'parallel':
+                        import ParallelSolver
+                        results, seconds, peak = measure(
+                            lambda: ParallelSolver.solve_parallel(pair, targets, n, n_pathology=n_pathology,
+                                                                  top_k=TOP_K, workers=workers,
+                                                                  instrumentation=instrumentation))
+                    else:
+                        options = method_options(method, index_path, targets)
+                        results, seconds, peak = measure(
+                            lambda: SOLVERS[pair](targets, n, n_pathology=n_pathology,
+                                                  instrumentation=instrumentation, **options))
+                    stats = instrumentation.as_dict()
+                    run = {
+                        'pair': pair, 'regime': regime, 'targets': [str(t) for t in targets], 'n': n,
+                        'n_pathology': n_pathology, 'method': method, 'seconds': seconds,
+                        'peak_bytes': peak, 'search_space': space,
+                        'search_space_per_sec': space / seconds if seconds > 0 else None,
+                        'evaluated': stats['counters']['evaluated'],
+                        'evaluated_per_sec': stats['counters']['evaluated'] / seconds if seconds > 0 else None,
+                        'phases': stats['timings'],
+                        'best_error': float(results['Total_Error'][0]) if len(results) else None,
+                    }
+                    runs.append(run)
+                    log(f"{pair:7s} {regime:13s} n={n:<6d} P={str(n_pathology):6s} {method:9s} "
+                        f"{seconds * 1e3:10.2f} ms {peak / 2**20:9.2f} MiB")
+                    if reference is not None:
+                        expected = rounded_reference(pair, targets, reference) if method == 'rounded' else reference
+                        match = top_k_rows(results) == top_k_rows(expected)
+                        parity.append({'pair': pair, 'regime': regime, 'n': n, 'n_pathology': n_pathology,
+                                       'method': method, 'match': match,
+                                       'exact_matches': int(np.sum(results['Exact_Match'][:TOP_K]))})
+                        if not match:
+                            log(f"  PARITY MISMATCH vs reference: {pair} {regime} n={n} P={n_pathology} {method}")
+    return {'meta': environment(), 'runs': runs, 'parity': parity}
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'commit': commit,
+            'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform()}
+
+
+def compare(current, previous, log=print):
+    """
+    Print the speed ratio (previous / current wall time) of every run present in both.
+    """
+    def key(run):
+        return run['pair'], run['regime'], run['n'], run['n_pathology'], run['method']
+
+    before = {key(run): run for run in previous['runs']}
+    for run in current['runs']:
+        old = before.get(key(run))
+        if old and run['seconds'] > 0:
+            log(f"{' '.join(str(k) for k in key(run)):50s} {old['seconds'] / run['seconds']:6.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the confusion matrix solvers.")
+    parser.add_argument('--out', default='bench.json', help="JSON file to write")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--methods', nargs='+', default=['enumerate', 'margin'], choices=METHODS)
+    parser.add_argument('--max-enumerate-n', type=int, default=MAX_N['enumerate'])
+    parser.add_argument('--index', dest='index_path', default=None, help="RationalIndex directory for --methods index")
+    parser.add_argument('--workers', type=int, default=PARALLEL_WORKERS, help="Processes for --methods parallel")
+    parser.add_argument('--compare', default=None, help="Earlier JSON to compare against")
+    args = parser.parse_args(argv)
+    report = run_suite(args.sizes, args.methods, {'enumerate': args.max_enumerate_n}, args.index_path,
+                       workers=args.workers)
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=1)
+    failures = [p for p in report['parity'] if not p['match']]
+    print(f"{len(report['runs'])} runs, {len(report['parity'])} parity checks, {len(failures)} mismatches -> {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
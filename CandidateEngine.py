@@ -0,0 +1,488 @@
+"""
+Vectorized candidate engine shared by calculate_snspn, calculate_ppvnpv and
+calculate_likelihoodratios.
+
+Instead of walking (n+1)^4 tuples and discarding the ones that do not sum to n,
+only the valid simplex points (tp + tn + fp + fn = n, and tp + fn = n_pathology
+when given) are generated, as NumPy arrays, and scored in bulk.
+"""
+import inspect
+import time
+
+import numpy as np
+import CountsToMetrics
+import Instrumentation
+from CandidateResults import CandidateResults, count_dtype
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+DEFAULT_TOP_K = 10
+RESERVOIR_SIZE = 100_000
+
+
+# Vectorized metric definitions (from CountsToMetrics), keyed by the label used in the
+# result columns (Calculated_<label>, <label>_Error).
+METRICS = {
+    'Sensitivity': CountsToMetrics.sensitivity,
+    'Specificity': CountsToMetrics.specificity,
+    'PPV': CountsToMetrics.ppv,
+    'NPV': CountsToMetrics.npv,
+    'PLR': CountsToMetrics.positive_likelihood_ratio,
+    'NLR': CountsToMetrics.negative_likelihood_ratio,
+    'Prevalence': CountsToMetrics.prevalence,
+    'Accuracy': CountsToMetrics.accuracy,
+}
+
+# Metric pair inverted by each solver module.
+PAIRS = {
+    'snspn': ('Sensitivity', 'Specificity'),
+    'ppvnpv': ('PPV', 'NPV'),
+    'lr': ('PLR', 'NLR'),
+}
+
+
+def ragged_arange(starts, stops):
+    """
+    Concatenation of arange(start, stop) for every (start, stop) pair, without a Python loop.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    lengths = np.asarray(stops, dtype=np.int64) - starts
+    before = np.cumsum(lengths) - lengths
+    return np.arange(lengths.sum(), dtype=np.int64) + np.repeat(starts - before, lengths)
+
+
+def count_candidates(n, n_pathology=None):
+    """
+    Number of valid confusion matrices for n (and n_pathology, if given).
+    """
+    if n_pathology is None:
+        return (n + 1) * (n + 2) * (n + 3) // 6 if n >= 0 else 0
+    if not 0 <= n_pathology <= n:
+        return 0
+    return (n_pathology + 1) * (n - n_pathology + 1)
+
+
+def _iter_rows(n, n_pathology=None, tps=None):
+    """
+    Yield (tp, tn, fp_lo, fp_hi) row arrays, one batch per tp, in nested-loop order.
+    Every row stands for the matrices with that tp and tn and fp in [fp_lo, fp_hi].
+    tps restricts the search to the given ascending tp values (one shard of it).
+    """
+    if n_pathology is None:
+        for tp in (range(n + 1) if tps is None else tps):
+            tn = np.arange(n - tp + 1, dtype=np.int64)
+            yield np.full_like(tn, tp), tn, np.zeros_like(tn), n - tp - tn
+    elif 0 <= n_pathology <= n:
+        n_healthy = n - n_pathology
+        tn = np.arange(n_healthy + 1, dtype=np.int64)
+        fp = n_healthy - tn
+        for tp in (range(n_pathology + 1) if tps is None else tps):
+            yield np.full_like(tn, tp), tn, fp, fp
+
+
+def iter_row_chunks(rows, chunk_size):
+    """
+    Regroup batches of (a, b, lo, hi) row arrays, where each row stands for hi - lo + 1
+    matrices, so that each yielded group expands to about chunk_size matrices.
+    """
+    pending, pending_size = [], 0
+    for batch in rows:
+        cum = np.cumsum(batch[3] - batch[2] + 1)
+        start = 0
+        while start < len(cum):
+            base = cum[start - 1] if start else 0
+            stop = int(np.searchsorted(cum, base + chunk_size - pending_size, side='right'))
+            if stop == start and not pending:
+                stop = start + 1
+            if stop > start:
+                pending.append(tuple(a[start:stop] for a in batch))
+                pending_size += int(cum[stop - 1] - base)
+                start = stop
+            if start < len(cum) or pending_size >= chunk_size:
+                yield tuple(np.concatenate(cols) for cols in zip(*pending))
+                pending, pending_size = [], 0
+    if pending:
+        yield tuple(np.concatenate(cols) for cols in zip(*pending))
+
+
+def iter_candidate_chunks(n, n_pathology=None, chunk_size=DEFAULT_CHUNK_SIZE, tps=None):
+    """
+    Yield (tp, tn, fp, fn) int64 arrays covering every valid matrix exactly once,
+    in the same (tp, tn, fp) order as the original nested loops (only the given tp
+    values if tps is set).
+    """
+    for tp, tn, fp_lo, fp_hi in iter_row_chunks(_iter_rows(n, n_pathology, tps), chunk_size):
+        lengths = fp_hi - fp_lo + 1
+        tp = np.repeat(tp, lengths)
+        tn = np.repeat(tn, lengths)
+        fp = ragged_arange(fp_lo, fp_hi + 1)
+        yield tp, tn, fp, n - tp - tn - fp
+
+
+def score_candidates(labels, targets, tp, tn, fp, fn):
+    """
+    Compute the calculated metrics, their absolute errors and the total error for arrays of counts.
+
+    Returns:
+        tuple: (list of calculated arrays, list of error arrays, total error array)
+    """
+    calcs = [METRICS[label](tp, tn, fp, fn) for label in labels]
+    errors = [CountsToMetrics.metric_error(target, calc) for target, calc in zip(targets, calcs)]
+    total = errors[0]
+    for error in errors[1:]:
+        total = total + error
+    return calcs, errors, total
+
+
+def rank_order(total, tp, tn, fp):
+    """
+    Indices that sort matrices by Total_Error, breaking ties by (tp, tn, fp), i.e. by
+    nested-loop order. Every solver mode ranks with this key so their results agree.
+    """
+    return np.lexsort((fp, tn, tp, total))
+
+
+def top_k_order(total, tp, tn, fp, k):
+    """
+    Indices of the k best rows by rank_order, best first. Merging several top-k lists
+    with it (shards, index buckets) gives the same rows as one search over their union.
+    """
+    if len(total) > k:
+        # Cheap preselection; ties at the k-th error (and NaNs) are kept for the exact sort.
+        kth = np.partition(total, k - 1)[k - 1]
+        keep = np.flatnonzero(~(total > kth))
+        return keep[rank_order(total[keep], tp[keep], tn[keep], fp[keep])[:k]]
+    return rank_order(total, tp, tn, fp)
+
+
+def top_k_candidates(labels, targets, tp, tn, fp, fn, k):
+    """
+    Keep the k best matrices (by rank_order) out of the given arrays.
+
+    Returns:
+        tuple: (tp, tn, fp, fn) arrays of at most k rows, best first
+    """
+    _, _, total = score_candidates(labels, targets, tp, tn, fp, fn)
+    order = top_k_order(total, tp, tn, fp, k)
+    return tp[order], tn[order], fp[order], fn[order]
+
+
+class TopK:
+    """
+    Bounded buffer of the k best matrices seen so far (by rank_order).
+
+    Each pushed chunk is merged with the current best and cut back to k rows, so memory
+    stays O(k + chunk) however many matrices stream through.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.columns = tuple(np.zeros(0, dtype=dtype) for dtype in (np.int64,) * 4 + (np.float64,))
+
+    def push(self, tp, tn, fp, fn, total):
+        tp, tn, fp, fn, total = (np.concatenate(pair) for pair in zip(self.columns, (tp, tn, fp, fn, total)))
+        order = top_k_order(total, tp, tn, fp, self.k)
+        self.columns = (tp[order], tn[order], fp[order], fn[order], total[order])
+
+    def counts(self):
+        """(tp, tn, fp, fn) arrays of the best matrices, best first."""
+        return self.columns[:4]
+
+
+class RunningSummary:
+    """
+    Running aggregates of Total_Error over every scored matrix: count, exact-match count,
+    min, mean and median. The median comes from a fixed-size uniform reservoir sample,
+    so it is exact up to reservoir_size matrices and approximate beyond that.
+    """
+
+    def __init__(self, tolerance, reservoir_size=RESERVOIR_SIZE, seed=0):
+        self.tolerance = tolerance
+        self.count = 0
+        self.exact_matches = 0
+        self.min = np.inf
+        self._sum = 0.0
+        self._finite_count = 0
+        self._seen = 0
+        self._reservoir = np.empty(reservoir_size)
+        self._rng = np.random.default_rng(seed)
+
+    @classmethod
+    def from_aggregates(cls, tolerance, count, exact_matches, minimum, total_sum, finite_count, reservoir, seen):
+        """
+        A summary of aggregates kept elsewhere in the same way (JitKernels' fused pass):
+        counts over every matrix, min, sum and count over the non-nan errors, and a
+        reservoir sample of the first `seen` of those.
+        """
+        summary = cls(tolerance, reservoir_size=len(reservoir))
+        summary.count = int(count)
+        summary.exact_matches = int(exact_matches)
+        summary.min = float(minimum)
+        summary._sum = float(total_sum)
+        summary._finite_count = int(finite_count)
+        summary._seen = int(seen)
+        summary._reservoir = reservoir
+        return summary
+
+    def update(self, total):
+        self.count += len(total)
+        self.exact_matches += int(np.count_nonzero(total <= self.tolerance))
+        total = total[~np.isnan(total)]
+        if not len(total):
+            return
+        self.min = min(self.min, float(total.min()))
+        self._sum += float(total.sum())
+        self._finite_count += len(total)
+        # Algorithm R, vectorized: item i replaces a random slot with probability size / (i + 1).
+        size = len(self._reservoir)
+        fill = max(0, min(size - self._seen, len(total)))
+        self._reservoir[self._seen:self._seen + fill] = total[:fill]
+        index = self._seen + np.arange(fill, len(total))
+        slots = self._rng.integers(0, index + 1)
+        chosen = slots < size
+        self._reservoir[slots[chosen]] = total[fill:][chosen]
+        self._seen += len(total)
+
+    def merge(self, other):
+        """
+        Fold in the summary of a disjoint set of matrices (e.g. another shard). The merged
+        reservoir takes a hypergeometric share from each side, so it is still a uniform
+        sample of the union.
+        """
+        self.count += other.count
+        self.exact_matches += other.exact_matches
+        self.min = min(self.min, other.min)
+        self._sum += other._sum
+        self._finite_count += other._finite_count
+        size = len(self._reservoir)
+        mine = self._reservoir[:min(self._seen, size)]
+        theirs = other._reservoir[:min(other._seen, len(other._reservoir))]
+        if self._seen + other._seen <= size:
+            merged = np.concatenate([mine, theirs])
+        else:
+            take = self._rng.hypergeometric(self._seen, other._seen, size)
+            merged = np.concatenate([self._rng.choice(mine, min(take, len(mine)), replace=False),
+                                     self._rng.choice(theirs, min(size - take, len(theirs)), replace=False)])
+        self._reservoir[:len(merged)] = merged
+        self._seen += other._seen
+
+    def as_dict(self):
+        sample = self._reservoir[:min(self._seen, len(self._reservoir))]
+        return {
+            'count': self.count,
+            'exact_matches': self.exact_matches,
+            'min': self.min if self._seen else np.nan,
+            'mean': self._sum / self._finite_count if self._finite_count else np.nan,
+            'median': float(np.median(sample)) if len(sample) else np.nan,
+            'median_exact': self._seen <= len(self._reservoir),
+        }
+
+
+def build_results(labels, targets, tp, tn, fp, fn, tolerance, n, total=None,
+                  error_dtype=np.float64, summary=None):
+    """
+    Rank the given matrices (scoring them unless total is given) and wrap them in a
+    CandidateResults sorted by Total_Error, ties in nested-loop order.
+    """
+    if total is None:
+        _, _, total = score_candidates(labels, targets, tp, tn, fp, fn)
+    order = rank_order(total, tp, tn, fp)
+    return CandidateResults(labels, targets, [METRICS[label] for label in labels],
+                            tp[order], tn[order], fp[order], fn[order], total[order],
+                            tolerance=tolerance, n=n, error_dtype=error_dtype, summary=summary)
+
+
+def check_reference_options(**options):
+    """
+    Raise ValueError unless every given solve_pair option is at its default: the
+    nested-loop reference (backend='python') scores every matrix and supports none of them.
+    """
+    defaults = inspect.signature(solve_pair).parameters
+    unsupported = sorted(name for name, value in options.items()
+                         if not (value is defaults[name].default or value == defaults[name].default))
+    if unsupported:
+        raise ValueError(f"backend='python' does not support: {', '.join(unsupported)}")
+
+
+def reference_results(pair, targets, frame, tolerance, n):
+    """
+    Wrap a nested-loop reference DataFrame in a CandidateResults, keeping its row order.
+    """
+    labels = PAIRS[pair]
+    counts = [frame[name].to_numpy(dtype=np.int64) for name in CountsToMetrics.COUNT_COLUMNS]
+    total = frame['Total_Error'].to_numpy(dtype=np.float64)
+    return CandidateResults(labels, targets, [METRICS[label] for label in labels], *counts, total,
+                            tolerance=tolerance, n=n)
+
+
+def solve_pair(pair, targets, n, tolerance=1e-6, n_pathology=None, show_progress=False,
+               chunk_size=DEFAULT_CHUNK_SIZE, method='enumerate', top_k=None,
+               error_dtype=np.float64, index_path=None, instrumentation=None, budget=None, cancel=None,
+               on_snapshot=None, workers=1, decimals=None, backend='numpy'):
+    """
+    Solve one metric pair and return the ranked candidates.
+
+    method='enumerate' scores every valid matrix; with top_k it streams them through a
+    bounded TopK buffer, so memory stays constant in n. Either way results.summary
+    holds the RunningSummary of all of them (count, exact matches, min, mean, median).
+    method='margin' uses MarginSolver to find only the top_k best (DEFAULT_TOP_K if not
+    given) in about O(n) time per margin; it has no summary.
+    method='index' answers from a RationalIndex directory (index_path): the top_k nearest
+    matrices, or every exact match when top_k is None; it has no summary either.
+    method='pruned' is a branch-and-bound enumeration (PrunedSolver): subtrees whose
+    error lower bound cannot reach the top_k, or the tolerance when top_k is None (then
+    only exact matches are returned), are skipped; summary['pruned'] is the fraction of
+    the space skipped.
+    method='rounded' treats the targets as published values rounded to decimals and
+    returns every matrix whose metrics round to them (RoundedSolver; not for 'lr').
+
+    The enumeration is an anytime search: it stops at the end of the current chunk once
+    cancel is set or budget seconds have passed, returning the best matrices found so far
+    with summary['stopped'] = 'cancelled' or 'budget' (None when it ran to the end) and
+    summary['searched'] the fraction of the space scored. With top_k, on_snapshot receives
+    the best-so-far CandidateResults after every chunk.
+
+    Args:
+        pair (str): Key into PAIRS ('snspn', 'ppvnpv' or 'lr')
+        targets (tuple): Target values for the two metrics of the pair
+        n (int): Total number of samples
+        tolerance (float): Total error at or below which a row is an exact match
+        n_pathology (int, optional): Fixes tp + fn
+        show_progress (bool): Show a tqdm bar over the matrices
+        chunk_size (int): Matrices generated per NumPy batch
+        method (str): 'enumerate', 'margin', 'index', 'pruned' or 'rounded'
+        top_k (int, optional): Only keep the top_k best rows
+        error_dtype: np.float64 or np.float32 for the stored Total_Error; with float32
+            the full enumeration also ranks on the rounded errors
+        index_path (str or Path, optional): Index directory for method='index'
+        instrumentation (Instrumentation, optional): Collects phase timings and counters;
+            the margin and index searches are charged to 'evaluate' as a whole
+        budget (float, optional): Wall-clock seconds for method='enumerate'
+        cancel (threading.Event, optional): Stops method='enumerate' once set
+        on_snapshot (callable, optional): Called with the best-so-far results (needs top_k)
+        workers (int): Processes for ParallelSolver (None or 0: one per core); queries
+            too small to benefit, and anytime runs, stay serial
+        backend (str): 'numba' runs a top_k enumeration (float64 errors, not anytime) in
+            JitKernels' fused compiled pass when Numba is installed; otherwise, and for
+            'numpy', the NumPy path is used
+        decimals (int or tuple, optional): Decimals the targets were reported to, for
+            method='rounded' (one for both, or one per metric); Exact_Match then means
+            consistent with the rounding and tolerance is not used
+
+    Returns:
+        CandidateResults: Same columns as the nested-loop solvers, sorted by Total_Error
+    """
+    labels = PAIRS[pair]
+    if instrumentation is None:
+        instrumentation = Instrumentation.NULL
+        if show_progress:
+            instrumentation = Instrumentation.Instrumentation(progress=Instrumentation.tqdm_progress())
+    if method in ('margin', 'index') and top_k is not None and not np.all(np.isfinite(targets)):
+        # Matrices that miss an infinite target all score inf and rank by the tie-breaks
+        # alone, which the windowed searches cannot see; stream the enumeration instead.
+        method = 'enumerate'
+    if workers != 1 and budget is None and cancel is None and on_snapshot is None:
+        import ParallelSolver
+        workers = ParallelSolver.resolve_workers(workers)
+        if ParallelSolver.should_parallelize(method, pair, n, n_pathology, top_k, workers):
+            results = ParallelSolver.solve_parallel(pair, targets, n, tolerance, n_pathology, method,
+                                                    top_k or DEFAULT_TOP_K, workers, chunk_size, error_dtype,
+                                                    instrumentation)
+            instrumentation.finish(count_candidates(n, n_pathology), len(results))
+            return results
+    if method == 'margin':
+        import MarginSolver
+        with instrumentation.phase('evaluate'):
+            best = MarginSolver.solve_margins(pair, targets, n, n_pathology, top_k or DEFAULT_TOP_K,
+                                              instrumentation=instrumentation)
+        with instrumentation.phase('materialize'):
+            results = build_results(labels, targets, *best, tolerance, n, error_dtype=error_dtype)
+    elif method == 'index':
+        if index_path is None:
+            raise ValueError("method='index' needs index_path (see RationalIndex.build_index)")
+        import RationalIndex
+        with instrumentation.phase('evaluate'):
+            results = RationalIndex.query_pair(pair, targets, n, index_path, tolerance, n_pathology, top_k,
+                                               error_dtype=error_dtype, instrumentation=instrumentation)
+    elif method == 'pruned':
+        import PrunedSolver
+        results = PrunedSolver.solve_pruned(pair, targets, n, tolerance, n_pathology, top_k, chunk_size,
+                                            error_dtype, instrumentation)
+    elif method == 'rounded':
+        if decimals is None:
+            raise ValueError("method='rounded' needs decimals")
+        import RoundedSolver
+        if not isinstance(decimals, int):
+            decimals = dict(zip(labels, decimals))
+        with instrumentation.phase('evaluate'):
+            results = RoundedSolver.solve_rounded(dict(zip(labels, targets)), decimals, n, n_pathology, top_k,
+                                                  chunk_size, error_dtype, instrumentation)
+    elif method == 'enumerate':
+        if (backend == 'numba' and top_k is not None and np.dtype(error_dtype) == np.float64
+                and budget is None and cancel is None and on_snapshot is None and _jit_available()):
+            import JitKernels
+            with instrumentation.phase('evaluate'):
+                results = JitKernels.solve_top_k(pair, targets, n, tolerance, n_pathology, top_k)
+            instrumentation.count('evaluated', results.summary['count'])
+        else:
+            results = _enumerate_pair(labels, targets, n, tolerance, n_pathology, chunk_size, top_k,
+                                      error_dtype, instrumentation, budget, cancel, on_snapshot)
+    else:
+        raise ValueError(f"Unknown method: {method!r}")
+    instrumentation.finish(count_candidates(n, n_pathology), len(results))
+    return results
+
+
+def _jit_available():
+    import JitKernels
+    return JitKernels.AVAILABLE
+
+
+def _enumerate_pair(labels, targets, n, tolerance, n_pathology, chunk_size, top_k, error_dtype,
+                    instrumentation, budget=None, cancel=None, on_snapshot=None):
+    """
+    method='enumerate' of solve_pair: score every valid matrix, chunk by chunk, stopping
+    early when cancel is set or the budget runs out.
+    """
+    if on_snapshot is not None and top_k is None:
+        raise ValueError("on_snapshot needs top_k")
+    deadline = None if budget is None else time.monotonic() + budget
+    stopped = None
+    space = count_candidates(n, n_pathology)
+    summary = RunningSummary(tolerance)
+    best = TopK(top_k) if top_k is not None else None
+    compact = count_dtype(n)
+    parts = []
+    done = 0
+    for tp, tn, fp, fn in instrumentation.timed('enumerate', iter_candidate_chunks(n, n_pathology, chunk_size)):
+        with instrumentation.phase('evaluate'):
+            _, _, total = score_candidates(labels, targets, tp, tn, fp, fn)
+        instrumentation.count('evaluated', len(tp))
+        with instrumentation.phase('rank'):
+            summary.update(total)
+            if best is not None:
+                best.push(tp, tn, fp, fn, total)
+            else:
+                parts.append(tuple(a.astype(compact) for a in (tp, tn, fp, fn)) + (total.astype(error_dtype),))
+        done += len(tp)
+        instrumentation.progress(done, space)
+        if on_snapshot is not None:
+            snapshot = dict(summary.as_dict(), stopped=None, searched=done / space)
+            on_snapshot(build_results(labels, targets, *best.columns[:4], tolerance, n, total=best.columns[4],
+                                      error_dtype=error_dtype, summary=snapshot))
+        if cancel is not None and cancel.is_set():
+            stopped = 'cancelled'
+        elif deadline is not None and time.monotonic() > deadline:
+            stopped = 'budget'
+        if stopped:
+            break
+    with instrumentation.phase('materialize'):
+        if best is not None:
+            tp, tn, fp, fn, total = best.columns
+        elif parts:
+            tp, tn, fp, fn, total = (np.concatenate(cols) for cols in zip(*parts))
+        else:
+            tp = tn = fp = fn = np.zeros(0, dtype=compact)
+            total = np.zeros(0, dtype=error_dtype)
+        summary = dict(summary.as_dict(), stopped=stopped, searched=done / space if space else 1.0)
+        return build_results(labels, targets, tp, tn, fp, fn, tolerance, n, total=total,
+                             error_dtype=error_dtype, summary=summary)
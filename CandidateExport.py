@@ -0,0 +1,199 @@
+"""
+Chunked export of every candidate matrix to Parquet or Arrow IPC, for audits that need
+the whole candidate set rather than the top-k.
+
+The matrices are generated, scored and written one chunk at a time, so peak memory is
+bounded by chunk_size whatever n is. Each chunk is sorted by rank_order before it is
+written and split into row groups (Parquet) or record batches (Arrow IPC) of
+row_group_size rows, so every group covers a narrow Total_Error range. A filter such
+as Total_Error <= 0.01 then only touches the first group or two of each chunk: Parquet
+readers skip the others on their row-group min/max statistics, and read_candidates
+does the same for Arrow IPC files, where a sorted batch's first value is its minimum
+and the memory-mapped file is only paged in where it is read.
+
+The query (pair, labels, targets, n, n_pathology, tolerance) is stored as JSON in the
+schema metadata under METADATA_KEY. Needs pyarrow.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+import Instrumentation
+from CandidateEngine import (DEFAULT_CHUNK_SIZE, PAIRS, RunningSummary, count_candidates,
+                             iter_candidate_chunks, rank_order, score_candidates)
+from CandidateResults import COUNT_COLUMNS, count_dtype
+
+# Rows per Parquet row group / Arrow record batch; smaller groups give finer skipping.
+ROW_GROUP_SIZE = 1 << 16
+
+METADATA_KEY = b'confusion_matrix'
+
+FORMATS = {
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'arrow',
+    '.ipc': 'arrow',
+    '.feather': 'arrow',
+}
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(f"Candidate export needs pyarrow: {e}") from e
+    return pyarrow
+
+
+def resolve_format(path, format=None):
+    """
+    'parquet' or 'arrow', from format or else from the file suffix.
+    """
+    if format is None:
+        format = FORMATS.get(Path(path).suffix.lower())
+        if format is None:
+            raise ValueError(f"Cannot tell the export format from {str(path)!r}; pass format='parquet' or 'arrow'")
+    if format not in ('parquet', 'arrow'):
+        raise ValueError(f"Unknown export format: {format!r}")
+    return format
+
+
+def _schema(pa, labels, n, error_dtype, derived, metadata):
+    count = pa.from_numpy_dtype(count_dtype(n))
+    fields = [pa.field(name, count) for name in COUNT_COLUMNS]
+    if derived:
+        fields += [pa.field(f'Calculated_{label}', pa.float64()) for label in labels]
+        fields += [pa.field(f'{label}_Error', pa.float64()) for label in labels]
+    fields.append(pa.field('Total_Error', pa.from_numpy_dtype(np.dtype(error_dtype))))
+    if derived:
+        fields.append(pa.field('Exact_Match', pa.bool_()))
+    return pa.schema(fields, metadata={METADATA_KEY: json.dumps(metadata)})
+
+
+def _open_writer(pa, path, format, schema, compression):
+    if format == 'parquet':
+        return pa.parquet.ParquetWriter(str(path), schema, compression=compression, write_statistics=True)
+    # Uncompressed, so the file memory-maps without copies.
+    return pa.ipc.new_file(str(path), schema)
+
+
+def export_candidates(pair, targets, n, path, format=None, tolerance=1e-6, n_pathology=None,
+                      chunk_size=DEFAULT_CHUNK_SIZE, row_group_size=ROW_GROUP_SIZE,
+                      error_dtype=np.float64, derived=False, compression='zstd',
+                      instrumentation=Instrumentation.NULL):
+    """
+    Write every valid matrix of one metric pair to a Parquet or Arrow IPC file.
+
+    Args:
+        pair (str): Key into CandidateEngine.PAIRS ('snspn', 'ppvnpv' or 'lr')
+        targets (tuple): Target values for the two metrics of the pair
+        n (int): Total number of samples
+        path (str or Path): Output file, overwritten
+        format (str, optional): 'parquet' or 'arrow'; by default from the suffix
+            (.parquet/.pq or .arrow/.ipc/.feather)
+        tolerance (float): Total error at or below which a row is an exact match
+        n_pathology (int, optional): Fixes tp + fn
+        chunk_size (int): Matrices scored, sorted and written at a time (bounds memory)
+        row_group_size (int): Rows per Parquet row group or Arrow record batch
+        error_dtype: np.float64 or np.float32 for the stored Total_Error (the rows are
+            then sorted on the rounded errors, as in the full enumeration)
+        derived (bool): Also write the Calculated_<metric>, <metric>_Error and
+            Exact_Match columns; by default only the counts and Total_Error, from which
+            CandidateResults derives the rest
+        compression (str): Parquet compression codec (Arrow IPC is written uncompressed)
+        instrumentation (Instrumentation): Collects phase timings and counters
+
+    Returns:
+        dict: RunningSummary.as_dict() over every written matrix (count, exact matches,
+        min, mean, median)
+    """
+    format = resolve_format(path, format)
+    pa = _require_pyarrow()
+    if row_group_size < 1:
+        raise ValueError("row_group_size must be at least 1")
+    labels = PAIRS[pair]
+    compact = count_dtype(n)
+    metadata = {'pair': pair, 'labels': list(labels), 'targets': [float(t) for t in targets], 'n': n,
+                'n_pathology': n_pathology, 'tolerance': tolerance}
+    schema = _schema(pa, labels, n, error_dtype, derived, metadata)
+    space = count_candidates(n, n_pathology)
+    summary = RunningSummary(tolerance)
+    done = 0
+    with _open_writer(pa, path, format, schema, compression) as writer:
+        for tp, tn, fp, fn in instrumentation.timed('enumerate', iter_candidate_chunks(n, n_pathology, chunk_size)):
+            with instrumentation.phase('evaluate'):
+                calcs, errors, total = score_candidates(labels, targets, tp, tn, fp, fn)
+            instrumentation.count('evaluated', len(tp))
+            with instrumentation.phase('rank'):
+                summary.update(total)
+                total = total.astype(error_dtype, copy=False)
+                order = rank_order(total, tp, tn, fp)
+            with instrumentation.phase('materialize'):
+                columns = [a[order].astype(compact) for a in (tp, tn, fp, fn)]
+                if derived:
+                    columns += [a[order] for a in calcs] + [a[order] for a in errors]
+                columns.append(total[order])
+                if derived:
+                    columns.append(columns[-1] <= tolerance)
+                batch = pa.RecordBatch.from_arrays([pa.array(a) for a in columns], schema=schema)
+                for start in range(0, len(batch), row_group_size):
+                    part = batch.slice(start, row_group_size)
+                    if format == 'parquet':
+                        writer.write_table(pa.Table.from_batches([part]), row_group_size=row_group_size)
+                    else:
+                        writer.write_batch(part)
+            done += len(tp)
+            instrumentation.progress(done, space)
+    instrumentation.finish(space, done)
+    return summary.as_dict()
+
+
+def read_candidates(path, max_error=None, columns=None, format=None):
+    """
+    Read an export back, memory-mapped, as a pyarrow Table (.to_pandas() for a DataFrame).
+
+    Args:
+        path (str or Path): File written by export_candidates
+        max_error (float, optional): Only the rows with Total_Error <= max_error; groups
+            whose minimum is above it are skipped without being read
+        columns (list, optional): Columns to return (all by default)
+        format (str, optional): 'parquet' or 'arrow'; by default from the suffix
+
+    Returns:
+        pyarrow.Table: Rows in file order (sorted by Total_Error within each chunk)
+    """
+    format = resolve_format(path, format)
+    pa = _require_pyarrow()
+    if format == 'parquet':
+        filters = None if max_error is None else [('Total_Error', '<=', max_error)]
+        return pa.parquet.read_table(str(path), columns=columns, filters=filters, memory_map=True)
+    reader = pa.ipc.open_file(pa.memory_map(str(path)))
+    batches = []
+    for i in range(reader.num_record_batches):
+        batch = reader.get_batch(i)
+        if max_error is not None:
+            # Sorted ascending with NaN last, so the first value is the batch minimum.
+            total = batch.column('Total_Error').to_numpy()
+            stop = int(np.searchsorted(total, max_error, side='right'))
+            if not stop:
+                continue
+            batch = batch.slice(0, stop)
+        batches.append(batch)
+    table = pa.Table.from_batches(batches, schema=reader.schema)
+    return table if columns is None else table.select(columns)
+
+
+def read_metadata(path, format=None):
+    """
+    The query an export was written for, as a dict (pair, labels, targets, n,
+    n_pathology, tolerance).
+    """
+    format = resolve_format(path, format)
+    pa = _require_pyarrow()
+    if format == 'parquet':
+        schema = pa.parquet.read_schema(str(path), memory_map=True)
+    else:
+        schema = pa.ipc.open_file(pa.memory_map(str(path))).schema
+    return json.loads(schema.metadata[METADATA_KEY])
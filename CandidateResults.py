@@ -0,0 +1,145 @@
+"""
+Compact, columnar container for candidate confusion matrices.
+"""
+import numpy as np
+from CountsToMetrics import COUNT_COLUMNS, metric_error
+
+
+def count_dtype(n):
+    """
+    Smallest unsigned integer dtype that holds every count of an n-sample matrix.
+    """
+    return np.min_scalar_type(max(int(n), 0))
+
+
+class CandidateResults:
+    """
+    Candidate confusion matrices, sorted by Total_Error, stored as one NumPy structured
+    array: TP/TN/FP/FN in the smallest unsigned dtype that fits n and Total_Error in
+    error_dtype (float64 or float32). The other solver columns (Calculated_<metric>,
+    <metric>_Error, Exact_Match) are computed from the counts when accessed, and a
+    pandas DataFrame is only built by head() / to_frame().
+
+    Changing .tolerance re-flags Exact_Match without touching the stored rows.
+    """
+
+    def __init__(self, labels, targets, metric_funcs, tp, tn, fp, fn, total_error,
+                 tolerance=1e-6, n=None, error_dtype=np.float64, summary=None):
+        """
+        Args:
+            labels (tuple): Metric labels, e.g. ('Sensitivity', 'Specificity')
+            targets (tuple): Target value for each label
+            metric_funcs (tuple): Vectorized f(tp, tn, fp, fn) for each label
+            tp, tn, fp, fn (np.ndarray): Counts, already in result order
+            total_error (np.ndarray): Total error of each row
+            tolerance (float): Total error at or below which a row is an exact match
+            n (int, optional): Largest count to size the integer dtype for (max row sum if omitted)
+            error_dtype: np.float64 or np.float32 for the stored Total_Error
+            summary (dict, optional): RunningSummary.as_dict() over every scored matrix
+        """
+        self.labels = tuple(labels)
+        self.targets = tuple(targets)
+        self.metric_funcs = tuple(metric_funcs)
+        self.tolerance = tolerance
+        self.summary = summary
+        if n is None:
+            n = int(np.max(np.add(np.add(tp, tn, dtype=np.int64), np.add(fp, fn, dtype=np.int64)), initial=0))
+        dtype = count_dtype(n)
+        self._rows = np.empty(len(total_error), dtype=[(name, dtype) for name in COUNT_COLUMNS]
+                              + [('Total_Error', np.dtype(error_dtype))])
+        for name, values in zip(COUNT_COLUMNS, (tp, tn, fp, fn)):
+            self._rows[name] = values
+        self._rows['Total_Error'] = total_error
+
+    @classmethod
+    def _from_rows(cls, like, rows):
+        new = cls.__new__(cls)
+        new.__dict__.update(like.__dict__)
+        new._rows = rows
+        return new
+
+    @property
+    def columns(self):
+        return (list(COUNT_COLUMNS) + [f'Calculated_{label}' for label in self.labels]
+                + [f'{label}_Error' for label in self.labels] + ['Total_Error', 'Exact_Match'])
+
+    @property
+    def nbytes(self):
+        return self._rows.nbytes
+
+    @property
+    def empty(self):
+        return len(self._rows) == 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __repr__(self):
+        return (f"<CandidateResults: {len(self):,} rows of {'/'.join(self.labels)}, "
+                f"{self.nbytes:,} bytes>")
+
+    def counts(self):
+        """(tp, tn, fp, fn) as int64 arrays."""
+        return tuple(self._rows[name].astype(np.int64) for name in COUNT_COLUMNS)
+
+    def __getitem__(self, column):
+        """
+        One column as a NumPy array; derived columns are computed on access. Counts
+        come back as int64, as from counts() and to_frame().
+        """
+        if column in COUNT_COLUMNS:
+            return self._rows[column].astype(np.int64)
+        if column == 'Total_Error':
+            return self._rows[column]
+        if column == 'Exact_Match':
+            return self._rows['Total_Error'] <= self.tolerance
+        for label, target, func in zip(self.labels, self.targets, self.metric_funcs):
+            if column == f'Calculated_{label}':
+                return func(*self.counts())
+            if column == f'{label}_Error':
+                return metric_error(target, func(*self.counts()))
+        raise KeyError(column)
+
+    def take(self, indices):
+        """New CandidateResults with the given rows (an index array, mask or slice)."""
+        return self._from_rows(self, self._rows[indices])
+
+    def with_tolerance(self, tolerance):
+        """
+        The same rows re-flagged for another tolerance, sharing storage with self.
+        """
+        new = self._from_rows(self, self._rows)
+        new.tolerance = tolerance
+        return new
+
+    def exact_matches(self):
+        """The rows flagged as Exact_Match, as a new CandidateResults."""
+        return self.take(self['Exact_Match'])
+
+    def to_frame(self, compact=False):
+        """
+        Build the pandas DataFrame with the same columns as the nested-loop solvers.
+
+        Args:
+            compact (bool): Keep the small count dtypes instead of int64
+        """
+        import pandas as pd
+        data = {}
+        counts = self.counts()
+        for name, values in zip(COUNT_COLUMNS, counts):
+            data[name] = self._rows[name] if compact else values
+        calcs = [func(*counts) for func in self.metric_funcs]
+        for label, calc in zip(self.labels, calcs):
+            data[f'Calculated_{label}'] = calc
+        for label, target, calc in zip(self.labels, self.targets, calcs):
+            data[f'{label}_Error'] = metric_error(target, calc)
+        data['Total_Error'] = self._rows['Total_Error']
+        data['Exact_Match'] = self['Exact_Match']
+        frame = pd.DataFrame(data)
+        if self.summary is not None:
+            frame.attrs['summary'] = dict(self.summary)
+        return frame
+
+    def head(self, n=5):
+        """The first n rows as a DataFrame."""
+        return self.take(slice(0, n)).to_frame()
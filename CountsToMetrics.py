@@ -1,27 +1,227 @@
-import streamlit as st
-import pandas as pd
+import numpy as np
+
+COUNT_COLUMNS = ('TP', 'TN', 'FP', 'FN')
+
+
+def safe_divide(num, den):
+    """
+    Element-wise num / den, with 0.0 wherever den is zero.
+    """
+    num = np.asarray(num, dtype=np.float64)
+    den = np.asarray(den, dtype=np.float64)
+    out = np.zeros(np.broadcast(num, den).shape)
+    np.divide(num, den, out=out, where=den != 0)
+    return out
+
+
+def divide_or_inf(num, den):
+    """
+    Element-wise num / den, with inf wherever den is zero (likelihood ratio convention).
+    """
+    num = np.asarray(num, dtype=np.float64)
+    den = np.asarray(den, dtype=np.float64)
+    out = np.full(np.broadcast(num, den).shape, np.inf)
+    np.divide(num, den, out=out, where=den != 0)
+    return out
+
+
+def metric_error(target, calc):
+    """
+    Element-wise |target - calc|, with 0.0 where both are the same infinity (a reported
+    infinite likelihood ratio that the matrix reproduces) instead of nan.
+    """
+    calc = np.asarray(calc, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        return np.where(calc == target, 0.0, np.abs(target - calc))
+
+
+# Metric definitions. Each takes counts (scalars or NumPy arrays) and returns an array;
+# these are the only formulas used by the solvers.
+
+def sensitivity(tp, tn, fp, fn):
+    return safe_divide(tp, tp + fn)
+
+
+def specificity(tp, tn, fp, fn):
+    return safe_divide(tn, tn + fp)
+
+
+def ppv(tp, tn, fp, fn):
+    return safe_divide(tp, tp + fp)
+
+
+def npv(tp, tn, fp, fn):
+    return safe_divide(tn, tn + fn)
+
+
+def positive_likelihood_ratio(tp, tn, fp, fn):
+    return divide_or_inf(sensitivity(tp, tn, fp, fn), 1 - specificity(tp, tn, fp, fn))
+
+
+def negative_likelihood_ratio(tp, tn, fp, fn):
+    return divide_or_inf(1 - sensitivity(tp, tn, fp, fn), specificity(tp, tn, fp, fn))
+
+
+def prevalence(tp, tn, fp, fn):
+    return safe_divide(tp + fn, tp + tn + fp + fn)
+
+
+def accuracy(tp, tn, fp, fn):
+    return safe_divide(tp + tn, tp + tn + fp + fn)
+
+
+METRIC_FUNCTIONS = {
+    'Sensitivity': sensitivity,
+    'Specificity': specificity,
+    'PPV': ppv,
+    'NPV': npv,
+    '+LR': positive_likelihood_ratio,
+    '-LR': negative_likelihood_ratio,
+    'Prevalence': prevalence,
+    'Accuracy': accuracy,
+}
+
 
 def calculate_metrics_from_counts(tp, tn, fp, fn):
     """
     Calculate diagnostic metrics from confusion matrix counts.
-    Returns a dictionary with sensitivity, specificity, PPV, NPV, +LR, -LR.
-    """
-    sensitivity = tp / (tp + fn) if (tp + fn) else 0.0
-    specificity = tn / (tn + fp) if (tn + fp) else 0.0
-    ppv = tp / (tp + fp) if (tp + fp) else 0.0
-    npv = tn / (tn + fn) if (tn + fn) else 0.0
-    plr = sensitivity / (1 - specificity) if (1 - specificity) else float('inf')
-    nlr = (1 - sensitivity) / specificity if specificity else float('inf')
-    return {
-        'Sensitivity': sensitivity,
-        'Specificity': specificity,
-        'PPV': ppv,
-        'NPV': npv,
-        '+LR': plr,
-        '-LR': nlr
-    }
+    Returns a dictionary with sensitivity, specificity, PPV, NPV, +LR, -LR, prevalence and accuracy.
+    Scalar counts give floats; array counts give arrays.
+    """
+    scalar = all(np.ndim(x) == 0 for x in (tp, tn, fp, fn))
+    if not scalar:
+        tp, tn, fp, fn = (np.asarray(x, dtype=np.int64) for x in (tp, tn, fp, fn))
+    metrics = {name: func(tp, tn, fp, fn) for name, func in METRIC_FUNCTIONS.items()}
+    if scalar:
+        metrics = {name: float(value) for name, value in metrics.items()}
+    return metrics
+
+
+# Proportion metrics as (numerator, denominator) count functions, for the intervals
+# and RoundedSolver's exact integer tests.
+PROPORTIONS = {
+    'Sensitivity': lambda tp, tn, fp, fn: (tp, tp + fn),
+    'Specificity': lambda tp, tn, fp, fn: (tn, tn + fp),
+    'PPV': lambda tp, tn, fp, fn: (tp, tp + fp),
+    'NPV': lambda tp, tn, fp, fn: (tn, tn + fn),
+    'Prevalence': lambda tp, tn, fp, fn: (tp + fn, tp + tn + fp + fn),
+    'Accuracy': lambda tp, tn, fp, fn: (tp + tn, tp + tn + fp + fn),
+}
+
+def wilson_interval(successes, trials, confidence=0.95):
+    """
+    Element-wise Wilson score interval; nan where trials is zero.
+
+    Returns:
+        tuple: (lower, upper) float arrays
+    """
+    from statistics import NormalDist
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    successes = np.asarray(successes, dtype=np.float64)
+    trials = np.asarray(trials, dtype=np.float64)
+    valid = trials > 0
+    n = np.where(valid, trials, 1.0)
+    p = successes / n
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    half = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    # At p = 0 or 1 the bound is exactly 0 or 1; pin it instead of leaving rounding noise.
+    lower = np.where(successes == 0, 0.0, np.clip(center - half, 0.0, 1.0))
+    upper = np.where(successes == trials, 1.0, np.clip(center + half, 0.0, 1.0))
+    return np.where(valid, lower, np.nan), np.where(valid, upper, np.nan)
+
+
+def clopper_pearson_interval(successes, trials, confidence=0.95):
+    """
+    Element-wise exact (Clopper-Pearson) interval from beta quantiles; nan where trials
+    is zero. Needs scipy (optional, see requirements.txt).
+
+    Returns:
+        tuple: (lower, upper) float arrays
+    """
+    try:
+        from scipy.stats import beta
+    except ImportError as e:
+        raise ImportError(f"Clopper-Pearson intervals need scipy: {e}") from e
+    alpha = 1 - confidence
+    successes = np.asarray(successes, dtype=np.float64)
+    trials = np.asarray(trials, dtype=np.float64)
+    valid = trials > 0
+    failures = trials - successes
+    with np.errstate(invalid='ignore'):
+        lower = np.where(successes > 0, beta.ppf(alpha / 2, successes, failures + 1), 0.0)
+        upper = np.where(failures > 0, beta.ppf(1 - alpha / 2, successes + 1, failures), 1.0)
+    return np.where(valid, lower, np.nan), np.where(valid, upper, np.nan)
+
+
+INTERVALS = {
+    'wilson': wilson_interval,
+    'clopper-pearson': clopper_pearson_interval,
+}
+
+
+def _count_arrays(counts):
+    """(tp, tn, fp, fn) int64 arrays from a DataFrame, dict, CandidateResults or (m, 4) array."""
+    if hasattr(counts, 'counts'):
+        columns = counts.counts()
+    elif isinstance(counts, dict) or hasattr(counts, 'columns'):
+        columns = [counts[name] for name in COUNT_COLUMNS]
+    else:
+        table = np.asarray(counts)
+        if table.ndim != 2 or table.shape[1] != 4:
+            raise ValueError("Counts must have TP, TN, FP, FN columns or shape (m, 4)")
+        columns = table.T
+    arrays = []
+    for name, column in zip(COUNT_COLUMNS, columns):
+        column = np.asarray(column)
+        if column.dtype.kind not in 'iub' and not np.all(np.mod(column, 1) == 0):
+            raise ValueError(f"{name} counts must be whole numbers")
+        column = column.astype(np.int64)
+        if (column < 0).any():
+            raise ValueError(f"{name} counts must be non-negative")
+        arrays.append(column)
+    return tuple(arrays)
+
+
+def calculate_metrics_bulk(counts, interval=None, confidence=0.95):
+    """
+    Calculate the diagnostic metrics for many confusion matrices at once, column-wise.
+
+    Zero denominators follow calculate_metrics_from_counts: the proportions are 0.0 and the
+    likelihood ratios inf, and the intervals of a proportion with no trials are nan.
+
+    Args:
+        counts: A DataFrame or dict with TP, TN, FP, FN columns, a CandidateResults, or
+            an (m, 4) array of (tp, tn, fp, fn) rows
+        interval (str, optional): 'wilson' or 'clopper-pearson' (needs scipy) to add
+            <metric>_CI_Lower / <metric>_CI_Upper for every proportion metric
+        confidence (float): Two-sided confidence level of the intervals
+
+    Returns:
+        DataFrame (for DataFrame input, keeping its index) or dict of arrays: the counts,
+        then the metrics of calculate_metrics_from_counts, then the intervals
+    """
+    if interval is not None and interval not in INTERVALS:
+        raise ValueError(f"Unknown interval: {interval!r}")
+    if not 0 < confidence < 1:
+        raise ValueError("confidence must be between 0 and 1")
+    tp, tn, fp, fn = _count_arrays(counts)
+    columns = dict(zip(COUNT_COLUMNS, (tp, tn, fp, fn)))
+    columns.update((name, func(tp, tn, fp, fn)) for name, func in METRIC_FUNCTIONS.items())
+    if interval is not None:
+        for name, ratio in PROPORTIONS.items():
+            lower, upper = INTERVALS[interval](*ratio(tp, tn, fp, fn), confidence)
+            columns[f"{name}_CI_Lower"] = lower
+            columns[f"{name}_CI_Upper"] = upper
+    if hasattr(counts, 'columns') and hasattr(counts, 'index'):
+        import pandas as pd
+        return pd.DataFrame(columns, index=counts.index)
+    return columns
 
 def main():
+    # Imported here so the metric functions load without pandas or streamlit.
+    import pandas as pd
+    import streamlit as st
     st.title("Diagnostic Metrics from Confusion Matrix Counts")
     tp = st.number_input("True Positives (TP)", min_value=0, value=10)
     tn = st.number_input("True Negatives (TN)", min_value=0, value=10)
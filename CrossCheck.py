@@ -0,0 +1,182 @@
+"""
+Cross-check mode: run every inversion a study's reported metrics allow (Sn/Sp, PPV/NPV,
++LR/-LR) at once and keep the confusion matrices they all agree on.
+
+Each complete pair is inverted with JointSolver.solve_metrics over the same candidate
+space (n, and n_pathology if given), so every inversion yields the matrices consistent
+with its own pair within the per-metric tolerances. The inversions run concurrently on
+a thread pool (NumPy releases the GIL in the bulk scoring) or a process pool, so the
+wall time is close to that of the slowest one. Their results are intersected on the
+counts. The report says, for each metric, how close the matrices agreed on by the other
+pairs come to it, which points at the reported value that breaks the agreement when
+the intersection is empty.
+"""
+import decimal
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import CandidateEngine
+import JointSolver
+from CandidateEngine import METRICS, PAIRS, build_results
+from CountsToMetrics import metric_error
+
+POOLS = {
+    'thread': ThreadPoolExecutor,
+    'process': ProcessPoolExecutor,
+}
+
+
+def available_pairs(metrics):
+    """
+    The PAIRS keys whose two metrics are both reported, in PAIRS order.
+
+    Raises:
+        ValueError: For a metric outside the pairs, or one reported without its partner
+    """
+    labels = {JointSolver.ALIASES.get(name, name) for name in metrics}
+    paired = {label: pair for pair, pair_labels in PAIRS.items() for label in pair_labels}
+    for label in labels:
+        if label not in paired:
+            raise ValueError(f"Cannot cross-check {label!r}; use JointSolver.solve_metrics for it")
+        partner = next(other for other in PAIRS[paired[label]] if other != label)
+        if partner not in labels:
+            raise ValueError(f"{label} needs {partner} for a cross-check")
+    return [pair for pair, pair_labels in PAIRS.items() if pair_labels[0] in labels]
+
+
+def reported_tolerances(texts):
+    """
+    Per-metric tolerances from the values as typed: half a unit in the last decimal
+    given, as for RoundedSolver's decimals, so '0.22' allows 0.215 to 0.225 and '8'
+    allows 7.5 to 8.5. Values without a decimal position (inf, nan) keep
+    JointSolver.DEFAULT_METRIC_TOLERANCE.
+
+    Args:
+        texts (dict): Metric name -> reported value as a string, e.g. {'-LR': '0.22'}
+
+    Returns:
+        dict: Metric name -> tolerance, for cross_check(tolerances=...)
+    """
+    tolerances = {}
+    for name, text in texts.items():
+        try:
+            exponent = decimal.Decimal(text.strip()).as_tuple().exponent
+        except decimal.InvalidOperation:
+            raise ValueError(f"Invalid value for {name}: {text!r}")
+        if isinstance(exponent, int):
+            # Widened a hair, as in RoundedSolver, so float rounding never drops the edge.
+            tolerances[name] = 0.5 * 10.0 ** min(exponent, 0) * (1 + 1e-9)
+        else:
+            tolerances[name] = JointSolver.DEFAULT_METRIC_TOLERANCE
+    return tolerances
+
+
+def _invert(task):
+    """
+    One inversion, run in a pool worker.
+
+    Returns:
+        tuple: (tp, tn, fp, fn) int64 arrays of the consistent matrices, and seconds taken
+    """
+    metrics, n, n_pathology, tolerances, chunk_size = task
+    start = time.perf_counter()
+    results = JointSolver.solve_metrics(metrics, n, n_pathology, tolerances=tolerances, chunk_size=chunk_size)
+    return results.counts(), time.perf_counter() - start
+
+
+def _keys(n, tp, tn, fp):
+    """One int64 per matrix (fn follows from n)."""
+    return (tp * (n + 1) + tn) * (n + 1) + fp
+
+
+def _min_error(label, target, counts):
+    if not len(counts[0]):
+        return np.nan
+    with np.errstate(invalid='ignore'):
+        return float(np.nanmin(metric_error(target, METRICS[label](*counts)), initial=np.inf))
+
+
+def cross_check(metrics, n, n_pathology=None, tolerances=JointSolver.DEFAULT_METRIC_TOLERANCE, tolerance=1e-6,
+                pool='thread', workers=None, chunk_size=CandidateEngine.DEFAULT_CHUNK_SIZE,
+                error_dtype=np.float64):
+    """
+    Invert every reported metric pair concurrently and intersect the results.
+
+    Args:
+        metrics (dict): Reported values keyed by 'Sensitivity', 'Specificity', 'PPV',
+            'NPV', 'PLR' (or '+LR') and 'NLR' (or '-LR'); every metric needs its partner
+        n (int): Total number of samples
+        n_pathology (int, optional): Fixes tp + fn
+        tolerances (float or dict): Allowed absolute error per metric, as in JointSolver;
+            for published values use reported_tolerances, since the default (5e-4) only
+            fits values given to 3 decimals
+        tolerance (float): Total error at or below which an agreed row is flagged Exact_Match
+        pool (str): 'thread' or 'process'
+        workers (int, optional): Pool size (one per inversion if None)
+        chunk_size (int): Matrices generated per NumPy batch
+        error_dtype: np.float64 or np.float32 for the stored Total_Error
+
+    Returns:
+        tuple: (CandidateResults, dict). The results are the matrices every inversion
+        agrees on, sorted by the summed error over all metrics. The report has 'agreed'
+        (their number), 'pairs' (per pair: labels, matches, seconds) and 'metrics' (per
+        metric: pair, reported, tolerance, min_error over the agreed matrices,
+        min_error_others over the matrices the other pairs agree on, and consistent:
+        whether min_error_others is within tolerance, None when the other pairs agree on
+        no matrix themselves; with a single pair, whether it has any match)
+    """
+    if pool not in POOLS:
+        raise ValueError(f"Unknown pool: {pool!r}")
+    pairs = available_pairs(metrics)
+    if not pairs:
+        raise ValueError("At least one complete metric pair is required")
+    constraints = JointSolver.normalize_metrics(metrics, tolerances)
+    tasks = [({label: constraints[label][0] for label in PAIRS[pair]}, n, n_pathology,
+              {label: constraints[label][1] for label in PAIRS[pair]}, chunk_size) for pair in pairs]
+    with POOLS[pool](max_workers=workers or len(tasks)) as executor:
+        outcomes = list(executor.map(_invert, tasks))
+
+    keys = {pair: _keys(n, *counts[:3]) for pair, (counts, _) in zip(pairs, outcomes)}
+    counts = dict(zip(pairs, (counts for counts, _ in outcomes)))
+
+    def agreed_by(members):
+        """Counts of the matrices every pair in members agrees on."""
+        first = members[0]
+        keep = np.ones(len(keys[first]), dtype=bool)
+        for pair in members[1:]:
+            keep &= np.isin(keys[first], keys[pair])
+        return tuple(a[keep] for a in counts[first])
+
+    agreed = agreed_by(pairs)
+    report = {
+        'agreed': len(agreed[0]),
+        'pairs': {pair: {'labels': PAIRS[pair], 'matches': len(keys[pair]), 'seconds': seconds}
+                  for pair, (_, seconds) in zip(pairs, outcomes)},
+        'metrics': {},
+    }
+    for pair in pairs:
+        others = [other for other in pairs if other != pair]
+        rest = agreed_by(others) if others else None
+        for label in PAIRS[pair]:
+            target, limit = constraints[label]
+            min_error_others = _min_error(label, target, rest) if others else np.nan
+            if not others:
+                consistent = bool(len(keys[pair]))
+            elif len(rest[0]):
+                consistent = bool(min_error_others <= limit)
+            else:
+                consistent = None
+            report['metrics'][label] = {
+                'pair': pair,
+                'reported': target,
+                'tolerance': limit,
+                'min_error': _min_error(label, target, agreed),
+                'min_error_others': min_error_others,
+                'consistent': consistent,
+            }
+
+    labels = tuple(label for pair in pairs for label in PAIRS[pair])
+    targets = tuple(constraints[label][0] for label in labels)
+    results = build_results(labels, targets, *agreed, tolerance, n, error_dtype=error_dtype)
+    return results, report
@@ -0,0 +1,147 @@
+"""
+Instrumentation hooks shared by the solvers: phase timers, counters and a
+rate-limited progress callback.
+
+Phases: enumerate, evaluate, rank, materialize.
+Counters:
+    considered  valid matrices in the search space (CandidateEngine.count_candidates)
+    pruned      matrices of that space never scored (excluded by bounds or windows)
+    evaluated   matrices whose metrics and errors were computed
+    kept        rows in the returned result
+
+Solvers take instrumentation=None and use NULL then, whose methods do nothing, so the
+hooks cost a few attribute lookups per chunk when disabled.
+"""
+import contextlib
+import time
+from collections import defaultdict
+
+PHASES = ('enumerate', 'evaluate', 'rank', 'materialize')
+COUNTERS = ('considered', 'pruned', 'evaluated', 'kept')
+DEFAULT_PROGRESS_INTERVAL = 0.2
+
+
+class Instrumentation:
+    """
+    Collects phase timings and counters for one solve.
+    """
+    enabled = True
+
+    def __init__(self, progress=None, min_interval=DEFAULT_PROGRESS_INTERVAL):
+        """
+        Args:
+            progress (callable, optional): progress(done, total), called at most once per
+                min_interval seconds (and always when done reaches total)
+            min_interval (float): Seconds between progress calls
+        """
+        self.timings = defaultdict(float)
+        self.counters = defaultdict(int)
+        self._progress = progress
+        self._min_interval = min_interval
+        self._last_report = 0.0
+        self._evaluated_at_finish = 0
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Add the wall time of the with-block to timings[name]."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def timed(self, name, iterable):
+        """Iterate over iterable, charging the time spent producing items to timings[name]."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.timings[name] += time.perf_counter() - start
+                return
+            self.timings[name] += time.perf_counter() - start
+            yield item
+
+    def count(self, name, value):
+        self.counters[name] += int(value)
+
+    def finish(self, considered, kept):
+        """
+        Record one finished search: its space of valid matrices and its result size.
+        pruned is the part of the space not evaluated since the previous finish, so
+        one Instrumentation can be shared by several searches (e.g. one per n).
+        """
+        evaluated = self.counters['evaluated'] - self._evaluated_at_finish
+        self._evaluated_at_finish = self.counters['evaluated']
+        self.counters['considered'] += considered
+        # The margin solvers score some matrices twice, so evaluated can exceed the space.
+        self.counters['pruned'] += max(considered - evaluated, 0)
+        self.counters['kept'] += kept
+
+    def progress(self, done, total):
+        if self._progress is None:
+            return
+        now = time.perf_counter()
+        if done >= total or now - self._last_report >= self._min_interval:
+            self._last_report = now
+            self._progress(done, total)
+
+    def as_dict(self):
+        """{'timings': {phase: seconds}, 'counters': {name: count}}, in PHASES / COUNTERS order."""
+        return {'timings': {name: self.timings.get(name, 0.0) for name in PHASES},
+                'counters': {name: self.counters.get(name, 0) for name in COUNTERS}}
+
+    def report(self):
+        """Human-readable summary for the CLI."""
+        stats = self.as_dict()
+        lines = [f"{name:>12s}: {seconds * 1e3:10.2f} ms" for name, seconds in stats['timings'].items()]
+        lines += [f"{name:>12s}: {value:14,d}" for name, value in stats['counters'].items()]
+        return "\n".join(lines)
+
+
+class NullInstrumentation:
+    """
+    Disabled instrumentation: same interface, does nothing.
+    """
+    enabled = False
+
+    def phase(self, name):
+        return _NULL_CONTEXT
+
+    def timed(self, name, iterable):
+        return iterable
+
+    def count(self, name, value):
+        pass
+
+    def finish(self, considered, kept):
+        pass
+
+    def progress(self, done, total):
+        pass
+
+
+_NULL_CONTEXT = contextlib.nullcontext()
+NULL = NullInstrumentation()
+
+
+def tqdm_progress(desc="Testing combinations"):
+    """
+    A progress(done, total) callback driving a tqdm bar, or None without tqdm.
+    """
+    try:
+        from tqdm import tqdm
+    except ImportError:
+        return None
+    bar = None
+
+    def progress(done, total):
+        nonlocal bar
+        if bar is None:
+            bar = tqdm(total=total, desc=desc)
+        bar.update(done - bar.n)
+        if done >= total:
+            bar.close()
+
+    return progress
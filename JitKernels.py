@@ -0,0 +1,179 @@
+"""
+Optional Numba backend: enumeration, metrics, error scoring and top-k selection fused
+into one compiled pass, with no temporary arrays.
+
+The kernel walks the matrices in nested-loop order (tp, then tn, then fp), which is also
+the tie-break order of CandidateEngine.rank_order. A newcomer therefore only enters the
+top-k when its Total_Error is strictly smaller than the current k-th. The running
+summary (count, exact matches, min, mean and a reservoir sample for the median) is kept
+in the same pass. The metric formulas repeat CountsToMetrics operation for operation,
+so the errors, and thus the rankings, are bit-identical to the NumPy path.
+
+Without Numba, AVAILABLE is False and CandidateEngine.solve_pair uses the NumPy
+enumeration instead; the kernels stay importable as plain Python for parity checks.
+"""
+import numpy as np
+
+import CandidateEngine
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+AVAILABLE = numba is not None
+
+PAIR_CODES = {'snspn': 0, 'ppvnpv': 1, 'lr': 2}
+
+
+def _jit(func):
+    return numba.njit(cache=True, nogil=True)(func) if AVAILABLE else func
+
+
+if AVAILABLE:
+    @numba.njit(cache=True, nogil=True)
+    def _rng(seed):
+        # Seeds Numba's own generator, which is separate from NumPy's global one.
+        np.random.seed(seed)
+        return 0
+
+    @numba.njit(cache=True, nogil=True)
+    def _randint(rng, high):
+        return np.random.randint(0, high)
+else:
+    def _rng(seed):
+        return np.random.default_rng(seed)
+
+    def _randint(rng, high):
+        return int(rng.integers(high))
+
+
+@_jit
+def _ratio(num, den):
+    # CountsToMetrics.safe_divide
+    return num / den if den != 0 else 0.0
+
+
+@_jit
+def _ratio_or_inf(num, den):
+    # CountsToMetrics.divide_or_inf
+    return num / den if den != 0 else np.inf
+
+
+@_jit
+def _error(target, calc):
+    # CountsToMetrics.metric_error
+    return 0.0 if calc == target else np.abs(target - calc)
+
+
+@_jit
+def _total_error(pair_code, t0, t1, tp, tn, fp, fn):
+    if pair_code == 0:
+        c0 = _ratio(tp, tp + fn)
+        c1 = _ratio(tn, tn + fp)
+    elif pair_code == 1:
+        c0 = _ratio(tp, tp + fp)
+        c1 = _ratio(tn, tn + fn)
+    else:
+        sens = _ratio(tp, tp + fn)
+        spec = _ratio(tn, tn + fp)
+        c0 = _ratio_or_inf(sens, 1 - spec)
+        c1 = _ratio_or_inf(1 - sens, spec)
+    return _error(t0, c0) + _error(t1, c1)
+
+
+@_jit
+def _fused_top_k(pair_code, t0, t1, n, n_pathology, k, tolerance, reservoir, seed):
+    """
+    Top-k matrices by rank_order plus summary statistics, in one pass.
+
+    n_pathology < 0 means unconstrained. Returns (counts (k, 4) int64, totals (k,),
+    filled, count, exact, minimum, finite_sum, finite_count, seen).
+    """
+    rng = _rng(seed)
+    best = np.zeros((k, 4), dtype=np.int64)
+    best_total = np.zeros(k)
+    filled = 0
+    count = 0
+    exact = 0
+    minimum = np.inf
+    finite_sum = 0.0
+    finite_count = 0
+    seen = 0
+    size = reservoir.shape[0]
+    tp_max = n if n_pathology < 0 else n_pathology
+    for tp in range(tp_max + 1):
+        tn_max = n - tp if n_pathology < 0 else n - n_pathology
+        for tn in range(tn_max + 1):
+            if n_pathology < 0:
+                fp_lo, fp_hi = 0, n - tp - tn
+            else:
+                fp_lo = fp_hi = n - n_pathology - tn
+            for fp in range(fp_lo, fp_hi + 1):
+                fn = n - tp - tn - fp
+                total = _total_error(pair_code, t0, t1, tp, tn, fp, fn)
+                count += 1
+                if total <= tolerance:
+                    exact += 1
+                if total == total:
+                    if total < minimum:
+                        minimum = total
+                    finite_sum += total
+                    finite_count += 1
+                    if seen < size:
+                        reservoir[seen] = total
+                    else:
+                        slot = _randint(rng, seen + 1)
+                        if slot < size:
+                            reservoir[slot] = total
+                    seen += 1
+                # Later matrices lose ties, and NaN ranks after everything.
+                if filled == k:
+                    worst = best_total[k - 1]
+                    if total != total or (worst == worst and total >= worst):
+                        continue
+                    pos = k - 1
+                else:
+                    pos = filled
+                    filled += 1
+                while pos > 0:
+                    above = best_total[pos - 1]
+                    if above == above and (total != total or above <= total):
+                        break
+                    if above != above and total != total:
+                        break
+                    best_total[pos] = above
+                    best[pos] = best[pos - 1]
+                    pos -= 1
+                best_total[pos] = total
+                best[pos, 0] = tp
+                best[pos, 1] = tn
+                best[pos, 2] = fp
+                best[pos, 3] = fn
+    return best, best_total, filled, count, exact, minimum, finite_sum, finite_count, seen
+
+
+def solve_top_k(pair, targets, n, tolerance=1e-6, n_pathology=None, top_k=CandidateEngine.DEFAULT_TOP_K,
+                error_dtype=np.float64, seed=0):
+    """
+    The enumeration's top_k and summary from the fused kernel.
+
+    Returns:
+        CandidateResults: Same rows as solve_pair(method='enumerate', top_k=top_k); the
+        summary median comes from the kernel's own reservoir sample
+    """
+    labels = CandidateEngine.PAIRS[pair]
+    if n_pathology is not None and not 0 <= n_pathology <= n:
+        best, total, filled = np.zeros((0, 4), dtype=np.int64), np.zeros(0), 0
+        summary = CandidateEngine.RunningSummary(tolerance)
+    else:
+        reservoir = np.empty(CandidateEngine.RESERVOIR_SIZE)
+        best, total, filled, count, exact, minimum, finite_sum, finite_count, seen = _fused_top_k(
+            PAIR_CODES[pair], float(targets[0]), float(targets[1]), int(n),
+            -1 if n_pathology is None else int(n_pathology), int(top_k), float(tolerance), reservoir, seed)
+        summary = CandidateEngine.RunningSummary.from_aggregates(tolerance, count, exact, float(minimum), finite_sum,
+                                                                 finite_count, reservoir, seen)
+    best, total = best[:filled], total[:filled]
+    return CandidateEngine.build_results(labels, targets, best[:, 0], best[:, 1], best[:, 2], best[:, 3],
+                                         tolerance, n, total=total, error_dtype=error_dtype,
+                                         summary=dict(summary.as_dict(), stopped=None, searched=1.0))
@@ -0,0 +1,237 @@
+"""
+Joint solver: invert any subset of Sensitivity, Specificity, PPV, NPV, PLR, NLR,
+Prevalence and Accuracy in a single search.
+
+Every reported metric becomes an interval (value +- its tolerance). Before anything is
+evaluated the intervals are propagated into integer bounds on the counts: prevalence
+bounds the disease margin P = tp + fn, sensitivity bounds tp for that margin, and the
+other metrics bound tn for every (P, tp) row, with fp = n - P - tn and fn = P - tp.
+Bounds are rounded outwards, so they only ever over-approximate; the matrices inside
+them are then checked against the exact definitions in CountsToMetrics. Each extra
+constraint therefore shrinks the space that is generated at all.
+"""
+import numpy as np
+import CandidateEngine
+from CandidateEngine import RunningSummary, TopK, build_results, iter_row_chunks, ragged_arange
+from CandidateResults import count_dtype
+from CountsToMetrics import safe_divide
+
+# Names accepted for the likelihood ratios besides the PLR / NLR column labels.
+ALIASES = {'+LR': 'PLR', '-LR': 'NLR'}
+
+# Half a unit in the third decimal, i.e. a value reported to 3 decimals.
+DEFAULT_METRIC_TOLERANCE = 5e-4
+
+
+def normalize_metrics(metrics, tolerances=DEFAULT_METRIC_TOLERANCE):
+    """
+    Resolve aliases and pair every metric with its tolerance.
+
+    Args:
+        metrics (dict): Reported values, keyed as in solve_metrics
+        tolerances (float or dict): As in solve_metrics
+
+    Returns:
+        dict: label -> (target, tolerance), in the order given
+    """
+    constraints = {}
+    for name, value in metrics.items():
+        label = ALIASES.get(name, name)
+        if label not in CandidateEngine.METRICS:
+            raise ValueError(f"Unknown metric: {name!r}")
+        if isinstance(tolerances, dict):
+            tol = tolerances.get(name, tolerances.get(label, DEFAULT_METRIC_TOLERANCE))
+        else:
+            tol = tolerances
+        constraints[label] = (float(value), float(tol))
+    return constraints
+
+
+def _contains_zero(interval):
+    return interval[0] <= 0 <= interval[1]
+
+
+def margin_bounds(intervals, n, n_pathology=None):
+    """
+    Inclusive range of disease margins P = tp + fn allowed by n_pathology and Prevalence.
+    """
+    lo, hi = (0, n) if n_pathology is None else (n_pathology, n_pathology)
+    if 'Prevalence' in intervals and n > 0:
+        p_lo, p_hi = intervals['Prevalence']
+        lo = max(lo, int(np.floor(p_lo * n)))
+        hi = min(hi, int(np.ceil(p_hi * n)))
+    return max(lo, 0), min(hi, n)
+
+
+def tp_bounds(intervals, margin):
+    """
+    Inclusive tp range for disease margin P allowed by Sensitivity (empty if hi < lo).
+    """
+    if 'Sensitivity' not in intervals:
+        return 0, margin
+    s_lo, s_hi = intervals['Sensitivity']
+    if margin == 0:
+        return (0, 0) if _contains_zero((s_lo, s_hi)) else (0, -1)
+    return max(0, int(np.floor(s_lo * margin))), min(margin, int(np.ceil(s_hi * margin)))
+
+
+def tn_bounds(intervals, n, margin, tp):
+    """
+    Inclusive tn bounds for every tp of one disease margin, from every constraint that
+    involves tn. Each bound is derived by clearing the denominator of the metric
+    (e.g. PPV >= lo  <=>  fp <= tp (1 - lo) / lo) and rounded outwards.
+
+    Returns:
+        tuple: (lo, hi) int64 arrays; rows with lo > hi are infeasible
+    """
+    n_healthy = n - margin
+    fn = margin - tp
+    sens = safe_divide(tp, margin)
+    lo = np.zeros(len(tp))
+    hi = np.full(len(tp), float(n_healthy))
+    infeasible = np.zeros(len(tp), dtype=bool)
+
+    def at_least(bound, where=True):
+        nonlocal lo
+        lo = np.where(where, np.fmax(lo, bound), lo)
+
+    def at_most(bound, where=True):
+        nonlocal hi
+        hi = np.where(where, np.fmin(hi, bound), hi)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if 'Specificity' in intervals:
+            v_lo, v_hi = intervals['Specificity']
+            if n_healthy:
+                at_least(v_lo * n_healthy)
+                at_most(v_hi * n_healthy)
+            elif not _contains_zero((v_lo, v_hi)):
+                infeasible[:] = True
+        if 'Accuracy' in intervals and n:
+            v_lo, v_hi = intervals['Accuracy']
+            at_least(v_lo * n - tp)
+            at_most(v_hi * n - tp)
+        if 'PPV' in intervals:
+            v_lo, v_hi = intervals['PPV']
+            positive = tp > 0
+            if v_lo > 0:
+                at_least(n_healthy - tp * (1 - v_lo) / v_lo, positive)
+            if v_hi > 0:
+                at_most(n_healthy - tp * (1 - v_hi) / v_hi, positive)
+            else:
+                infeasible |= positive
+            if not _contains_zero((v_lo, v_hi)):
+                infeasible |= ~positive
+        if 'NPV' in intervals:
+            v_lo, v_hi = intervals['NPV']
+            missed = fn > 0
+            if v_lo >= 1:
+                infeasible |= missed
+            elif v_lo > 0:
+                at_least(v_lo * fn / (1 - v_lo), missed)
+            if v_hi < 1:
+                at_most(v_hi * fn / (1 - v_hi), missed)
+            if not (_contains_zero((v_lo, v_hi)) or v_lo <= 1 <= v_hi):
+                infeasible |= ~missed
+        if 'PLR' in intervals and n_healthy:
+            v_lo, v_hi = intervals['PLR']
+            if v_lo > 0:
+                at_least(n_healthy - sens * n_healthy / v_lo)
+            if v_hi > 0:
+                at_most(n_healthy - sens * n_healthy / v_hi)
+            else:
+                infeasible |= sens > 0
+        if 'NLR' in intervals and n_healthy:
+            v_lo, v_hi = intervals['NLR']
+            if v_lo > 0:
+                at_most((1 - sens) * n_healthy / v_lo)
+            if v_hi > 0:
+                at_least((1 - sens) * n_healthy / v_hi)
+            else:
+                infeasible |= sens < 1
+    lo = np.clip(np.floor(lo), 0, n_healthy + 1).astype(np.int64)
+    hi = np.clip(np.ceil(hi), -1, n_healthy).astype(np.int64)
+    hi[infeasible] = -1
+    return lo, hi
+
+
+def iter_constrained_rows(intervals, n, n_pathology=None):
+    """
+    Yield (tp, fn, tn_lo, tn_hi) row arrays, one batch per disease margin, covering every
+    matrix that can satisfy the intervals.
+    """
+    p_lo, p_hi = margin_bounds(intervals, n, n_pathology)
+    for margin in range(p_lo, p_hi + 1):
+        t_lo, t_hi = tp_bounds(intervals, margin)
+        if t_hi < t_lo:
+            continue
+        tp = np.arange(t_lo, t_hi + 1, dtype=np.int64)
+        lo, hi = tn_bounds(intervals, n, margin, tp)
+        keep = lo <= hi
+        if keep.any():
+            yield tp[keep], margin - tp[keep], lo[keep], hi[keep]
+
+
+def iter_constrained_chunks(intervals, n, n_pathology=None, chunk_size=CandidateEngine.DEFAULT_CHUNK_SIZE):
+    """
+    Yield (tp, tn, fp, fn) int64 arrays for every matrix inside the propagated bounds.
+    """
+    for tp, fn, tn_lo, tn_hi in iter_row_chunks(iter_constrained_rows(intervals, n, n_pathology), chunk_size):
+        lengths = tn_hi - tn_lo + 1
+        tp = np.repeat(tp, lengths)
+        fn = np.repeat(fn, lengths)
+        tn = ragged_arange(tn_lo, tn_hi + 1)
+        yield tp, tn, n - tp - fn - tn, fn
+
+
+def solve_metrics(metrics, n, n_pathology=None, tolerances=DEFAULT_METRIC_TOLERANCE, tolerance=1e-6,
+                  top_k=None, chunk_size=CandidateEngine.DEFAULT_CHUNK_SIZE, error_dtype=np.float64):
+    """
+    Find every confusion matrix consistent with all of the given metrics at once.
+
+    Args:
+        metrics (dict): Reported values keyed by 'Sensitivity', 'Specificity', 'PPV', 'NPV',
+            'PLR' (or '+LR'), 'NLR' (or '-LR'), 'Prevalence', 'Accuracy'
+        n (int): Total number of samples
+        n_pathology (int, optional): Fixes tp + fn
+        tolerances (float or dict): Allowed absolute error per metric (one value for all,
+            or keyed like metrics; missing keys use DEFAULT_METRIC_TOLERANCE)
+        tolerance (float): Total error at or below which a row is flagged Exact_Match
+        top_k (int, optional): Only keep the top_k best matrices
+        chunk_size (int): Matrices generated per NumPy batch
+        error_dtype: np.float64 or np.float32 for the stored Total_Error
+
+    Returns:
+        CandidateResults: Matrices within every tolerance, sorted by the summed absolute
+        error over the given metrics; .summary covers all of them
+    """
+    constraints = normalize_metrics(metrics, tolerances)
+    if not constraints:
+        raise ValueError("At least one metric is required")
+    labels = tuple(constraints)
+    targets = tuple(value for value, _ in constraints.values())
+    limits = [tol for _, tol in constraints.values()]
+    intervals = {label: (value - tol, value + tol) for label, (value, tol) in constraints.items()}
+
+    summary = RunningSummary(tolerance)
+    best = TopK(top_k) if top_k is not None else None
+    compact = count_dtype(n)
+    parts = []
+    for tp, tn, fp, fn in iter_constrained_chunks(intervals, n, n_pathology, chunk_size):
+        _, errors, total = CandidateEngine.score_candidates(labels, targets, tp, tn, fp, fn)
+        keep = np.logical_and.reduce([error <= limit for error, limit in zip(errors, limits)])
+        tp, tn, fp, fn, total = tp[keep], tn[keep], fp[keep], fn[keep], total[keep]
+        summary.update(total)
+        if best is not None:
+            best.push(tp, tn, fp, fn, total)
+        else:
+            parts.append(tuple(a.astype(compact) for a in (tp, tn, fp, fn)) + (total.astype(error_dtype),))
+    if best is not None:
+        tp, tn, fp, fn, total = best.columns
+    elif parts:
+        tp, tn, fp, fn, total = (np.concatenate(cols) for cols in zip(*parts))
+    else:
+        tp = tn = fp = fn = np.zeros(0, dtype=compact)
+        total = np.zeros(0, dtype=error_dtype)
+    return build_results(labels, targets, tp, tn, fp, fn, tolerance, n, total=total,
+                         error_dtype=error_dtype, summary=summary.as_dict())
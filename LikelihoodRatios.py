@@ -1,12 +1,66 @@
-import pandas as pd
-import streamlit as st
-import itertools
+import numpy as np
+import CandidateEngine
+import Instrumentation
 
-def calculate_likelihoodratios(plr, nlr, n, tolerance=1e-6, n_pathology=None):
+def calculate_likelihoodratios(plr, nlr, n, tolerance=1e-6, n_pathology=None, backend='numpy', method='enumerate', top_k=None, error_dtype=np.float64, index_path=None, instrumentation=None, budget=None, cancel=None, on_snapshot=None, workers=1):
     """
     Estimate confusion matrix values from positive and negative likelihood ratios and sample size n.
-    Returns a DataFrame of possible confusion matrices.
+    Returns a CandidateResults of possible confusion matrices; see CandidateEngine.solve_pair
+    for method, top_k and the other options. backend='python' scores every matrix with the
+    original nested loops, kept as the reference implementation, and takes none of them.
     """
+    if backend == 'python':
+        CandidateEngine.check_reference_options(method=method, top_k=top_k, error_dtype=error_dtype,
+                                                index_path=index_path, instrumentation=instrumentation,
+                                                budget=budget, cancel=cancel, on_snapshot=on_snapshot,
+                                                workers=workers)
+        frame = _calculate_likelihoodratios_python(plr, nlr, n, tolerance, n_pathology)
+        return CandidateEngine.reference_results('lr', (plr, nlr), frame, tolerance, n)
+    if backend not in ('numpy', 'numba'):
+        raise ValueError(f"Unknown backend: {backend!r}")
+    return CandidateEngine.solve_pair('lr', (plr, nlr), n, tolerance=tolerance, n_pathology=n_pathology,
+                                      method=method, top_k=top_k, error_dtype=error_dtype,
+                                      index_path=index_path, instrumentation=instrumentation,
+                                      budget=budget, cancel=cancel, on_snapshot=on_snapshot,
+                                      workers=workers, backend=backend)
+
+def calculate_likelihoodratios_range(plr, nlr, n_min, n_max, tolerance=1e-6, n_pathology=None, top_k=CandidateEngine.DEFAULT_TOP_K, error_dtype=np.float64, instrumentation=None):
+    """
+    The top_k matrices for +LR and -LR at every sample size from n_min to n_max
+    (see RangeSolver.solve_range).
+    """
+    import RangeSolver
+    return RangeSolver.solve_range('lr', (plr, nlr), n_min, n_max, tolerance=tolerance, n_pathology=n_pathology,
+                                   top_k=top_k, error_dtype=error_dtype,
+                                   instrumentation=instrumentation or Instrumentation.NULL)
+
+def calculate_likelihoodratios_many(targets, n, tolerance=1e-6, n_pathology=None, top_k=CandidateEngine.DEFAULT_TOP_K, error_dtype=np.float64, instrumentation=None):
+    """
+    The top_k matrices for each (+LR, -LR) pair in targets at the same sample size
+    (see MultiQuery.solve_many).
+    """
+    import MultiQuery
+    return MultiQuery.solve_many('lr', targets, n, tolerance=tolerance, n_pathology=n_pathology,
+                                 top_k=top_k, error_dtype=error_dtype,
+                                 instrumentation=instrumentation or Instrumentation.NULL)
+
+def export_likelihoodratios(plr, nlr, n, path, format=None, tolerance=1e-6, n_pathology=None, chunk_size=CandidateEngine.DEFAULT_CHUNK_SIZE, row_group_size=None, error_dtype=np.float64, derived=False, instrumentation=None):
+    """
+    Write every candidate matrix for +LR and -LR to a Parquet or Arrow IPC file
+    (see CandidateExport.export_candidates).
+    """
+    import CandidateExport
+    return CandidateExport.export_candidates('lr', (plr, nlr), n, path, format=format, tolerance=tolerance,
+                                             n_pathology=n_pathology, chunk_size=chunk_size,
+                                             row_group_size=row_group_size or CandidateExport.ROW_GROUP_SIZE,
+                                             error_dtype=error_dtype, derived=derived,
+                                             instrumentation=instrumentation or Instrumentation.NULL)
+
+def _calculate_likelihoodratios_python(plr, nlr, n, tolerance=1e-6, n_pathology=None):
+    """
+    Reference implementation: brute force over all (n+1)^4 tuples.
+    """
+    import pandas as pd
     results = []
     for tp in range(n + 1):
         for tn in range(n + 1):
@@ -21,8 +75,9 @@ def calculate_likelihoodratios(plr, nlr, n, tolerance=1e-6, n_pathology=None):
                     spec = tn / (tn + fp) if (tn + fp) else 0.0
                     calc_plr = sens / (1 - spec) if (1 - spec) else float('inf')
                     calc_nlr = (1 - sens) / spec if spec else float('inf')
-                    plr_error = abs(plr - calc_plr)
-                    nlr_error = abs(nlr - calc_nlr)
+                    # A reported infinite ratio is matched exactly by an infinite one.
+                    plr_error = 0.0 if plr == calc_plr else abs(plr - calc_plr)
+                    nlr_error = 0.0 if nlr == calc_nlr else abs(nlr - calc_nlr)
                     total_error = plr_error + nlr_error
                     results.append({
                         'TP': tp,
@@ -37,10 +92,11 @@ def calculate_likelihoodratios(plr, nlr, n, tolerance=1e-6, n_pathology=None):
                         'Exact_Match': total_error <= tolerance
                     })
     results_df = pd.DataFrame(results)
-    results_df = results_df.sort_values('Total_Error').reset_index(drop=True)
+    results_df = results_df.sort_values('Total_Error', kind='stable').reset_index(drop=True)
     return results_df
 
 def main():
+    import streamlit as st
     st.title("Confusion Matrix Estimation from Likelihood Ratios and n")
     plr = st.number_input("Positive Likelihood Ratio (PLR)", min_value=0.0, value=5.0)
     nlr = st.number_input("Negative Likelihood Ratio (NLR)", min_value=0.0, value=0.2)
@@ -0,0 +1,237 @@
+"""
+Margin-decomposed solvers: find the top-k confusion matrices without a 4-D search.
+
+Once the margins are fixed the metric pairs decouple:
+- Sn/Sp: with P = tp + fn and N = n - P, sensitivity depends only on tp and
+  specificity only on tn, so the best matrices come from two 1-D searches.
+- PPV/NPV: same split on the predicted-positive margin Q = tp + fp. When
+  n_pathology is also fixed, tn follows from tp and the total error is convex in tp.
+- LRs: for a fixed tp the total error, as a function of specificity, is decreasing,
+  then convex or concave, then increasing, so its k smallest values sit next to at
+  most three closed-form turning points.
+
+In each case only a window of about 2 * top_k integers around the closed-form
+optimum can reach the top-k, so every margin costs O(top_k) (O(top_k^2) for the
+separable pairs). Margins are iterated when n_pathology is omitted. Results are
+ranked with CandidateEngine.rank_order and match the enumeration's top rows exactly.
+"""
+import numpy as np
+import CandidateEngine
+import Instrumentation
+from CountsToMetrics import safe_divide
+
+
+def integer_windows(centers, width, lo, hi):
+    """
+    Integers within +-width of each centre, one row per margin, clipped to [lo, hi]
+    and de-duplicated. The candidate numerators of every margin solver, and of
+    RangeSolver's per-margin tables.
+
+    Args:
+        centers (np.ndarray): (rows, c) real-valued centres (nan/inf allowed)
+        width (int): Half-width of every window
+        lo, hi (np.ndarray): (rows,) inclusive bounds; rows with lo > hi are empty
+
+    Returns:
+        tuple: (values, valid) int64/bool arrays of shape (rows, c * (2 * width + 2))
+    """
+    rows = len(lo)
+    centers = np.nan_to_num(np.asarray(centers, dtype=np.float64).reshape(rows, -1))
+    centers = np.clip(centers, lo[:, None] - 1.0, hi[:, None] + 1.0)
+    offsets = np.arange(-width, width + 2)
+    values = (np.floor(centers).astype(np.int64)[..., None] + offsets).reshape(rows, -1)
+    values = np.clip(values, lo[:, None], hi[:, None])
+    values.sort(axis=1)
+    valid = np.ones(values.shape, dtype=bool)
+    valid[:, 1:] = values[:, 1:] != values[:, :-1]
+    valid &= (lo <= hi)[:, None]
+    return values, valid
+
+
+def _separable_top_k(pair, targets, n, margins, top_k, instrumentation):
+    """
+    Top-k for pairs whose metrics split on a margin m: the first metric is a/m and the
+    second b/(n - m), with a and b independent (Sn/Sp on tp + fn, PPV/NPV on tp + fp).
+    """
+    labels = CandidateEngine.PAIRS[pair]
+    width = top_k + 1
+    block = max(1, CandidateEngine.DEFAULT_CHUNK_SIZE // (2 * width + 2) ** 2 // 4)
+
+    def batches():
+        for start in range(0, len(margins), block):
+            m = margins[start:start + block]
+            other = n - m
+            a, a_ok = integer_windows(targets[0] * m, width, np.zeros_like(m), m)
+            b, b_ok = integer_windows(targets[1] * other, width, np.zeros_like(m), other)
+            ok = a_ok[:, :, None] & b_ok[:, None, :]
+            a = np.broadcast_to(a[:, :, None], ok.shape)[ok]
+            b = np.broadcast_to(b[:, None, :], ok.shape)[ok]
+            m = np.broadcast_to(m[:, None, None], ok.shape)[ok]
+            other = n - m
+            if pair == 'snspn':
+                yield a, b, other - b, m - a
+            else:
+                yield a, b, m - a, other - b
+
+    return _top_k_of(labels, targets, batches(), top_k, instrumentation)
+
+
+def _ppvnpv_fixed_pathology(targets, n, n_pathology, top_k, instrumentation):
+    """
+    PPV/NPV top-k with tp + fn fixed. For each Q = tp + fp, tn = n - Q - n_pathology + tp,
+    so both errors are |target - linear(tp)| and the total is convex in tp: its k best
+    values lie next to one of the two kinks. When Q = n - Q the slopes cancel and the
+    total can be flat between the kinks, so that single margin is scanned in full.
+    """
+    labels = CandidateEngine.PAIRS['ppvnpv']
+    q = np.arange(n + 1, dtype=np.int64)
+    neg = n - q
+    lo = np.maximum(0, n_pathology - neg)
+    hi = np.minimum(q, n_pathology)
+    kinks = np.stack([targets[0] * q, targets[1] * neg - (neg - n_pathology)], axis=1)
+    tp, valid = integer_windows(kinks, top_k + 1, lo, hi)
+    q = np.broadcast_to(q[:, None], tp.shape)[valid]
+    tp = tp[valid]
+    if n % 2 == 0 and lo[n // 2] <= hi[n // 2]:
+        flat = np.arange(lo[n // 2], hi[n // 2] + 1)
+        keep = q != n // 2
+        tp = np.concatenate([tp[keep], flat])
+        q = np.concatenate([q[keep], np.full_like(flat, n // 2)])
+    fp = q - tp
+    fn = n_pathology - tp
+    tn = n - tp - fp - fn
+    return _merge(labels, targets, [(tp, tn, fp, fn)], top_k, instrumentation)
+
+
+def _lr_turning_points(targets, n_pathology, n_healthy):
+    """
+    Candidate tn centres for every tp of one disease margin P = n_pathology. For each tp
+    (sensitivity s), the total error as a function of specificity p is decreasing below
+    min(p1, p2), increasing above max(p1, p2), and convex or concave in between, where
+    p1 = 1 - s / PLR, p2 = (1 - s) / NLR and the convex minimiser is r / (1 + r) with
+    r = sqrt((1 - s) / s). Windows around these points, clipped to [0, N], hold every
+    top-k tn (including the infinite-ratio boundaries).
+    """
+    tp = np.arange(n_pathology + 1, dtype=np.int64)
+    sens = safe_divide(tp, n_pathology)
+    plr, nlr = targets
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.sqrt(safe_divide(1 - sens, sens))
+        centers = np.stack([
+            1 - sens / plr,
+            (1 - sens) / nlr,
+            np.where(sens > 0, ratio / (1 + ratio), 1.0),
+        ], axis=1) * n_healthy
+    return tp, centers
+
+
+def _lr_candidates(tp, centers, width, n_pathology, n_healthy):
+    lo = np.zeros_like(tp)
+    tn, valid = integer_windows(centers, width, lo, lo + n_healthy)
+    rows = np.broadcast_to(np.arange(len(tp))[:, None], tn.shape)[valid]
+    tp = tp[rows]
+    tn = tn[valid]
+    return (tp, tn, n_healthy - tn, n_pathology - tp), rows
+
+
+def _lr_top_k(targets, n, margins, top_k, instrumentation):
+    """
+    LR top-k over the given disease margins, in two passes. The first keeps the best tn
+    next to each turning point, which yields real matrices and so an upper bound on the
+    k-th best error; the second widens the windows only for the tp whose best error is
+    within that bound.
+    """
+    labels = CandidateEngine.PAIRS['lr']
+
+    def coarse():
+        for margin in margins:
+            tp, centers = _lr_turning_points(targets, margin, n - margin)
+            yield _lr_candidates(tp, centers, 1, margin, n - margin)[0]
+
+    def refined(bound):
+        for margin in margins:
+            n_healthy = n - margin
+            tp, centers = _lr_turning_points(targets, margin, n_healthy)
+            candidates, rows = _lr_candidates(tp, centers, 1, margin, n_healthy)
+            _, _, total = CandidateEngine.score_candidates(labels, targets, *candidates)
+            instrumentation.count('evaluated', len(total))
+            row_best = np.full(len(tp), np.inf)
+            np.minimum.at(row_best, rows, total)
+            keep = ~(row_best > bound)
+            if keep.any():
+                yield _lr_candidates(tp[keep], centers[keep], top_k + 1, margin, n_healthy)[0]
+
+    coarse_best = _top_k_of(labels, targets, coarse(), top_k, instrumentation)
+    _, _, bound = CandidateEngine.score_candidates(labels, targets, *coarse_best)
+    return _top_k_of(labels, targets, refined(bound[-1] if len(bound) == top_k else np.inf), top_k,
+                     instrumentation)
+
+
+def _top_k_of(labels, targets, batches, top_k, instrumentation):
+    """
+    Running top-k over an iterable of candidate batches, merged about
+    DEFAULT_CHUNK_SIZE matrices at a time.
+    """
+    best, pending, pending_size = [], [], 0
+    for batch in batches:
+        pending.append(batch)
+        pending_size += len(batch[0])
+        if pending_size >= CandidateEngine.DEFAULT_CHUNK_SIZE:
+            best = [_merge(labels, targets, best + pending, top_k, instrumentation)]
+            pending, pending_size = [], 0
+    return _merge(labels, targets, best + pending, top_k, instrumentation)
+
+
+def _merge(labels, targets, batches, top_k, instrumentation):
+    """
+    Top-k of the concatenated candidate batches.
+    """
+    if not batches:
+        return tuple(np.zeros(0, dtype=np.int64) for _ in range(4))
+    candidates = tuple(np.concatenate(cols) for cols in zip(*batches))
+    instrumentation.count('evaluated', len(candidates[0]))
+    return CandidateEngine.top_k_candidates(labels, targets, *candidates, top_k)
+
+
+def solve_margin_subset(pair, targets, n, margins, top_k, instrumentation=Instrumentation.NULL):
+    """
+    Top-k over the given margins only (disease margins for Sn/Sp and LRs, predicted-positive
+    margins for PPV/NPV), without n_pathology; used to shard solve_margins.
+
+    Returns:
+        tuple: (tp, tn, fp, fn) int64 arrays, best first
+    """
+    if pair == 'lr':
+        return _lr_top_k(targets, n, margins, top_k, instrumentation)
+    return _separable_top_k(pair, targets, n, np.asarray(margins, dtype=np.int64), top_k, instrumentation)
+
+
+def solve_margins(pair, targets, n, n_pathology=None, top_k=CandidateEngine.DEFAULT_TOP_K,
+                  instrumentation=Instrumentation.NULL):
+    """
+    Top-k confusion matrices for one metric pair via margin decomposition.
+
+    Args:
+        pair (str): Key into CandidateEngine.PAIRS ('snspn', 'ppvnpv' or 'lr')
+        targets (tuple): Target values for the two metrics of the pair
+        n (int): Total number of samples
+        n_pathology (int, optional): Fixes tp + fn; all disease margins are tried otherwise
+        top_k (int): Number of matrices to return
+        instrumentation (Instrumentation): Counts the matrices evaluated
+
+    Returns:
+        tuple: (tp, tn, fp, fn) int64 arrays, best first
+    """
+    if n_pathology is not None and not 0 <= n_pathology <= n:
+        return tuple(np.zeros(0, dtype=np.int64) for _ in range(4))
+    if pair == 'snspn':
+        margins = np.arange(n + 1) if n_pathology is None else np.array([n_pathology])
+        return _separable_top_k(pair, targets, n, margins.astype(np.int64), top_k, instrumentation)
+    if pair == 'ppvnpv':
+        if n_pathology is None:
+            return _separable_top_k(pair, targets, n, np.arange(n + 1, dtype=np.int64), top_k, instrumentation)
+        return _ppvnpv_fixed_pathology(targets, n, n_pathology, top_k, instrumentation)
+    if pair == 'lr':
+        return _lr_top_k(targets, n, range(n + 1) if n_pathology is None else [n_pathology], top_k,
+                         instrumentation)
+    raise ValueError(f"Unknown metric pair: {pair!r}")
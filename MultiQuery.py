@@ -0,0 +1,83 @@
+"""
+Many targets at one n: invert a whole vector of metric pairs (e.g. every operating
+point of one cohort) against one shared candidate grid.
+
+Every Sn, Sp, PPV and NPV value a matrix of size n can take is a ratio a / b with
+b <= n. Those ratios are built once per n, sorted by value, as an in-memory
+RationalIndex (cached, so later calls at the same n reuse it). Each target is then
+answered by binary searches on that grid and a join of the two value windows on their
+denominators (RationalIndex.query_pair). The cost therefore grows with the number of
+targets times a window, not with targets times the (n+1)^4 enumeration. Above
+MAX_GRID_N, where the grid of about n^2 / 2 ratios gets large, each target uses the
+margin solver instead.
+"""
+import functools
+
+import numpy as np
+import CandidateEngine
+import Instrumentation
+import RationalIndex
+
+# Largest n answered from an in-memory grid (about 8 million ratios, ~100 MB).
+MAX_GRID_N = 4000
+
+
+@functools.lru_cache(maxsize=2)
+def ratio_grid(n):
+    """
+    The in-memory RationalIndex for sample size n, built once per process.
+    """
+    return RationalIndex.RationalIndex.in_memory(n)
+
+
+def solve_many(pair, targets, n, tolerance=1e-6, n_pathology=None, top_k=CandidateEngine.DEFAULT_TOP_K,
+               error_dtype=np.float64, instrumentation=Instrumentation.NULL):
+    """
+    The top_k matrices (or, with top_k=None, the exact matches) for every target pair.
+
+    Args:
+        pair (str): Key into CandidateEngine.PAIRS ('snspn', 'ppvnpv' or 'lr')
+        targets: Sequence of (value1, value2) target pairs, or a (T, 2) array
+        n (int): Total number of samples, shared by every target
+        tolerance (float): Total error at or below which a row is an exact match
+        n_pathology (int, optional): Fixes tp + fn for every target
+        top_k (int, optional): Matrices per target; None returns the exact matches
+        error_dtype: np.float64 or np.float32 for the stored Total_Error
+        instrumentation (Instrumentation, optional): Collects phase timings and counters
+
+    Returns:
+        list: One CandidateResults per target, in order; each has the rows of
+        solve_pair(pair, target, n, top_k=top_k) (no summary)
+    """
+    targets = np.asarray(targets, dtype=np.float64)
+    if targets.ndim != 2 or targets.shape[1] != 2:
+        raise ValueError("targets must be a sequence of (value1, value2) pairs")
+    labels = CandidateEngine.PAIRS[pair]
+    grid = None
+    if n <= MAX_GRID_N:
+        with instrumentation.phase('enumerate'):
+            grid = ratio_grid(n)
+    results = []
+    for row in targets:
+        target = (float(row[0]), float(row[1]))
+        if top_k is not None and not np.all(np.isfinite(target)):
+            # Only the tie-breaks rank these; stream the enumeration, as solve_pair does.
+            results.append(CandidateEngine.solve_pair(pair, target, n, tolerance, n_pathology, top_k=top_k,
+                                                      error_dtype=error_dtype))
+            continue
+        with instrumentation.phase('evaluate'):
+            if grid is not None:
+                result = RationalIndex.query_pair(pair, target, n, grid, tolerance, n_pathology, top_k,
+                                                  error_dtype=error_dtype, instrumentation=instrumentation)
+            elif top_k is None:
+                result = RationalIndex.exact_matches(pair, target, n, tolerance, n_pathology, error_dtype)
+            else:
+                import MarginSolver
+                best = MarginSolver.solve_margins(pair, target, n, n_pathology, top_k,
+                                                  instrumentation=instrumentation)
+                result = CandidateEngine.build_results(labels, target, *best, tolerance, n,
+                                                       error_dtype=error_dtype)
+        results.append(result)
+    instrumentation.finish(len(targets) * CandidateEngine.count_candidates(n, n_pathology),
+                           sum(len(r) for r in results))
+    return results
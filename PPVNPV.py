@@ -1,12 +1,66 @@
-import pandas as pd
-import streamlit as st
-import itertools
+import numpy as np
+import CandidateEngine
+import Instrumentation
 
-def calculate_ppvnpv(ppv, npv, n, tolerance=1e-6, n_pathology=None):
+def calculate_ppvnpv(ppv, npv, n, tolerance=1e-6, n_pathology=None, backend='numpy', method='enumerate', top_k=None, error_dtype=np.float64, index_path=None, instrumentation=None, budget=None, cancel=None, on_snapshot=None, workers=1, decimals=None):
     """
     Estimate confusion matrix values from PPV, NPV, and sample size n.
-    Returns a DataFrame of possible confusion matrices.
+    Returns a CandidateResults of possible confusion matrices; see CandidateEngine.solve_pair
+    for method, top_k and the other options. backend='python' scores every matrix with the
+    original nested loops, kept as the reference implementation, and takes none of them.
     """
+    if backend == 'python':
+        CandidateEngine.check_reference_options(method=method, top_k=top_k, error_dtype=error_dtype,
+                                                index_path=index_path, instrumentation=instrumentation,
+                                                budget=budget, cancel=cancel, on_snapshot=on_snapshot,
+                                                workers=workers, decimals=decimals)
+        frame = _calculate_ppvnpv_python(ppv, npv, n, tolerance, n_pathology)
+        return CandidateEngine.reference_results('ppvnpv', (ppv, npv), frame, tolerance, n)
+    if backend not in ('numpy', 'numba'):
+        raise ValueError(f"Unknown backend: {backend!r}")
+    return CandidateEngine.solve_pair('ppvnpv', (ppv, npv), n, tolerance=tolerance, n_pathology=n_pathology,
+                                      method=method, top_k=top_k, error_dtype=error_dtype,
+                                      index_path=index_path, instrumentation=instrumentation,
+                                      budget=budget, cancel=cancel, on_snapshot=on_snapshot,
+                                      workers=workers, decimals=decimals, backend=backend)
+
+def calculate_ppvnpv_range(ppv, npv, n_min, n_max, tolerance=1e-6, n_pathology=None, top_k=CandidateEngine.DEFAULT_TOP_K, error_dtype=np.float64, instrumentation=None):
+    """
+    The top_k matrices for PPV and NPV at every sample size from n_min to n_max
+    (see RangeSolver.solve_range).
+    """
+    import RangeSolver
+    return RangeSolver.solve_range('ppvnpv', (ppv, npv), n_min, n_max, tolerance=tolerance, n_pathology=n_pathology,
+                                   top_k=top_k, error_dtype=error_dtype,
+                                   instrumentation=instrumentation or Instrumentation.NULL)
+
+def calculate_ppvnpv_many(targets, n, tolerance=1e-6, n_pathology=None, top_k=CandidateEngine.DEFAULT_TOP_K, error_dtype=np.float64, instrumentation=None):
+    """
+    The top_k matrices for each (PPV, NPV) pair in targets at the same sample size
+    (see MultiQuery.solve_many).
+    """
+    import MultiQuery
+    return MultiQuery.solve_many('ppvnpv', targets, n, tolerance=tolerance, n_pathology=n_pathology,
+                                 top_k=top_k, error_dtype=error_dtype,
+                                 instrumentation=instrumentation or Instrumentation.NULL)
+
+def export_ppvnpv(ppv, npv, n, path, format=None, tolerance=1e-6, n_pathology=None, chunk_size=CandidateEngine.DEFAULT_CHUNK_SIZE, row_group_size=None, error_dtype=np.float64, derived=False, instrumentation=None):
+    """
+    Write every candidate matrix for PPV and NPV to a Parquet or Arrow IPC file
+    (see CandidateExport.export_candidates).
+    """
+    import CandidateExport
+    return CandidateExport.export_candidates('ppvnpv', (ppv, npv), n, path, format=format, tolerance=tolerance,
+                                             n_pathology=n_pathology, chunk_size=chunk_size,
+                                             row_group_size=row_group_size or CandidateExport.ROW_GROUP_SIZE,
+                                             error_dtype=error_dtype, derived=derived,
+                                             instrumentation=instrumentation or Instrumentation.NULL)
+
+def _calculate_ppvnpv_python(ppv, npv, n, tolerance=1e-6, n_pathology=None):
+    """
+    Reference implementation: brute force over all (n+1)^4 tuples.
+    """
+    import pandas as pd
     results = []
     for tp in range(n + 1):
         for tn in range(n + 1):
@@ -34,10 +88,11 @@ def calculate_ppvnpv(ppv, npv, n, tolerance=1e-6, n_pathology=None):
                         'Exact_Match': total_error <= tolerance
                     })
     results_df = pd.DataFrame(results)
-    results_df = results_df.sort_values('Total_Error').reset_index(drop=True)
+    results_df = results_df.sort_values('Total_Error', kind='stable').reset_index(drop=True)
     return results_df
 
 def main():
+    import streamlit as st
     st.title("Confusion Matrix Estimation from PPV, NPV, n")
     ppv = st.number_input("Positive Predictive Value (PPV, 0-1)", min_value=0.0, max_value=1.0, value=0.9)
     npv = st.number_input("Negative Predictive Value (NPV, 0-1)", min_value=0.0, max_value=1.0, value=0.9)
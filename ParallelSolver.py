@@ -0,0 +1,147 @@
+"""
+Multi-core sharded solves for a single query.
+
+The search space is cut into interleaved shards (every workers-th tp for the
+enumeration, every workers-th disease or predicted-positive margin for the margin
+solver, which keeps the shards balanced), solved on a process pool, and each shard
+writes its top-k rows into one multiprocessing.shared_memory block. The shard lists are
+merged with CandidateEngine.rank_order, a total order on the matrices, so the result
+is identical to the serial run. Small queries fall back to the serial solver, where
+the pool would cost more than it saves.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import CandidateEngine
+import Instrumentation
+
+# Below these sizes the pool start-up outweighs the work.
+MIN_PARALLEL_CANDIDATES = 4_000_000
+MIN_PARALLEL_MARGINS = 1000
+
+ROW_DTYPE = np.dtype([('tp', np.int64), ('tn', np.int64), ('fp', np.int64), ('fn', np.int64),
+                      ('total', np.float64)])
+
+
+def resolve_workers(workers):
+    """None or 0 means one worker per core."""
+    return os.cpu_count() or 1 if not workers else int(workers)
+
+
+def should_parallelize(method, pair, n, n_pathology, top_k, workers):
+    """
+    Whether a parallel solve is supported and worth it for this query.
+    """
+    if workers <= 1:
+        return False
+    if method == 'enumerate':
+        # Without top_k every matrix is kept, and shipping them back would cost more than scoring.
+        return top_k is not None and CandidateEngine.count_candidates(n, n_pathology) >= MIN_PARALLEL_CANDIDATES
+    if method == 'margin':
+        # With n_pathology there is a single margin to solve.
+        return n >= MIN_PARALLEL_MARGINS and n_pathology is None
+    return False
+
+
+def _slots(shm, shards, top_k):
+    return np.ndarray((shards, top_k), dtype=ROW_DTYPE, buffer=shm.buf)
+
+
+def _solve_shard(task):
+    """
+    Solve one shard in a worker process and write its top-k into slot shard of the
+    shared block.
+
+    Returns:
+        tuple: (rows written, matrices evaluated, RunningSummary or None)
+    """
+    method, pair, targets, n, n_pathology, shard, shards, top_k, chunk_size, tolerance, shm_name = task
+    labels = CandidateEngine.PAIRS[pair]
+    instrumentation = Instrumentation.Instrumentation()
+    summary = None
+    if method == 'enumerate':
+        tps = range(shard, (n if n_pathology is None else n_pathology) + 1, shards)
+        summary = CandidateEngine.RunningSummary(tolerance)
+        best = CandidateEngine.TopK(top_k)
+        for tp, tn, fp, fn in CandidateEngine.iter_candidate_chunks(n, n_pathology, chunk_size, tps):
+            _, _, total = CandidateEngine.score_candidates(labels, targets, tp, tn, fp, fn)
+            instrumentation.count('evaluated', len(tp))
+            summary.update(total)
+            best.push(tp, tn, fp, fn, total)
+        tp, tn, fp, fn, total = best.columns
+    else:
+        import MarginSolver
+        margins = np.arange(shard, n + 1, shards, dtype=np.int64)
+        tp, tn, fp, fn = MarginSolver.solve_margin_subset(pair, targets, n, margins, top_k, instrumentation)
+        _, _, total = CandidateEngine.score_candidates(labels, targets, tp, tn, fp, fn)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        rows = _slots(shm, shards, top_k)[shard]
+        for name, values in zip(ROW_DTYPE.names, (tp, tn, fp, fn, total)):
+            rows[name][:len(total)] = values
+        del rows  # release the view so the block can be closed
+    finally:
+        shm.close()
+    return len(total), instrumentation.counters['evaluated'], summary
+
+
+def solve_parallel(pair, targets, n, tolerance=1e-6, n_pathology=None, method='enumerate',
+                   top_k=CandidateEngine.DEFAULT_TOP_K, workers=None,
+                   chunk_size=CandidateEngine.DEFAULT_CHUNK_SIZE, error_dtype=np.float64,
+                   instrumentation=Instrumentation.NULL):
+    """
+    Top-k for one metric pair, sharded over a process pool.
+
+    Args:
+        pair (str): Key into CandidateEngine.PAIRS ('snspn', 'ppvnpv' or 'lr')
+        targets (tuple): Target values for the two metrics of the pair
+        n (int): Total number of samples
+        tolerance (float): Total error at or below which a row is an exact match
+        n_pathology (int, optional): Fixes tp + fn
+        method (str): 'enumerate' or 'margin'
+        top_k (int): Number of matrices to return
+        workers (int, optional): Processes (one per core if None or 0)
+        chunk_size (int): Matrices generated per NumPy batch in each worker
+        error_dtype: np.float64 or np.float32 for the stored Total_Error
+        instrumentation (Instrumentation): Counts the matrices evaluated in all shards
+
+    Returns:
+        CandidateResults: Identical to the serial solve_pair result (the enumeration's
+        summary merges the shard summaries; its median is a reservoir estimate)
+    """
+    workers = resolve_workers(workers)
+    shards = workers
+    labels = CandidateEngine.PAIRS[pair]
+    shm = shared_memory.SharedMemory(create=True, size=shards * top_k * ROW_DTYPE.itemsize)
+    try:
+        tasks = [(method, pair, targets, n, n_pathology, shard, shards, top_k, chunk_size, tolerance, shm.name)
+                 for shard in range(shards)]
+        with instrumentation.phase('evaluate'):
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                outcomes = list(pool.map(_solve_shard, tasks))
+        with instrumentation.phase('rank'):
+            slots = _slots(shm, shards, top_k)
+            rows = np.concatenate([slots[shard][:written] for shard, (written, _, _) in enumerate(outcomes)])
+            del slots
+            tp, tn, fp, fn, total = (rows[name] for name in ROW_DTYPE.names)
+            order = CandidateEngine.top_k_order(total, tp, tn, fp, top_k)
+    finally:
+        shm.close()
+        shm.unlink()
+    summary = None
+    for _, evaluated, shard_summary in outcomes:
+        instrumentation.count('evaluated', evaluated)
+        if shard_summary is not None:
+            if summary is None:
+                summary = shard_summary
+            else:
+                summary.merge(shard_summary)
+    if summary is not None:
+        summary = dict(summary.as_dict(), stopped=None, searched=1.0)
+    with instrumentation.phase('materialize'):
+        return CandidateEngine.build_results(labels, targets, tp[order], tn[order], fp[order], fn[order],
+                                             tolerance, n, total=total[order], error_dtype=error_dtype,
+                                             summary=summary)
@@ -0,0 +1,210 @@
+"""
+Branch-and-bound search: skip every part of the space that cannot enter the top-k (or,
+without top_k, meet the tolerance).
+
+The space is split into subtrees by a partial assignment. That is (tp, fn) for Sn/Sp
+and the LRs, where tn is then free. It is (tp, fp) for PPV/NPV, where tn is free, and
+just tp for PPV/NPV with a fixed n_pathology, where fp is free. Within a subtree every
+metric is a monotone function of the free count t, including the LR branches that
+jump to inf at t = 0 or t = M. The error |target - f(t)| therefore falls and then
+rises, and its minimum sits next to the first t where f crosses the target, which a
+vectorized binary search finds for all subtrees at once. The sum of the per-metric
+minima is a lower bound on the subtree's Total_Error.
+
+Subtrees are visited best bound first. Before each group the bound is compared with
+the current k-th best error (or the tolerance), and as soon as one subtree cannot
+beat it the rest are skipped too. Inside a surviving subtree each error must stay
+within the threshold minus the other metric's minimum, which restricts t to an
+interval, so only that interval is scored. Ties at the threshold are kept, so the
+result matches the full enumeration row for row.
+"""
+import numpy as np
+import CandidateEngine
+import Instrumentation
+from CandidateEngine import METRICS, PAIRS, TopK, build_results, ragged_arange
+from CountsToMetrics import metric_error
+
+# Subtrees whose bounds are checked together against the running threshold; groups
+# start small so the first matrices scored set a tight threshold, and double from there.
+FIRST_GROUP_ROWS = 16
+GROUP_ROWS = 4096
+
+# Float slack on the per-metric limits (threshold minus the other metric's minimum).
+LIMIT_SLACK = 1e-12
+
+
+class Subtrees:
+    """
+    Subtree rows: counts = base + t * step for t in [0, size].
+    """
+
+    def __init__(self, pair, n, n_pathology=None):
+        if pair == 'ppvnpv' and n_pathology is not None:
+            # tp fixes fn = P - tp; fp is free and tn = N - fp.
+            tp = np.arange(n_pathology + 1, dtype=np.int64)
+            size = np.full_like(tp, n - n_pathology)
+            self.base = (tp, size, np.zeros_like(tp), n_pathology - tp)
+            self.step = (0, -1, 1, 0)
+        else:
+            if n_pathology is None:
+                first = np.repeat(np.arange(n + 1, dtype=np.int64), np.arange(n + 1, 0, -1))
+                second = ragged_arange(np.zeros(n + 1, dtype=np.int64), n + 1 - np.arange(n + 1))
+            else:
+                first = np.arange(n_pathology + 1, dtype=np.int64)
+                second = n_pathology - first
+            size = n - first - second
+            zero = np.zeros_like(first)
+            if pair == 'ppvnpv':
+                # (tp, fp) fixed; tn is free and fn = M - tn.
+                self.base = (first, zero, second, size)
+                self.step = (0, 1, 0, -1)
+            else:
+                # (tp, fn) fixed; tn is free and fp = N - tn.
+                self.base = (first, zero, size, second)
+                self.step = (0, 1, -1, 0)
+        self.size = size
+
+    def counts(self, rows, t):
+        return tuple(base[rows] + step * t for base, step in zip(self.base, self.step))
+
+    def matrices(self, rows, lo, hi):
+        """(tp, tn, fp, fn) for t in [lo, hi] of each row."""
+        lengths = hi - lo + 1
+        t = ragged_arange(lo, hi + 1)
+        rows = np.repeat(rows, lengths)
+        return self.counts(rows, t)
+
+
+def _search(passes, lo, hi):
+    """
+    Vectorized binary search: per row, the first t in [lo, hi] with passes(t) true (hi + 1
+    if none), for a predicate that is false then true on [lo, hi].
+    """
+    lo, hi = lo.copy(), hi + 1
+    active = lo < hi
+    while active.any():
+        mid = (lo + hi) // 2
+        ok = passes(mid)
+        hi = np.where(active & ok, mid, hi)
+        lo = np.where(active & ~ok, mid + 1, lo)
+        active = lo < hi
+    return lo
+
+
+class MetricBound:
+    """
+    Error of one metric along every subtree: its minimum, and where it turns.
+    """
+
+    def __init__(self, label, target, subtrees, rows):
+        self.func = METRICS[label]
+        self.target = target
+        self.subtrees = subtrees
+        zero = np.zeros_like(rows)
+        size = subtrees.size[rows]
+        rising = self.value(rows, zero) <= self.value(rows, size)
+        # First t where f(t) has reached the target, in the direction f moves; the error
+        # does not rise before it and does not fall from it on.
+        cross = _search(lambda t: np.where(rising, self.value(rows, t) >= target,
+                                           self.value(rows, t) <= target), zero, size)
+        self.below = np.maximum(cross - 1, 0)
+        self.above = np.minimum(cross, size)
+        self.minimum = np.minimum(self.error(rows, self.below), self.error(rows, self.above))
+
+    def value(self, rows, t):
+        return self.func(*self.subtrees.counts(rows, t))
+
+    def error(self, rows, t):
+        return metric_error(self.target, self.value(rows, t))
+
+    def interval(self, rows, limit):
+        """
+        Per row, the range [lo, hi] of t with error <= limit (empty when lo > hi).
+        """
+        below, above = self.below[rows], self.above[rows]
+        lo = _search(lambda t: self.error(rows, t) <= limit, np.zeros_like(below), below)
+        hi = _search(lambda t: self.error(rows, t) > limit, above, self.subtrees.size[rows]) - 1
+        return lo, hi
+
+
+def solve_pruned(pair, targets, n, tolerance=1e-6, n_pathology=None, top_k=None,
+                 chunk_size=CandidateEngine.DEFAULT_CHUNK_SIZE, error_dtype=np.float64,
+                 instrumentation=Instrumentation.NULL):
+    """
+    Branch-and-bound top-k (or, without top_k, every exact match) for one metric pair.
+
+    Args:
+        pair (str): Key into CandidateEngine.PAIRS ('snspn', 'ppvnpv' or 'lr')
+        targets (tuple): Target values for the two metrics of the pair
+        n (int): Total number of samples
+        tolerance (float): Total error at or below which a row is an exact match
+        n_pathology (int, optional): Fixes tp + fn
+        top_k (int, optional): Matrices to return; None returns the exact matches only
+        chunk_size (int): Most matrices scored per NumPy batch
+        error_dtype: np.float64 or np.float32 for the stored Total_Error
+        instrumentation (Instrumentation): Counts the matrices scored as 'evaluated'
+
+    Returns:
+        CandidateResults: The same rows as the full enumeration's top_k (or exact matches);
+        .summary holds 'searched' and 'pruned', the fractions of the valid matrices
+        scored and skipped
+    """
+    labels = PAIRS[pair]
+    space = CandidateEngine.count_candidates(n, n_pathology)
+    finite = bool(np.all(np.isfinite(targets)))
+    with instrumentation.phase('enumerate'):
+        subtrees = Subtrees(pair, n, n_pathology)
+        rows = np.arange(len(subtrees.size), dtype=np.int64)
+        bounds = [MetricBound(label, target, subtrees, rows) for label, target in zip(labels, targets)]
+        lower = bounds[0].minimum + bounds[1].minimum
+        # With a non-finite target every error is inf or nan and nothing can be bounded.
+        order = np.argsort(lower, kind='stable') if finite else rows
+
+    best = TopK(top_k) if top_k is not None else None
+    parts = []
+    evaluated = 0
+    start, group_rows = 0, FIRST_GROUP_ROWS
+    while start < len(order):
+        threshold = tolerance
+        if best is not None:
+            total = best.columns[4]
+            threshold = total[-1] if len(total) == top_k and not np.isnan(total[-1]) else np.inf
+        # Few rows while the threshold is loose, more once it has settled; at most about
+        # chunk_size matrices either way.
+        group = order[start:start + group_rows]
+        cum = np.cumsum(subtrees.size[group] + 1)
+        group = group[:max(1, int(np.searchsorted(cum, chunk_size, side='right')))]
+        start += len(group)
+        group_rows = min(2 * group_rows, GROUP_ROWS)
+        if finite:
+            if lower[group[0]] > threshold:
+                break
+            group = group[~(lower[group] > threshold)]
+        with instrumentation.phase('evaluate'):
+            lo, hi = np.zeros_like(group), subtrees.size[group]
+            if finite and np.isfinite(threshold):
+                for bound, other in ((bounds[0], bounds[1]), (bounds[1], bounds[0])):
+                    limit = threshold - other.minimum[group] + LIMIT_SLACK
+                    b_lo, b_hi = bound.interval(group, limit)
+                    lo, hi = np.maximum(lo, b_lo), np.minimum(hi, b_hi)
+            keep = lo <= hi
+            tp, tn, fp, fn = subtrees.matrices(group[keep], lo[keep], hi[keep])
+            _, _, total = CandidateEngine.score_candidates(labels, targets, tp, tn, fp, fn)
+            evaluated += len(total)
+            instrumentation.count('evaluated', len(total))
+            if best is not None:
+                best.push(tp, tn, fp, fn, total)
+            else:
+                exact = total <= tolerance
+                parts.append((tp[exact], tn[exact], fp[exact], fn[exact], total[exact]))
+    if best is not None:
+        tp, tn, fp, fn, total = best.columns
+    elif parts:
+        tp, tn, fp, fn, total = (np.concatenate(cols) for cols in zip(*parts))
+    else:
+        tp = tn = fp = fn = np.zeros(0, dtype=np.int64)
+        total = np.zeros(0)
+    searched = evaluated / space if space else 1.0
+    with instrumentation.phase('materialize'):
+        return build_results(labels, targets, tp, tn, fp, fn, tolerance, n, total=total,
+                             error_dtype=error_dtype, summary={'searched': searched, 'pruned': 1.0 - searched})
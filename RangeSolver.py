@@ -0,0 +1,160 @@
+"""
+Unknown-n mode: the top-k confusion matrices for every sample size in n_min..n_max.
+
+For Sn/Sp and PPV/NPV the metrics split on a margin m (tp + fn, or tp + fp) and its
+complement n - m: the first error depends only on (a, m) and the second only on
+(b, n - m). The per-margin tables, i.e. the numerators within a window of about top_k
+around the target and their errors, therefore depend on the margin size alone. They
+are built once for m = 0..n_max and shared by every n. For one n each margin's best
+matrix costs a single addition; the k-th smallest of those bounds the k-th best error,
+and only the table entries that can still beat it are paired and ranked. A range scan
+thus costs O(n) per n instead of a full margin solve.
+
+The likelihood ratios, and PPV/NPV with a fixed n_pathology, do not split this way;
+those (and non-finite targets) are solved n by n with CandidateEngine.solve_pair.
+"""
+import numpy as np
+import CandidateEngine
+import Instrumentation
+import MarginSolver
+from CountsToMetrics import safe_divide
+
+# The per-side limits are bound minus the other side's best error; the slack keeps
+# candidates that tie the bound despite float rounding (the final ranking is exact).
+BOUND_SLACK = 1e-12
+
+
+class MarginTable:
+    """
+    Window of candidate numerators for every margin size 0..n_max, sorted by error.
+    """
+
+    def __init__(self, target, n_max, top_k):
+        sizes = np.arange(n_max + 1, dtype=np.int64)
+        values, valid = MarginSolver.integer_windows(target * sizes, top_k + 1, np.zeros_like(sizes), sizes)
+        errors = np.abs(target - safe_divide(values, sizes[:, None]))
+        errors[~valid] = np.inf
+        order = np.argsort(errors, axis=1, kind='stable')
+        self.values = np.take_along_axis(values, order, axis=1)
+        self.errors = np.take_along_axis(errors, order, axis=1)
+        self.best = self.errors[:, 0]
+
+    def within(self, sizes, limit):
+        """
+        Entries of the given margin sizes with error <= limit (one limit per size).
+
+        Returns:
+            tuple: (row index into sizes, numerator) int64 arrays
+        """
+        errors = self.errors[sizes]
+        keep = np.isfinite(errors) & (errors <= limit[:, None] + BOUND_SLACK)
+        rows = np.broadcast_to(np.arange(len(sizes))[:, None], keep.shape)[keep]
+        return rows, self.values[sizes][keep]
+
+
+def _pair_rows(a_rows, a, b_rows, b):
+    """Every (a, b) combination that shares a row, as (row, a, b) arrays."""
+    a_order = np.argsort(a_rows, kind='stable')
+    b_order = np.argsort(b_rows, kind='stable')
+    a_rows, a = a_rows[a_order], a[a_order]
+    b_rows, b = b_rows[b_order], b[b_order]
+    rows = np.union1d(a_rows, b_rows)
+    a_start, a_stop = np.searchsorted(a_rows, rows), np.searchsorted(a_rows, rows, side='right')
+    b_start, b_stop = np.searchsorted(b_rows, rows), np.searchsorted(b_rows, rows, side='right')
+    a_count, b_count = a_stop - a_start, b_stop - b_start
+    pairs = a_count * b_count
+    row = np.repeat(rows, pairs)
+    # Position within each row's a_count x b_count block.
+    within = CandidateEngine.ragged_arange(np.zeros_like(pairs), pairs)
+    b_count_rep = np.repeat(b_count, pairs)
+    a_index = np.repeat(a_start, pairs) + within // np.maximum(b_count_rep, 1)
+    b_index = np.repeat(b_start, pairs) + within % np.maximum(b_count_rep, 1)
+    return row, a[a_index], b[b_index]
+
+
+def _separable_n(pair, labels, targets, n, first, second, margins, top_k, instrumentation):
+    """
+    Top-k (tp, tn, fp, fn) for one n from the shared tables.
+    """
+    others = n - margins
+    best = first.best[margins] + second.best[others]
+    bound = np.partition(best, top_k - 1)[top_k - 1] if len(best) >= top_k else np.inf
+    live = np.flatnonzero(best <= bound)
+    if np.isinf(bound):
+        live = np.flatnonzero(np.isfinite(best))
+    m, other = margins[live], others[live]
+    a_rows, a = first.within(m, bound - second.best[other])
+    b_rows, b = second.within(other, bound - first.best[m])
+    row, a, b = _pair_rows(a_rows, a, b_rows, b)
+    m, other = m[row], other[row]
+    if pair == 'snspn':
+        candidates = (a, b, other - b, m - a)
+    else:
+        candidates = (a, b, m - a, other - b)
+    instrumentation.count('evaluated', len(a))
+    return CandidateEngine.top_k_candidates(labels, targets, *candidates, top_k)
+
+
+def solve_range(pair, targets, n_min, n_max, tolerance=1e-6, n_pathology=None,
+                top_k=CandidateEngine.DEFAULT_TOP_K, error_dtype=np.float64,
+                instrumentation=Instrumentation.NULL):
+    """
+    Top-k matrices for every sample size from n_min to n_max.
+
+    Args:
+        pair (str): Key into CandidateEngine.PAIRS ('snspn', 'ppvnpv' or 'lr')
+        targets (tuple): Target values for the two metrics of the pair
+        n_min, n_max (int): Inclusive range of sample sizes
+        tolerance (float): Total error at or below which a row is an exact match
+        n_pathology (int, optional): Fixes tp + fn (sizes below it are skipped)
+        top_k (int): Matrices kept per sample size
+        error_dtype: np.float64 or np.float32 for the stored Total_Error
+        instrumentation (Instrumentation, optional): Collects phase timings and counters
+
+    Returns:
+        dict: n -> CandidateResults, in increasing n; each equals
+        solve_pair(pair, targets, n, method='margin', top_k=top_k)
+    """
+    if not 0 <= n_min <= n_max:
+        raise ValueError("Need 0 <= n_min <= n_max")
+    if top_k is None or top_k < 1:
+        raise ValueError("Range mode needs top_k >= 1")
+    labels = CandidateEngine.PAIRS[pair]
+    sizes = range(max(n_min, n_pathology or 0), n_max + 1)
+    separable = (pair == 'snspn' or (pair == 'ppvnpv' and n_pathology is None)) and np.all(np.isfinite(targets))
+    results = {}
+    if not separable:
+        for n in sizes:
+            results[n] = CandidateEngine.solve_pair(pair, targets, n, tolerance, n_pathology, method='margin',
+                                                    top_k=top_k, error_dtype=error_dtype,
+                                                    instrumentation=instrumentation)
+        return results
+    with instrumentation.phase('enumerate'):
+        first = MarginTable(targets[0], n_max, top_k)
+        second = MarginTable(targets[1], n_max, top_k)
+    for n in sizes:
+        if n_pathology is None:
+            margins = np.arange(n + 1, dtype=np.int64)
+        else:
+            margins = np.array([n_pathology], dtype=np.int64)
+        with instrumentation.phase('evaluate'):
+            best = _separable_n(pair, labels, targets, n, first, second, margins, top_k, instrumentation)
+        with instrumentation.phase('materialize'):
+            results[n] = CandidateEngine.build_results(labels, targets, *best, tolerance, n,
+                                                       error_dtype=error_dtype)
+    instrumentation.finish(sum(CandidateEngine.count_candidates(n, n_pathology) for n in sizes),
+                           sum(len(r) for r in results.values()))
+    return results
+
+
+def best_across(results, top_k=CandidateEngine.DEFAULT_TOP_K):
+    """
+    The top_k rows over all sample sizes of a solve_range result, as one DataFrame with
+    an N column, sorted by Total_Error (ties by n).
+    """
+    import pandas as pd
+    frames = [r.to_frame().assign(N=n) for n, r in results.items() if len(r)]
+    if not frames:
+        return pd.DataFrame()
+    frame = pd.concat(frames, ignore_index=True)
+    return frame.sort_values(['Total_Error', 'N'], kind='stable').head(top_k).reset_index(drop=True)
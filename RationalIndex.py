@@ -0,0 +1,293 @@
+"""
+Precomputed, memory-mapped index of the ratios a / b (0 <= a <= b <= n_max) behind every
+Sn, Sp, PPV and NPV value, for sub-millisecond lookups.
+
+The index is a directory of .npy files sorted by value (values, numerators,
+denominators) plus meta.json, opened with np.load(mmap_mode='r'), so a query only
+touches the pages its binary searches land on. 0/0 is stored as 0.0, the solvers'
+convention for an empty margin.
+
+Pair queries join two value windows on their denominators:
+- Sn/Sp: tp / (tp + fn) and tn / (tn + fp), denominators summing to n.
+- PPV/NPV: tp / (tp + fp) and tn / (tn + fn), denominators summing to n.
+- LRs: the PLR/NLR box is mapped back to a sensitivity/specificity box (the map is
+  monotone on each side of PLR = 1 and NLR = 1) and then queried like Sn/Sp.
+A top-k query grows the search radius until k matrices lie within it; every matrix
+within the radius is guaranteed to be in the windows, so the result is exact.
+
+Build from the command line:
+    python RationalIndex.py DIRECTORY --n-max 2000
+"""
+import argparse
+import functools
+import json
+from pathlib import Path
+
+import numpy as np
+import CandidateEngine
+import Instrumentation
+from CandidateResults import count_dtype
+from CountsToMetrics import safe_divide
+
+FORMAT_VERSION = 1
+WINDOW_SLACK = 1e-9
+
+
+def ratio_table(n_max):
+    """
+    Every ratio a / b with 0 <= a <= b <= n_max, sorted by value (ties by denominator,
+    then numerator).
+
+    Returns:
+        tuple: (values float64, numerators, denominators in count_dtype(n_max))
+    """
+    dens = np.arange(n_max + 1, dtype=np.int64)
+    den = np.repeat(dens, dens + 1)
+    num = CandidateEngine.ragged_arange(np.zeros_like(dens), dens + 1)
+    values = safe_divide(num, den)
+    order = np.lexsort((num, den, values))
+    dtype = count_dtype(n_max)
+    return values[order], num[order].astype(dtype), den[order].astype(dtype)
+
+
+def build_index(path, n_max):
+    """
+    Write the sorted ratio tables for every denominator up to n_max.
+
+    Args:
+        path (str or Path): Directory to create (or overwrite)
+        n_max (int): Largest denominator, i.e. largest n the index can answer
+
+    Returns:
+        Path: The index directory
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    values, numerators, denominators = ratio_table(n_max)
+    np.save(path / 'values.npy', values)
+    np.save(path / 'numerators.npy', numerators)
+    np.save(path / 'denominators.npy', denominators)
+    with open(path / 'meta.json', 'w') as f:
+        json.dump({'format_version': FORMAT_VERSION, 'n_max': n_max, 'rows': int(len(values))}, f)
+    load_index.cache_clear()
+    return path
+
+
+class RationalIndex:
+    """
+    Read-only view of an index directory written by build_index.
+    """
+
+    def __init__(self, path):
+        path = Path(path)
+        with open(path / 'meta.json') as f:
+            meta = json.load(f)
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported index format in {path}: {meta.get('format_version')!r}")
+        self.path = path
+        self.n_max = meta['n_max']
+        self.values = np.load(path / 'values.npy', mmap_mode='r')
+        self.numerators = np.load(path / 'numerators.npy', mmap_mode='r')
+        self.denominators = np.load(path / 'denominators.npy', mmap_mode='r')
+
+    @classmethod
+    def in_memory(cls, n_max):
+        """
+        The same index built in memory instead of read from a directory.
+        """
+        index = cls.__new__(cls)
+        index.path = None
+        index.n_max = n_max
+        index.values, index.numerators, index.denominators = ratio_table(n_max)
+        return index
+
+    def window(self, lo, hi, max_den):
+        """
+        All ratios a / b with lo <= a / b <= hi and b <= max_den, by binary search.
+
+        Returns:
+            tuple: (numerators, denominators) int64 arrays
+        """
+        start = np.searchsorted(self.values, lo, side='left')
+        stop = np.searchsorted(self.values, hi, side='right')
+        num = np.asarray(self.numerators[start:stop], dtype=np.int64)
+        den = np.asarray(self.denominators[start:stop], dtype=np.int64)
+        keep = den <= max_den
+        return num[keep], den[keep]
+
+
+@functools.lru_cache(maxsize=8)
+def load_index(path):
+    """
+    Open (once per process) the index stored at path.
+    """
+    return RationalIndex(path)
+
+
+def _join(first, second, n):
+    """
+    Pairs of ratio hits whose denominators sum to n.
+
+    Returns:
+        tuple: (a1, b1, a2, b2) int64 arrays
+    """
+    a1, b1 = first
+    a2, b2 = second
+    order = np.argsort(b2, kind='stable')
+    a2, b2 = a2[order], b2[order]
+    start = np.searchsorted(b2, n - b1, side='left')
+    stop = np.searchsorted(b2, n - b1, side='right')
+    lengths = stop - start
+    picks = CandidateEngine.ragged_arange(start, stop)
+    return np.repeat(a1, lengths), np.repeat(b1, lengths), a2[picks], b2[picks]
+
+
+def _lr_box(plr_range, nlr_range):
+    """
+    Sensitivity and specificity ranges covering every (s, p) whose PLR and NLR lie in
+    the given ranges, or None when the box touches PLR = NLR, where the map from
+    (PLR, NLR) back to (s, p) is singular.
+    """
+    x_lo, x_hi = max(plr_range[0], 0.0), plr_range[1]
+    y_lo, y_hi = max(nlr_range[0], 0.0), nlr_range[1]
+    if not (x_lo > y_hi or y_lo > x_hi) or not np.isfinite(x_hi) or not np.isfinite(y_hi):
+        return None
+    # s = x (1 - y) / (x - y) and p = (x - 1) / (x - y) are monotone in x and in y as
+    # long as the sub-box does not straddle x = 1 or y = 1, so corners give the extremes.
+    xs = sorted({x_lo, x_hi} | ({1.0} if x_lo < 1 < x_hi else set()))
+    ys = sorted({y_lo, y_hi} | ({1.0} if y_lo < 1 < y_hi else set()))
+    x, y = np.meshgrid(xs, ys)
+    s = x * (1 - y) / (x - y)
+    p = (x - 1) / (x - y)
+    return (max(s.min(), 0.0), min(s.max(), 1.0)), (max(p.min(), 0.0), min(p.max(), 1.0))
+
+
+def _candidates(index, pair, targets, n, n_pathology, radius):
+    """
+    Every matrix whose total error could be <= radius, as (tp, tn, fp, fn), or None if
+    the windows cannot be bounded (LRs near PLR = NLR).
+    """
+    if pair == 'lr':
+        box = _lr_box((targets[0] - radius, targets[0] + radius), (targets[1] - radius, targets[1] + radius))
+        if box is None:
+            return None
+        windows = box
+    else:
+        windows = [(target - radius, target + radius) for target in targets]
+    # Widen by WINDOW_SLACK so float rounding never drops a matrix; the exact errors
+    # are checked afterwards.
+    first = index.window(windows[0][0] - WINDOW_SLACK, windows[0][1] + WINDOW_SLACK, n)
+    second = index.window(windows[1][0] - WINDOW_SLACK, windows[1][1] + WINDOW_SLACK, n)
+    if n_pathology is not None and pair in ('snspn', 'lr'):
+        keep = first[1] == n_pathology
+        first = (first[0][keep], first[1][keep])
+    a1, b1, a2, b2 = _join(first, second, n)
+    if pair == 'ppvnpv':
+        tp, fp, tn, fn = a1, b1 - a1, a2, b2 - a2
+    else:
+        tp, fn, tn, fp = a1, b1 - a1, a2, b2 - a2
+    if n_pathology is not None:
+        keep = tp + fn == n_pathology
+        tp, tn, fp, fn = tp[keep], tn[keep], fp[keep], fn[keep]
+    return tp, tn, fp, fn
+
+
+def query_pair(pair, targets, n, index_path, tolerance=1e-6, n_pathology=None, top_k=None,
+               error_dtype=np.float64, instrumentation=Instrumentation.NULL):
+    """
+    Answer a solver query from the index instead of enumerating.
+
+    With top_k=None, returns every matrix whose total error is <= tolerance (the
+    exact matches); otherwise the top_k nearest matrices.
+
+    Args:
+        pair (str): Key into CandidateEngine.PAIRS ('snspn', 'ppvnpv' or 'lr')
+        targets (tuple): Target values for the two metrics of the pair
+        n (int): Total number of samples, at most the index's n_max
+        index_path (str or Path): Directory written by build_index, or an open
+            RationalIndex (e.g. RationalIndex.in_memory(n))
+        tolerance (float): Total error at or below which a row is an exact match
+        n_pathology (int, optional): Fixes tp + fn
+        top_k (int, optional): Return the top_k nearest matrices instead
+        error_dtype: np.float64 or np.float32 for the stored Total_Error
+        instrumentation (Instrumentation): Counts the matrices evaluated
+
+    Returns:
+        CandidateResults: Sorted by Total_Error
+    """
+    index = index_path if isinstance(index_path, RationalIndex) else load_index(str(index_path))
+    if n > index.n_max:
+        raise ValueError(f"n={n} exceeds the index's n_max={index.n_max}")
+    labels = CandidateEngine.PAIRS[pair]
+    empty = tuple(np.zeros(0, dtype=np.int64) for _ in range(4))
+    if n_pathology is not None and not 0 <= n_pathology <= n:
+        return CandidateEngine.build_results(labels, targets, *empty, tolerance, n, error_dtype=error_dtype)
+    radius = tolerance if top_k is None else max(tolerance, 0.5 / max(n, 1))
+    while True:
+        candidates = _candidates(index, pair, targets, n, n_pathology, radius)
+        if candidates is None:
+            # Unbounded LR window: fall back to the margin or joint solver.
+            if top_k is None:
+                return exact_matches(pair, targets, n, tolerance, n_pathology, error_dtype)
+            import MarginSolver
+            best = MarginSolver.solve_margins(pair, targets, n, n_pathology, top_k, instrumentation=instrumentation)
+            return CandidateEngine.build_results(labels, targets, *best, tolerance, n, error_dtype=error_dtype)
+        _, _, total = CandidateEngine.score_candidates(labels, targets, *candidates)
+        instrumentation.count('evaluated', len(total))
+        within = ~(total > radius)
+        if top_k is None or within.sum() >= top_k or radius > _max_radius(pair, targets):
+            tp, tn, fp, fn = (c[within] for c in candidates)
+            total = total[within]
+            if top_k is not None:
+                order = CandidateEngine.top_k_order(total, tp, tn, fp, top_k)
+                tp, tn, fp, fn, total = tp[order], tn[order], fp[order], fn[order], total[order]
+            return CandidateEngine.build_results(labels, targets, tp, tn, fp, fn, tolerance, n,
+                                                 total=total, error_dtype=error_dtype)
+        radius *= 4
+
+
+def _max_radius(pair, targets):
+    """
+    Radius beyond which every matrix with a finite total error is inside the windows.
+    """
+    if pair == 'lr':
+        return np.inf
+    return sum(max(abs(t), abs(1 - t)) for t in targets) + 1.0
+
+
+def exact_matches(pair, targets, n, tolerance=1e-6, n_pathology=None, error_dtype=np.float64):
+    """
+    Every matrix with total error <= tolerance, via JointSolver's bound propagation.
+    Used where the index windows do not bound the search (an unbounded LR window) and
+    by MultiQuery above its grid size.
+
+    Args:
+        pair (str): Key into CandidateEngine.PAIRS ('snspn', 'ppvnpv' or 'lr')
+        targets (tuple): Target values for the two metrics of the pair
+        n (int): Total number of samples
+        tolerance (float): Total error at or below which a row is an exact match
+        n_pathology (int, optional): Fixes tp + fn
+        error_dtype: np.float64 or np.float32 for the stored Total_Error
+
+    Returns:
+        CandidateResults: The exact matches, sorted by Total_Error
+    """
+    import JointSolver
+    metrics = dict(zip(CandidateEngine.PAIRS[pair], targets))
+    results = JointSolver.solve_metrics(metrics, n, n_pathology, tolerances=tolerance, tolerance=tolerance,
+                                        error_dtype=error_dtype)
+    return results.take(results['Total_Error'] <= tolerance)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the memory-mapped rational index.")
+    parser.add_argument('path', help="Output directory")
+    parser.add_argument('--n-max', type=int, required=True, help="Largest sample size the index answers")
+    args = parser.parse_args(argv)
+    path = build_index(args.path, args.n_max)
+    index = load_index(str(path))
+    print(f"Wrote {len(index.values):,} ratios for n <= {index.n_max} to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Size-bounded LRU cache with a time-to-live, shared by every app session.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAXSIZE = 128
+DEFAULT_TTL = 3600.0
+
+
+class ResultCache:
+    """
+    Thread-safe LRU/TTL cache of solver results.
+
+    Keys should not include the exact-match tolerance: a CandidateResults only uses it
+    to flag Exact_Match, so a hit is re-flagged for the requested tolerance instead of
+    being recomputed.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL):
+        """
+        Args:
+            maxsize (int): Entries kept before the least recently used is evicted
+            ttl (float): Seconds an entry stays valid (None for no expiry)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get_or_compute(self, key, compute, tolerance=None):
+        """
+        Return the cached result for key, or compute(), store and return it.
+
+        Args:
+            key (tuple): Hashable cache key, e.g. (module, metric values, n, n_pathology)
+            compute (callable): Builds the result on a miss
+            tolerance (float, optional): Re-flag Exact_Match of the returned result
+
+        Returns:
+            The result; with tolerance, a CandidateResults view sharing the cached rows
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if value is None:
+            # Solve outside the lock so other sessions are not blocked meanwhile.
+            value = compute()
+            with self._lock:
+                self._entries[key] = (time.monotonic(), value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        if tolerance is not None and hasattr(value, 'with_tolerance'):
+            value = value.with_tolerance(tolerance)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Counters for display: hits, misses, evictions, size and maxsize."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'size': len(self._entries), 'maxsize': self.maxsize}
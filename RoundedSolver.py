@@ -0,0 +1,197 @@
+"""
+Rounding-aware solver: find every confusion matrix whose metrics round to the
+published values.
+
+A value v reported to d decimals stands for a ratio r = num / den with
+v - h <= r <= v + h, h = 0.5 * 10^-d (both ends are kept so round-half-up and
+round-half-even reports are covered). With V = v * 10^d and D2 = 2 * 10^d that is
+the integer test (2V - 1) * den <= D2 * num <= (2V + 1) * den, so no float threshold
+is involved. A zero denominator gives the ratio 0.0, as in CountsToMetrics.
+
+As in JointSolver, the reports are first turned into bounds: prevalence bounds the
+disease margin P, sensitivity bounds tp for each P, and specificity, accuracy, PPV
+and NPV bound tn for each (P, tp), all with exact ceil/floor integer division. Only
+the matrices inside the bounds are generated, and each is then checked with the
+integer test above.
+"""
+import numpy as np
+import CandidateEngine
+import Instrumentation
+from CandidateEngine import RunningSummary, TopK, build_results, iter_row_chunks, ragged_arange
+from CandidateResults import count_dtype
+from CountsToMetrics import PROPORTIONS
+
+# Metrics that are a ratio of counts; the likelihood ratios are ratios of ratios.
+SUPPORTED = tuple(PROPORTIONS)
+
+
+def _ceil_div(a, b):
+    return -((-a) // b)
+
+
+class Reported:
+    """
+    A metric value as published, rounded to a number of decimals.
+    """
+
+    def __init__(self, value, decimals):
+        scale = 10 ** int(decimals)
+        scaled = float(value) * scale
+        units = int(round(scaled))
+        if abs(scaled - units) > 1e-6 * max(1.0, abs(scaled)):
+            raise ValueError(f"{value!r} has more than {decimals} decimals")
+        if not 0 <= units <= scale:
+            raise ValueError(f"{value!r} is not a ratio in [0, 1]")
+        self.value = units / scale
+        self.decimals = int(decimals)
+        self.units = units
+        self.lower = 2 * units - 1
+        self.upper = 2 * units + 1
+        self.scale2 = 2 * scale
+
+    @property
+    def half_width(self):
+        return 0.5 / (self.scale2 // 2)
+
+    def numerator_range(self, den):
+        """
+        Inclusive range of numerators num in [0, den] with num / den rounding to the value.
+        den may be an int or an int64 array; den == 0 is in range only for a reported 0.
+        """
+        den = np.asarray(den, dtype=np.int64)
+        lo = np.maximum(_ceil_div(self.lower * den, self.scale2), 0)
+        hi = np.minimum((self.upper * den) // self.scale2, den)
+        zero = den == 0
+        lo = np.where(zero, 0, lo)
+        hi = np.where(zero, 0 if self.units == 0 else -1, hi)
+        return lo, hi
+
+    def matches(self, num, den):
+        """Exact integer test of num / den (0.0 where den == 0) against the report."""
+        num = np.asarray(num, dtype=np.int64)
+        den = np.asarray(den, dtype=np.int64)
+        inside = (self.lower * den <= self.scale2 * num) & (self.scale2 * num <= self.upper * den)
+        return np.where(den > 0, inside, self.units == 0)
+
+
+def _normalize(metrics, decimals):
+    reports = {}
+    for label, value in metrics.items():
+        if label not in SUPPORTED:
+            raise ValueError(f"Rounding-aware mode supports {', '.join(SUPPORTED)}, not {label!r}")
+        places = decimals.get(label) if isinstance(decimals, dict) else decimals
+        if places is None:
+            raise ValueError(f"No decimals given for {label!r}")
+        reports[label] = Reported(value, places)
+    return reports
+
+
+def iter_rounded_rows(reports, n, n_pathology=None):
+    """
+    Yield (tp, fn, tn_lo, tn_hi) row arrays, one batch per disease margin, covering every
+    matrix that can round to the reports.
+    """
+    p_lo, p_hi = (0, n) if n_pathology is None else (n_pathology, n_pathology)
+    if 'Prevalence' in reports:
+        lo, hi = reports['Prevalence'].numerator_range(n)
+        p_lo, p_hi = max(p_lo, int(lo)), min(p_hi, int(hi))
+    for margin in range(max(p_lo, 0), min(p_hi, n) + 1):
+        n_healthy = n - margin
+        t_lo, t_hi = 0, margin
+        if 'Sensitivity' in reports:
+            lo, hi = reports['Sensitivity'].numerator_range(margin)
+            t_lo, t_hi = int(lo), int(hi)
+        if t_hi < t_lo:
+            continue
+        tp = np.arange(t_lo, t_hi + 1, dtype=np.int64)
+        fn = margin - tp
+        lo = np.zeros_like(tp)
+        hi = np.full_like(tp, n_healthy)
+        if 'Specificity' in reports:
+            s_lo, s_hi = reports['Specificity'].numerator_range(n_healthy)
+            lo, hi = np.maximum(lo, s_lo), np.minimum(hi, s_hi)
+        if 'Accuracy' in reports:
+            a_lo, a_hi = reports['Accuracy'].numerator_range(n)
+            lo, hi = np.maximum(lo, a_lo - tp), np.minimum(hi, a_hi - tp)
+        if 'PPV' in reports:
+            # tp > 0: lower * (tp + fp) <= D2 * tp <= upper * (tp + fp), with fp = N - tn.
+            # tp == 0: PPV is 0.0 whatever fp is.
+            report = reports['PPV']
+            positive = tp > 0
+            if report.lower > 0:
+                lo = np.where(positive, np.maximum(lo, tp + n_healthy - (report.scale2 * tp) // report.lower), lo)
+            hi = np.where(positive, np.minimum(hi, tp + n_healthy - _ceil_div(report.scale2 * tp, report.upper)), hi)
+            if report.units != 0:
+                hi = np.where(positive, hi, -1)
+        if 'NPV' in reports:
+            # lower * (tn + fn) <= D2 * tn <= upper * (tn + fn); the tn + fn == 0 corner is
+            # left to the exact test.
+            report = reports['NPV']
+            lo = np.maximum(lo, _ceil_div(report.lower * fn, report.scale2 - report.lower))
+            if report.scale2 > report.upper:
+                hi = np.minimum(hi, (report.upper * fn) // (report.scale2 - report.upper))
+        keep = lo <= hi
+        if keep.any():
+            yield tp[keep], fn[keep], lo[keep], hi[keep]
+
+
+def solve_rounded(metrics, decimals, n, n_pathology=None, top_k=None,
+                  chunk_size=CandidateEngine.DEFAULT_CHUNK_SIZE, error_dtype=np.float64,
+                  instrumentation=Instrumentation.NULL):
+    """
+    Every confusion matrix whose metrics round to the reported values.
+
+    Args:
+        metrics (dict): Reported values keyed by 'Sensitivity', 'Specificity', 'PPV',
+            'NPV', 'Prevalence' or 'Accuracy'
+        decimals (int or dict): Decimals each value was reported to (one for all, or
+            keyed like metrics)
+        n (int): Total number of samples
+        n_pathology (int, optional): Fixes tp + fn
+        top_k (int, optional): Only keep the top_k closest matrices
+        chunk_size (int): Matrices generated per NumPy batch
+        error_dtype: np.float64 or np.float32 for the stored Total_Error
+        instrumentation (Instrumentation): Counts the matrices inside the bounds as 'evaluated'
+
+    Returns:
+        CandidateResults: The consistent matrices, sorted by summed absolute error against
+        the reported values; all are flagged Exact_Match, and .summary covers them all
+    """
+    reports = _normalize(metrics, decimals)
+    if not reports:
+        raise ValueError("At least one metric is required")
+    labels = tuple(reports)
+    targets = tuple(report.value for report in reports.values())
+    # Every consistent matrix is within half a unit of each report; the slack absorbs
+    # float rounding of the errors.
+    tolerance = sum(report.half_width for report in reports.values()) * (1 + 1e-9)
+
+    summary = RunningSummary(tolerance)
+    best = TopK(top_k) if top_k is not None else None
+    compact = count_dtype(n)
+    parts = []
+    for tp, fn, tn_lo, tn_hi in iter_row_chunks(iter_rounded_rows(reports, n, n_pathology), chunk_size):
+        lengths = tn_hi - tn_lo + 1
+        tp = np.repeat(tp, lengths)
+        fn = np.repeat(fn, lengths)
+        tn = ragged_arange(tn_lo, tn_hi + 1)
+        fp = n - tp - fn - tn
+        instrumentation.count('evaluated', len(tp))
+        keep = np.logical_and.reduce([report.matches(*PROPORTIONS[label](tp, tn, fp, fn))
+                                      for label, report in reports.items()])
+        tp, tn, fp, fn = tp[keep], tn[keep], fp[keep], fn[keep]
+        _, _, total = CandidateEngine.score_candidates(labels, targets, tp, tn, fp, fn)
+        summary.update(total)
+        if best is not None:
+            best.push(tp, tn, fp, fn, total)
+        else:
+            parts.append(tuple(a.astype(compact) for a in (tp, tn, fp, fn)) + (total.astype(error_dtype),))
+    if best is not None:
+        tp, tn, fp, fn, total = best.columns
+    elif parts:
+        tp, tn, fp, fn, total = (np.concatenate(cols) for cols in zip(*parts))
+    else:
+        tp = tn = fp = fn = np.zeros(0, dtype=compact)
+        total = np.zeros(0, dtype=error_dtype)
+    return build_results(labels, targets, tp, tn, fp, fn, tolerance, n, total=total,
+                         error_dtype=error_dtype, summary=summary.as_dict())
@@ -0,0 +1,381 @@
+"""
+Distributed runs: split a batch of studies, or one huge-n search, into numbered shards
+that separate machines run independently, then merge the partial results.
+
+A job spec is a small JSON file. kind='batch' names a study table in the BatchCLI
+format, and each row goes to the shard given by a stable hash of its id.
+kind='search' describes a single solve_pair query, and its units (tp values for
+method='enumerate', margins for method='margin') are hashed to shards the same way.
+The hashes (blake2b for ids, a splitmix64 mix for unit numbers) do not depend on
+the machine, the Python version or PYTHONHASHSEED, so every node derives the same
+split from the spec alone.
+
+Each node runs the shards given to it (shard % nodes == node) into a shared or
+later-collected directory. Batch shards append every solved study to
+shard-<i>.csv and fsync it, as BatchCLI does. Search shards save their partial top-k
+to shard-<i>.json at least every CHECKPOINT_SECONDS. A rerun resumes from there. A
+shard counts as done once its shard-<i>.json says complete, and the JSON carries the
+spec digest, so partials from another spec are never mixed in. merge rebuilds
+exactly the single-node result. For a batch that is the CSV that BatchCLI.run_batch
+writes; for a search it is the solve_pair rows, ranked by the same total order.
+
+    python ShardRunner.py spec-batch studies.csv job.json --shards 16
+    python ShardRunner.py spec-search snspn 0.8 0.7 --n 20000 job.json --shards 64
+    python ShardRunner.py run job.json parts --node 0 --nodes 4     # on each machine
+    python ShardRunner.py merge job.json parts results.csv
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+import BatchCLI
+import CandidateEngine
+
+SPEC_VERSION = 1
+
+# Search shards save their partial top-k at least this often (and when they finish).
+CHECKPOINT_SECONDS = 30.0
+
+# Search units (tp values or margins) solved between checkpoint checks.
+BLOCK_UNITS = 64
+
+SEARCH_METHODS = ('enumerate', 'margin')
+
+
+def shard_of(key, shards):
+    """Stable shard of a string key (e.g. a study id)."""
+    digest = hashlib.blake2b(str(key).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shards
+
+
+def unit_shards(units, shards):
+    """Stable shard of every unit number, vectorized (splitmix64 finalizer)."""
+    x = np.asarray(units, dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x = x ^ (x >> np.uint64(31))
+    return (x % np.uint64(shards)).astype(np.int64)
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def spec_digest(spec):
+    """Digest of a spec's canonical JSON; partial results record it."""
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def make_batch_spec(input_path, shards, method='margin', top_k=CandidateEngine.DEFAULT_TOP_K, tolerance=1e-6,
+                    index_path=None):
+    """
+    Spec for a sharded BatchCLI run over a study table (ids must be unique, as for
+    resuming). The table's SHA-256 is recorded so nodes refuse a different file.
+    """
+    if shards < 1:
+        raise ValueError("shards must be at least 1")
+    return {'version': SPEC_VERSION, 'kind': 'batch', 'shards': int(shards), 'input': str(input_path),
+            'input_sha256': _file_digest(input_path), 'method': method, 'top_k': int(top_k),
+            'tolerance': float(tolerance), 'index_path': None if index_path is None else str(index_path)}
+
+
+def make_search_spec(pair, targets, n, shards, n_pathology=None, method='enumerate',
+                     top_k=CandidateEngine.DEFAULT_TOP_K, tolerance=1e-6,
+                     chunk_size=CandidateEngine.DEFAULT_CHUNK_SIZE):
+    """
+    Spec for one solve_pair top-k query split over shards: tp values for
+    method='enumerate', disease (or predicted-positive) margins for method='margin'.
+    """
+    if pair not in CandidateEngine.PAIRS:
+        raise ValueError(f"Unknown pair: {pair!r}")
+    if method not in SEARCH_METHODS:
+        raise ValueError(f"Unknown search method: {method!r}")
+    if shards < 1 or top_k < 1:
+        raise ValueError("shards and top_k must be at least 1")
+    if method == 'margin' and not np.all(np.isfinite(targets)):
+        # As in solve_pair: the windowed search cannot rank non-finite targets.
+        method = 'enumerate'
+    if method == 'margin' and n_pathology is not None:
+        raise ValueError("method='margin' with n_pathology solves a single margin; there is nothing to shard")
+    return {'version': SPEC_VERSION, 'kind': 'search', 'shards': int(shards), 'pair': pair,
+            'targets': [float(t) for t in targets], 'n': int(n),
+            'n_pathology': None if n_pathology is None else int(n_pathology), 'method': method,
+            'top_k': int(top_k), 'tolerance': float(tolerance), 'chunk_size': int(chunk_size)}
+
+
+def save_spec(spec, path):
+    with open(path, 'w') as f:
+        json.dump(spec, f, indent=2, sort_keys=True)
+
+
+def load_spec(path):
+    with open(path) as f:
+        spec = json.load(f)
+    if spec.get('version') != SPEC_VERSION or spec.get('kind') not in ('batch', 'search'):
+        raise ValueError(f"Not a version {SPEC_VERSION} job spec: {path}")
+    return spec
+
+
+def _status_path(out_dir, shard):
+    return Path(out_dir) / f"shard-{shard:05d}.json"
+
+
+def _records_path(out_dir, shard):
+    return Path(out_dir) / f"shard-{shard:05d}.csv"
+
+
+def _write_json(path, data):
+    """Write data to path atomically (a reader sees the old or the new file, never half)."""
+    temp = Path(f"{path}.tmp")
+    with open(temp, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+
+
+def _read_status(spec, out_dir, shard):
+    """The shard's saved state, or None if missing or written for another spec."""
+    path = _status_path(out_dir, shard)
+    if not path.exists():
+        return None
+    with open(path) as f:
+        status = json.load(f)
+    return status if status.get('spec') == spec_digest(spec) else None
+
+
+def _batch_rows(spec):
+    if _file_digest(spec['input']) != spec['input_sha256']:
+        raise ValueError(f"{spec['input']} has changed since the spec was made")
+    return BatchCLI.table_rows(BatchCLI.read_table(spec['input']), spec['tolerance'])
+
+
+def search_units(spec):
+    """Every unit of a search spec: tp values, or margins for method='margin'."""
+    if spec['method'] == 'margin':
+        return np.arange(spec['n'] + 1, dtype=np.int64)
+    if spec['n_pathology'] is None:
+        return np.arange(spec['n'] + 1, dtype=np.int64)
+    if not 0 <= spec['n_pathology'] <= spec['n']:
+        return np.zeros(0, dtype=np.int64)
+    return np.arange(spec['n_pathology'] + 1, dtype=np.int64)
+
+
+def _run_batch_shard(spec, shard, out_dir, rows):
+    mine = [row for row in rows if shard_of(row['id'], spec['shards']) == shard]
+    path = _records_path(out_dir, shard)
+    done = BatchCLI.resume_output(path, spec['top_k'])
+    new_file = not path.exists() or path.stat().st_size == 0
+    with open(path, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=BatchCLI.OUTPUT_COLUMNS)
+        if new_file:
+            writer.writeheader()
+        for row in mine:
+            if row['id'] in done:
+                continue
+            writer.writerows(BatchCLI.solve_row(row, spec['method'], spec['top_k'], spec['index_path']))
+            f.flush()
+            os.fsync(f.fileno())
+    _write_json(_status_path(out_dir, shard), {'spec': spec_digest(spec), 'shard': shard, 'complete': True,
+                                               'rows': len(mine)})
+
+
+def _run_search_shard(spec, shard, out_dir, units, checkpoint_seconds):
+    pair, targets, n = spec['pair'], tuple(spec['targets']), spec['n']
+    labels = CandidateEngine.PAIRS[pair]
+    units = units[unit_shards(units, spec['shards']) == shard]
+    best = CandidateEngine.TopK(spec['top_k'])
+    start = 0
+    status = _read_status(spec, out_dir, shard)
+    if status is not None:
+        start = status['next']
+        rows = np.array(status['best'], dtype=np.float64).reshape(-1, 5)
+        best.columns = tuple(rows[:, i].astype(np.int64) for i in range(4)) + (rows[:, 4],)
+
+    def save(next_unit, complete):
+        rows = [[int(tp), int(tn), int(fp), int(fn), float(total)] for tp, tn, fp, fn, total in zip(*best.columns)]
+        _write_json(_status_path(out_dir, shard), {'spec': spec_digest(spec), 'shard': shard, 'complete': complete,
+                                                   'next': next_unit, 'units': len(units), 'best': rows})
+
+    saved = time.monotonic()
+    for stop in range(start + BLOCK_UNITS, len(units) + BLOCK_UNITS, BLOCK_UNITS):
+        block = units[start:stop]
+        if spec['method'] == 'margin':
+            import MarginSolver
+            chunks = [MarginSolver.solve_margin_subset(pair, targets, n, block, spec['top_k'])]
+        else:
+            chunks = CandidateEngine.iter_candidate_chunks(n, spec['n_pathology'], spec['chunk_size'], block)
+        for tp, tn, fp, fn in chunks:
+            _, _, total = CandidateEngine.score_candidates(labels, targets, tp, tn, fp, fn)
+            best.push(tp, tn, fp, fn, total)
+        start = min(stop, len(units))
+        if time.monotonic() - saved >= checkpoint_seconds:
+            save(start, False)
+            saved = time.monotonic()
+    save(len(units), True)
+
+
+def run_shards(spec, out_dir, node=0, nodes=1, checkpoint_seconds=CHECKPOINT_SECONDS):
+    """
+    Run this node's shards (shard % nodes == node), skipping finished ones and resuming
+    partial ones.
+
+    Args:
+        spec (dict): From make_batch_spec, make_search_spec or load_spec
+        out_dir (str or Path): Directory for the shard files (created if missing)
+        node (int): This node's number, 0 <= node < nodes
+        nodes (int): Number of nodes sharing the spec
+        checkpoint_seconds (float): Longest stretch of search work between checkpoints
+
+    Returns:
+        list: The shards run (already finished ones excluded)
+    """
+    if not 0 <= node < nodes:
+        raise ValueError("Need 0 <= node < nodes")
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    pending = [shard for shard in range(node, spec['shards'], nodes)
+               if not (_read_status(spec, out_dir, shard) or {}).get('complete')]
+    if not pending:
+        return []
+    work = _batch_rows(spec) if spec['kind'] == 'batch' else search_units(spec)
+    for shard in pending:
+        if spec['kind'] == 'batch':
+            _run_batch_shard(spec, shard, out_dir, work)
+        else:
+            _run_search_shard(spec, shard, out_dir, work, checkpoint_seconds)
+    return pending
+
+
+def shard_status(spec, out_dir):
+    """
+    Per shard: 'complete', 'partial' (checkpointed or started) or 'missing'.
+    """
+    states = {}
+    for shard in range(spec['shards']):
+        status = _read_status(spec, out_dir, shard)
+        if status is not None and status['complete']:
+            states[shard] = 'complete'
+        elif status is not None or _records_path(out_dir, shard).exists():
+            states[shard] = 'partial'
+        else:
+            states[shard] = 'missing'
+    return states
+
+
+def merge_shards(spec, out_dir, output_path=None):
+    """
+    Combine every shard's partial results into the single-node result.
+
+    Args:
+        spec (dict): The spec the shards were run with
+        out_dir (str or Path): Directory holding every shard's files
+        output_path (str, optional): CSV to write; for a batch it matches
+            BatchCLI.run_batch's output byte for byte
+
+    Returns:
+        For a batch, the number of output records; for a search, the CandidateResults
+        equal to solve_pair(..., top_k=top_k) on one node (without its summary)
+
+    Raises:
+        ValueError: If any shard is not complete
+    """
+    unfinished = [shard for shard, state in shard_status(spec, out_dir).items() if state != 'complete']
+    if unfinished:
+        raise ValueError(f"Shards not complete: {unfinished}")
+    if spec['kind'] == 'batch':
+        position = {}
+        for i, row in enumerate(_batch_rows(spec)):
+            position.setdefault(row['id'], i)
+        records = []
+        for shard in range(spec['shards']):
+            path = _records_path(out_dir, shard)
+            if path.exists():
+                with open(path, newline='') as f:
+                    records.extend(csv.DictReader(f))
+        records.sort(key=lambda record: position[record['id']])
+        if output_path is not None:
+            with open(output_path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=BatchCLI.OUTPUT_COLUMNS)
+                writer.writeheader()
+                writer.writerows(records)
+        return len(records)
+    rows = [np.array(_read_status(spec, out_dir, shard)['best'], dtype=np.float64).reshape(-1, 5)
+            for shard in range(spec['shards'])]
+    rows = np.concatenate(rows)
+    tp, tn, fp, fn = (rows[:, i].astype(np.int64) for i in range(4))
+    total = rows[:, 4]
+    order = CandidateEngine.top_k_order(total, tp, tn, fp, spec['top_k'])
+    labels = CandidateEngine.PAIRS[spec['pair']]
+    results = CandidateEngine.build_results(labels, tuple(spec['targets']), tp[order], tn[order], fp[order],
+                                            fn[order], spec['tolerance'], spec['n'], total=total[order])
+    if output_path is not None:
+        results.to_frame().to_csv(output_path, index=False)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sharded batch and search runs across machines.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    batch = commands.add_parser('spec-batch', help="Write a job spec for a study table")
+    batch.add_argument('input', help="Study table (.csv or .parquet)")
+    batch.add_argument('spec', help="Job spec to write")
+    batch.add_argument('--shards', type=int, required=True)
+    batch.add_argument('--method', default='margin', choices=['margin', 'enumerate', 'index'])
+    batch.add_argument('--top-k', type=int, default=CandidateEngine.DEFAULT_TOP_K)
+    batch.add_argument('--tolerance', type=float, default=1e-6)
+    batch.add_argument('--index', dest='index_path', default=None, help="RationalIndex directory for --method index")
+    search = commands.add_parser('spec-search', help="Write a job spec for one large query")
+    search.add_argument('pair', choices=list(CandidateEngine.PAIRS))
+    search.add_argument('value1', type=float)
+    search.add_argument('value2', type=float)
+    search.add_argument('spec', help="Job spec to write")
+    search.add_argument('--n', type=int, required=True)
+    search.add_argument('--n-pathology', type=int, default=None)
+    search.add_argument('--shards', type=int, required=True)
+    search.add_argument('--method', default='enumerate', choices=list(SEARCH_METHODS))
+    search.add_argument('--top-k', type=int, default=CandidateEngine.DEFAULT_TOP_K)
+    search.add_argument('--tolerance', type=float, default=1e-6)
+    run = commands.add_parser('run', help="Run this node's shards")
+    run.add_argument('spec')
+    run.add_argument('out_dir')
+    run.add_argument('--node', type=int, default=0)
+    run.add_argument('--nodes', type=int, default=1)
+    merge = commands.add_parser('merge', help="Merge every shard into the final result")
+    merge.add_argument('spec')
+    merge.add_argument('out_dir')
+    merge.add_argument('output', help="Output CSV")
+    status = commands.add_parser('status', help="Show which shards are complete")
+    status.add_argument('spec')
+    status.add_argument('out_dir')
+    args = parser.parse_args(argv)
+
+    if args.command == 'spec-batch':
+        save_spec(make_batch_spec(args.input, args.shards, args.method, args.top_k, args.tolerance,
+                                  args.index_path), args.spec)
+    elif args.command == 'spec-search':
+        save_spec(make_search_spec(args.pair, (args.value1, args.value2), args.n, args.shards, args.n_pathology,
+                                   args.method, args.top_k, args.tolerance), args.spec)
+    elif args.command == 'run':
+        shards = run_shards(load_spec(args.spec), args.out_dir, args.node, args.nodes)
+        print(f"Ran {len(shards)} shards", file=sys.stderr)
+    elif args.command == 'merge':
+        merge_shards(load_spec(args.spec), args.out_dir, args.output)
+    else:
+        states = shard_status(load_spec(args.spec), args.out_dir)
+        for state in ('complete', 'partial', 'missing'):
+            print(f"{state}: {sum(s == state for s in states.values())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,6 @@
-import itertools
-import pandas as pd
 import numpy as np
-try:
-    from tqdm import tqdm
-except ImportError:
-    tqdm = lambda *a, **k: a[0] if a else None
+import CandidateEngine
+import Instrumentation
 
 # Streamlit import is optional for standalone use
 try:
@@ -12,22 +8,74 @@ try:
 except ImportError:
     st = None
 
-def calculate_snspn(sensitivity, specificity, sample_size, tolerance=1e-6, show_progress=True, n_pathology=None):
+def calculate_snspn(sensitivity, specificity, sample_size, tolerance=1e-6, show_progress=True, n_pathology=None, backend='numpy', method='enumerate', top_k=None, error_dtype=np.float64, index_path=None, instrumentation=None, budget=None, cancel=None, on_snapshot=None, workers=1, decimals=None):
     """
     Estimate original confusion matrix values from sensitivity, specificity, and sample size.
-    Returns a DataFrame of possible confusion matrices.
+    Returns a CandidateResults of possible confusion matrices; see CandidateEngine.solve_pair
+    for method, top_k and the other options. backend='python' scores every matrix with the
+    original nested loops, kept as the reference implementation, and takes none of them.
+    """
+    if backend == 'python':
+        CandidateEngine.check_reference_options(method=method, top_k=top_k, error_dtype=error_dtype,
+                                                index_path=index_path, instrumentation=instrumentation,
+                                                budget=budget, cancel=cancel, on_snapshot=on_snapshot,
+                                                workers=workers, decimals=decimals)
+        frame = _calculate_snspn_python(sensitivity, specificity, sample_size, tolerance, show_progress, n_pathology)
+        return CandidateEngine.reference_results('snspn', (sensitivity, specificity), frame, tolerance, sample_size)
+    if backend not in ('numpy', 'numba'):
+        raise ValueError(f"Unknown backend: {backend!r}")
+    return CandidateEngine.solve_pair('snspn', (sensitivity, specificity), sample_size, tolerance=tolerance,
+                                      n_pathology=n_pathology, show_progress=show_progress,
+                                      method=method, top_k=top_k, error_dtype=error_dtype,
+                                      index_path=index_path, instrumentation=instrumentation,
+                                      budget=budget, cancel=cancel, on_snapshot=on_snapshot,
+                                      workers=workers, decimals=decimals, backend=backend)
+
+def calculate_snspn_range(sensitivity, specificity, n_min, n_max, tolerance=1e-6, n_pathology=None, top_k=CandidateEngine.DEFAULT_TOP_K, error_dtype=np.float64, instrumentation=None):
+    """
+    The top_k matrices for sensitivity and specificity at every sample size from n_min to n_max
+    (see RangeSolver.solve_range).
+    """
+    import RangeSolver
+    return RangeSolver.solve_range('snspn', (sensitivity, specificity), n_min, n_max, tolerance=tolerance, n_pathology=n_pathology,
+                                   top_k=top_k, error_dtype=error_dtype,
+                                   instrumentation=instrumentation or Instrumentation.NULL)
+
+def calculate_snspn_many(targets, sample_size, tolerance=1e-6, n_pathology=None, top_k=CandidateEngine.DEFAULT_TOP_K, error_dtype=np.float64, instrumentation=None):
+    """
+    The top_k matrices for each (sensitivity, specificity) pair in targets at the same sample size
+    (see MultiQuery.solve_many).
+    """
+    import MultiQuery
+    return MultiQuery.solve_many('snspn', targets, sample_size, tolerance=tolerance, n_pathology=n_pathology,
+                                 top_k=top_k, error_dtype=error_dtype,
+                                 instrumentation=instrumentation or Instrumentation.NULL)
+
+def export_snspn(sensitivity, specificity, sample_size, path, format=None, tolerance=1e-6, n_pathology=None, chunk_size=CandidateEngine.DEFAULT_CHUNK_SIZE, row_group_size=None, error_dtype=np.float64, derived=False, instrumentation=None):
+    """
+    Write every candidate matrix for sensitivity and specificity to a Parquet or Arrow IPC file
+    (see CandidateExport.export_candidates).
+    """
+    import CandidateExport
+    return CandidateExport.export_candidates('snspn', (sensitivity, specificity), sample_size, path, format=format, tolerance=tolerance,
+                                             n_pathology=n_pathology, chunk_size=chunk_size,
+                                             row_group_size=row_group_size or CandidateExport.ROW_GROUP_SIZE,
+                                             error_dtype=error_dtype, derived=derived,
+                                             instrumentation=instrumentation or Instrumentation.NULL)
+
+def _calculate_snspn_python(sensitivity, specificity, sample_size, tolerance=1e-6, show_progress=True, n_pathology=None):
+    """
+    Reference implementation: brute force over all (n+1)^4 tuples.
     """
+    import pandas as pd
     results = []
     total_iterations = (sample_size + 1) ** 4
-    if show_progress and tqdm:
-        progress = tqdm(total=total_iterations, desc="Testing combinations")
-    else:
-        progress = None
+    progress = Instrumentation.tqdm_progress() if show_progress else None
     for tp in range(sample_size + 1):
+        if progress: progress(tp * (sample_size + 1) ** 3, total_iterations)
         for tn in range(sample_size + 1):
             for fp in range(sample_size + 1):
                 for fn in range(sample_size + 1):
-                    if progress: progress.update(1)
                     if (tp + tn + fp + fn) != sample_size:
                         continue
                     if n_pathology is not None and (tp + fn) != n_pathology:
@@ -49,185 +97,10 @@ def calculate_snspn(sensitivity, specificity, sample_size, tolerance=1e-6, show_
                         'Total_Error': total_error,
                         'Exact_Match': total_error <= tolerance
                     })
-    if progress: progress.close()
+    if progress: progress(total_iterations, total_iterations)
     results_df = pd.DataFrame(results)
-    results_df = results_df.sort_values('Total_Error').reset_index(drop=True)
+    results_df = results_df.sort_values('Total_Error', kind='stable').reset_index(drop=True)
     return results_df
-    """
-    A class to estimate original confusion matrix values from sensitivity, specificity, and sample size.
-    """
-    
-    def __init__(self, sensitivity, specificity, sample_size):
-        """
-        Initialize the estimator with given parameters.
-        
-        Args:
-            sensitivity (float): True positive rate (0-1)
-            specificity (float): True negative rate (0-1)
-            sample_size (int): Total number of samples
-        """
-        self.sensitivity = sensitivity
-        self.specificity = specificity
-        self.sample_size = sample_size
-        self.results = []
-        
-    def calculate_metrics(self, tp, tn, fp, fn):
-        """
-        Calculate sensitivity and specificity from confusion matrix values.
-        
-        Args:
-            tp (int): True positives
-            tn (int): True negatives
-            fp (int): False positives
-            fn (int): False negatives
-            
-        Returns:
-            tuple: (calculated_sensitivity, calculated_specificity)
-        """
-        # Avoid division by zero
-        if (tp + fn) == 0:
-            calc_sensitivity = 0.0
-        else:
-            calc_sensitivity = tp / (tp + fn)
-            
-        if (tn + fp) == 0:
-            calc_specificity = 0.0
-        else:
-            calc_specificity = tn / (tn + fp)
-            
-        return calc_sensitivity, calc_specificity
-    
-    def is_valid_combination(self, tp, tn, fp, fn):
-        """
-        Check if a combination of confusion matrix values is valid.
-        
-        Args:
-            tp, tn, fp, fn (int): Confusion matrix values
-            
-        Returns:
-            bool: True if combination sums to sample_size
-        """
-        return (tp + tn + fp + fn) == self.sample_size
-    
-    def calculate_errors(self, calc_sensitivity, calc_specificity):
-        """
-        Calculate absolute errors between target and calculated metrics.
-        
-        Args:
-            calc_sensitivity (float): Calculated sensitivity
-            calc_specificity (float): Calculated specificity
-            
-        Returns:
-            tuple: (sensitivity_error, specificity_error, total_error)
-        """
-        sens_error = abs(self.sensitivity - calc_sensitivity)
-        spec_error = abs(self.specificity - calc_specificity)
-        total_error = sens_error + spec_error
-        
-        return sens_error, spec_error, total_error
-    
-    def estimate_confusion_matrix(self, tolerance=1e-6):
-        """
-        Estimate original confusion matrix values by testing all possible combinations.
-        
-        Args:
-            tolerance (float): Tolerance for considering a match "exact"
-            
-        Returns:
-            pd.DataFrame: Results sorted by total error
-        """
-        self.results = []
-        
-        # Calculate total iterations for progress bar
-        total_iterations = (self.sample_size + 1) ** 4
-        
-        print(f"Estimating confusion matrix values...")
-        print(f"Target Sensitivity: {self.sensitivity:.4f}")
-        print(f"Target Specificity: {self.specificity:.4f}")
-        print(f"Sample Size: {self.sample_size}")
-        print(f"Testing {total_iterations:,} combinations...\n")
-        
-        # Use tqdm to show progress through all combinations
-        with tqdm(total=total_iterations, desc="Testing combinations") as pbar:
-            for tp in range(self.sample_size + 1):
-                for tn in range(self.sample_size + 1):
-                    for fp in range(self.sample_size + 1):
-                        for fn in range(self.sample_size + 1):
-                            pbar.update(1)
-                            
-                            # Skip invalid combinations
-                            if not self.is_valid_combination(tp, tn, fp, fn):
-                                continue
-                            
-                            # Calculate metrics for this combination
-                            calc_sens, calc_spec = self.calculate_metrics(tp, tn, fp, fn)
-                            
-                            # Calculate errors
-                            sens_error, spec_error, total_error = self.calculate_errors(calc_sens, calc_spec)
-                            
-                            # Store result
-                            self.results.append({
-                                'TP': tp,
-                                'TN': tn,
-                                'FP': fp,
-                                'FN': fn,
-                                'Calculated_Sensitivity': calc_sens,
-                                'Calculated_Specificity': calc_spec,
-                                'Sensitivity_Error': sens_error,
-                                'Specificity_Error': spec_error,
-                                'Total_Error': total_error,
-                                'Exact_Match': total_error <= tolerance
-                            })
-        
-        # Convert to DataFrame and sort by total error
-        results_df = pd.DataFrame(self.results)
-        results_df = results_df.sort_values('Total_Error').reset_index(drop=True)
-        
-        return results_df
-    
-    def display_results(self, results_df, top_n=10):
-        """
-        Display the best results in a formatted way.
-        
-        Args:
-            results_df (pd.DataFrame): Results from estimation
-            top_n (int): Number of top results to display
-        """
-        print(f"\n{'='*80}")
-        print(f"ESTIMATION RESULTS")
-        print(f"{'='*80}")
-        
-        # Check for exact matches
-        exact_matches = results_df[results_df['Exact_Match'] == True]
-        
-        if len(exact_matches) > 0:
-            print(f"\n🎯 EXACT MATCHES FOUND: {len(exact_matches)}")
-            print("-" * 50)
-            for idx, row in exact_matches.head().iterrows():
-                print(f"TP: {row['TP']:3d}, TN: {row['TN']:3d}, FP: {row['FP']:3d}, FN: {row['FN']:3d}")
-                print(f"   Sensitivity: {row['Calculated_Sensitivity']:.6f}")
-                print(f"   Specificity: {row['Calculated_Specificity']:.6f}")
-                print()
-        else:
-            print(f"\n📊 TOP {top_n} CLOSEST ESTIMATES:")
-            print("-" * 50)
-            
-            for idx, row in results_df.head(top_n).iterrows():
-                print(f"Rank {idx+1}:")
-                print(f"   TP: {row['TP']:3d}, TN: {row['TN']:3d}, FP: {row['FP']:3d}, FN: {row['FN']:3d}")
-                print(f"   Calculated Sensitivity: {row['Calculated_Sensitivity']:.6f} (error: {row['Sensitivity_Error']:.6f})")
-                print(f"   Calculated Specificity: {row['Calculated_Specificity']:.6f} (error: {row['Specificity_Error']:.6f})")
-                print(f"   Total Error: {row['Total_Error']:.6f}")
-                print()
-        
-        # Summary statistics
-        print(f"📈 SUMMARY STATISTICS:")
-        print("-" * 50)
-        print(f"Total valid combinations tested: {len(results_df):,}")
-        print(f"Best total error: {results_df['Total_Error'].min():.8f}")
-        print(f"Average total error: {results_df['Total_Error'].mean():.8f}")
-        print(f"Median total error: {results_df['Total_Error'].median():.8f}")
-
 
 
 def main():
@@ -251,8 +124,16 @@ def main():
         specificity = 0.70588
         sample_size = 37
         print(f"Estimating for Sensitivity={sensitivity}, Specificity={specificity}, n={sample_size}")
-        results = calculate_snspn(sensitivity, specificity, sample_size)
-        print(results.head(10))
+        instrumentation = Instrumentation.Instrumentation()
+        results = calculate_snspn(sensitivity, specificity, sample_size, top_k=10, instrumentation=instrumentation)
+        print(results.to_frame())
+        summary = results.summary
+        print(f"Total valid combinations tested: {summary['count']:,}")
+        print(f"Exact matches: {summary['exact_matches']:,}")
+        print(f"Best total error: {summary['min']:.8f}")
+        print(f"Average total error: {summary['mean']:.8f}")
+        print(f"Median total error: {summary['median']:.8f}")
+        print(instrumentation.report())
         return results
 
 
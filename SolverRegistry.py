@@ -0,0 +1,47 @@
+"""
+Registry of the calculation modules used by app.py.
+
+Each solver is imported on first use, at most once per process (Python caches it in
+sys.modules), so a Streamlit rerun only pays for the input mode that is selected.
+Import times are recorded for the app's startup report.
+"""
+import importlib
+import time
+
+# Input mode -> (module, function)
+SOLVERS = {
+    'snspn': ('SnSpn', 'calculate_snspn'),
+    'ppvnpv': ('PPVNPV', 'calculate_ppvnpv'),
+    'lr': ('LikelihoodRatios', 'calculate_likelihoodratios'),
+    'counts': ('CountsToMetrics', 'calculate_metrics_from_counts'),
+    'crosscheck': ('CrossCheck', 'cross_check'),
+    # Per-metric tolerances from the values as typed, for the cross-check.
+    'crosscheck_tolerances': ('CrossCheck', 'reported_tolerances'),
+}
+
+_import_seconds = {}
+
+
+def get_solver(mode):
+    """
+    The calculate_* function for an input mode, importing its module on first use.
+
+    Args:
+        mode (str): Key into SOLVERS
+
+    Returns:
+        callable: The module's calculate function
+    """
+    if mode not in SOLVERS:
+        raise ValueError(f"Unknown solver: {mode!r}")
+    module_name, function_name = SOLVERS[mode]
+    if module_name not in _import_seconds:
+        start = time.perf_counter()
+        importlib.import_module(module_name)
+        _import_seconds[module_name] = time.perf_counter() - start
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def import_times():
+    """Seconds spent importing each solver module so far in this process."""
+    return dict(_import_seconds)
@@ -0,0 +1,421 @@
+"""
+Headless HTTP/JSON service for the solvers, standard library only (no streamlit).
+
+    python SolverService.py --port 8000 --workers 4 --max-pending 64
+
+Endpoints:
+    POST /snspn    {"sensitivity": 0.85, "specificity": 0.92, "n": 200, ...}
+    POST /ppvnpv   {"ppv": 0.8, "npv": 0.95, "n": 200, ...}
+    POST /lr       {"plr": 4.2, "nlr": 0.31, "n": 200, ...}
+    POST /counts   {"tp": 10, "tn": 10, "fp": 5, "fn": 5}
+    POST /batch    {"requests": [{"mode": "snspn", ...}, ...]}
+    GET  /metrics  request counts, queue depth and latency percentiles
+    GET  /health
+
+The solve endpoints also take n_pathology, tolerance, top_k, method and decimals (see
+CandidateEngine.solve_pair); top_k is always bounded, so responses stay small, and n is
+bounded per method (MAX_N), so no request can hold a worker for long.
+
+Solves run on a bounded thread pool. When max_pending solves are already queued or
+running, new work is refused with 503 and Retry-After instead of queueing without
+limit. A request identical to one still in flight shares its computation rather than
+starting another. Non-finite floats are sent as the strings "inf", "-inf" and "nan",
+so the output is strict JSON.
+"""
+import argparse
+import json
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import CandidateEngine
+
+# mode -> (pair, names of the two metric values)
+PAIR_MODES = {
+    'snspn': ('snspn', ('sensitivity', 'specificity')),
+    'ppvnpv': ('ppvnpv', ('ppv', 'npv')),
+    'lr': ('lr', ('plr', 'nlr')),
+}
+COUNT_FIELDS = ('tp', 'tn', 'fp', 'fn')
+METHODS = ('margin', 'enumerate', 'pruned', 'rounded', 'index')
+
+DEFAULT_MAX_PENDING = 64
+MAX_TOP_K = 1000
+# Largest n per method, so no single request can hold a worker for long (the solve
+# itself cannot be stopped once started; a 504 only ends the wait for it).
+MAX_N = {'enumerate': 500, 'pruned': 2000, 'rounded': 5000, 'margin': 20000, 'index': 20000}
+MAX_BODY_BYTES = 1 << 20
+REQUEST_TIMEOUT = 300.0
+LATENCY_WINDOW = 1024
+
+
+class Overloaded(Exception):
+    """Raised when the service already has max_pending solves queued or running."""
+
+
+def _json_safe(value):
+    """Convert NumPy scalars and non-finite floats for strict JSON."""
+    if isinstance(value, dict):
+        return {key: _json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(item) for item in value]
+    if isinstance(value, (np.bool_, bool)):
+        return bool(value)
+    if isinstance(value, (np.integer, int)):
+        return int(value)
+    if isinstance(value, (np.floating, float)):
+        value = float(value)
+        if math.isfinite(value):
+            return value
+        return 'nan' if math.isnan(value) else ('inf' if value > 0 else '-inf')
+    return value
+
+
+def _take(params, name, convert, default=None, required=False):
+    if name not in params or params[name] is None:
+        if required:
+            raise ValueError(f"Missing field: {name!r}")
+        return default
+    try:
+        return convert(params[name])
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name!r}: {params[name]!r}")
+
+
+def _number(value):
+    # Accept the same "inf" / "nan" strings the service sends.
+    return float(value)
+
+
+def _integer(value):
+    if isinstance(value, bool) or float(value) != int(value):
+        raise ValueError(value)
+    return int(value)
+
+
+def parse_request(mode, params, default_method='margin', default_top_k=CandidateEngine.DEFAULT_TOP_K):
+    """
+    Validate one request body and normalise it into a hashable job key.
+
+    Returns:
+        tuple: (mode, ...) with every option filled in, so identical requests compare equal
+    """
+    if not isinstance(params, dict):
+        raise ValueError("Request body must be a JSON object")
+    params = {key: value for key, value in params.items() if key != 'mode'}
+    if mode == 'counts':
+        unknown = set(params) - set(COUNT_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+        counts = tuple(_take(params, name, _integer, required=True) for name in COUNT_FIELDS)
+        if min(counts) < 0:
+            raise ValueError("Counts must be non-negative")
+        return ('counts',) + counts
+    if mode not in PAIR_MODES:
+        raise ValueError(f"Unknown mode: {mode!r}")
+    _, names = PAIR_MODES[mode]
+    allowed = set(names) | {'n', 'n_pathology', 'tolerance', 'top_k', 'method', 'decimals'}
+    unknown = set(params) - allowed
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+    values = tuple(_take(params, name, _number, required=True) for name in names)
+    n = _take(params, 'n', _integer, required=True)
+    n_pathology = _take(params, 'n_pathology', _integer)
+    if n < 0 or (n_pathology is not None and not 0 <= n_pathology <= n):
+        raise ValueError("Need 0 <= n_pathology <= n")
+    tolerance = _take(params, 'tolerance', _number, 1e-6)
+    top_k = _take(params, 'top_k', _integer, default_top_k)
+    if not 1 <= top_k <= MAX_TOP_K:
+        raise ValueError(f"top_k must be between 1 and {MAX_TOP_K}")
+    method = _take(params, 'method', str, default_method)
+    if method not in METHODS:
+        raise ValueError(f"Unknown method: {method!r}")
+    if n > MAX_N[method]:
+        raise ValueError(f"n must be at most {MAX_N[method]} for method={method!r}")
+    decimals = params.get('decimals')
+    if isinstance(decimals, list):
+        decimals = tuple(_integer(d) for d in decimals)
+    elif decimals is not None:
+        decimals = _take(params, 'decimals', _integer)
+    return (mode, values, n, n_pathology, tolerance, top_k, method, decimals)
+
+
+def run_job(key, index_path=None):
+    """
+    Compute one parsed request.
+
+    Returns:
+        dict: JSON-ready response body
+    """
+    if key[0] == 'counts':
+        from CountsToMetrics import calculate_metrics_from_counts
+        return {'mode': 'counts', 'metrics': _json_safe(calculate_metrics_from_counts(*key[1:]))}
+    mode, values, n, n_pathology, tolerance, top_k, method, decimals = key
+    pair, _ = PAIR_MODES[mode]
+    results = CandidateEngine.solve_pair(pair, values, n, tolerance=tolerance, n_pathology=n_pathology,
+                                         method=method, top_k=top_k, index_path=index_path,
+                                         decimals=decimals)
+    columns = {name: results[name] for name in results.columns}
+    rows = [{name: column[i] for name, column in columns.items()} for i in range(len(results))]
+    return _json_safe({'mode': mode, 'n': n, 'n_pathology': n_pathology, 'labels': list(results.labels),
+                       'rows': rows, 'summary': results.summary})
+
+
+class LatencyStats:
+    """
+    Running count and mean, plus percentiles over the most recent samples.
+    """
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+
+    def as_dict(self):
+        recent = np.array(self.recent) if self.recent else np.zeros(1)
+        p50, p95, p99 = np.percentile(recent, [50, 95, 99])
+        return {'count': self.count, 'mean': self.total / self.count if self.count else 0.0,
+                'p50': float(p50), 'p95': float(p95), 'p99': float(p99), 'max': float(recent.max())}
+
+
+class SolverService:
+    """
+    Bounded worker pool with request coalescing and metrics, independent of HTTP.
+    """
+
+    def __init__(self, workers=4, max_pending=DEFAULT_MAX_PENDING, method='margin',
+                 top_k=CandidateEngine.DEFAULT_TOP_K, index_path=None):
+        """
+        Args:
+            workers (int): Solver threads (NumPy releases the GIL for the heavy work)
+            max_pending (int): Solves queued or running before new work gets 503
+            method (str): Default solver method for requests that do not give one
+            top_k (int): Default top_k for requests that do not give one
+            index_path (str, optional): RationalIndex directory for method='index'
+        """
+        self.workers = workers
+        self.max_pending = max_pending
+        self.method = method
+        self.top_k = top_k
+        self.index_path = index_path
+        self.started = time.time()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='solver')
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._queued = 0
+        self._running = 0
+        self.counters = {'requests': 0, 'computed': 0, 'coalesced': 0, 'rejected': 0, 'failed': 0}
+        self.request_latency = LatencyStats()
+        self.solve_latency = LatencyStats()
+
+    def parse(self, mode, params):
+        return parse_request(mode, params, self.method, self.top_k)
+
+    def submit_all(self, keys):
+        """
+        Start (or join) the computation of every key, all or none.
+
+        Returns:
+            list: One Future per key
+
+        Raises:
+            Overloaded: The new computations would exceed max_pending
+        """
+        with self._lock:
+            self.counters['requests'] += len(keys)
+            new = {key for key in keys if key not in self._inflight}
+            if len(self._inflight) + len(new) > self.max_pending:
+                self.counters['rejected'] += len(keys)
+                raise Overloaded(f"{len(self._inflight)} solves pending (max {self.max_pending})")
+            self.counters['coalesced'] += len(keys) - len(new)
+            for key in new:
+                self._queued += 1
+                future = self._pool.submit(self._run, key)
+                self._inflight[key] = future
+                future.add_done_callback(lambda f, key=key: self._finish(key))
+            return [self._inflight[key] for key in keys]
+
+    def submit(self, key):
+        return self.submit_all([key])[0]
+
+    def _run(self, key):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        start = time.perf_counter()
+        try:
+            result = run_job(key, self.index_path)
+        except Exception:
+            with self._lock:
+                self.counters['failed'] += 1
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self._running -= 1
+                self.solve_latency.add(seconds)
+        with self._lock:
+            self.counters['computed'] += 1
+        return result
+
+    def _finish(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self.request_latency.add(seconds)
+
+    def metrics(self):
+        """Counters, queue depth and latency percentiles (seconds) as a dict."""
+        with self._lock:
+            return {
+                'uptime': time.time() - self.started,
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'queue_depth': self._queued,
+                'running': self._running,
+                'in_flight': len(self._inflight),
+                **self.counters,
+                'request_latency': self.request_latency.as_dict(),
+                'solve_latency': self.solve_latency.as_dict(),
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class SolverRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON routes over a SolverService (set as the server's .service).
+    """
+    server_version = 'ConfusionMatrixCalculator'
+
+    def log_message(self, format, *args):
+        if getattr(self.server, 'verbose', False):
+            super().log_message(format, *args)
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body, allow_nan=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            raise OverflowError(f"Request body over {MAX_BODY_BYTES} bytes")
+        try:
+            return json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == '/metrics':
+            self._send(200, _json_safe(service.metrics()))
+        elif self.path == '/health':
+            self._send(200, {'status': 'ok'})
+        else:
+            self._send(404, {'error': f"Not found: {self.path}"})
+
+    def do_POST(self):
+        service = self.server.service
+        mode = self.path.strip('/')
+        if mode not in PAIR_MODES and mode not in ('counts', 'batch'):
+            self._send(404, {'error': f"Not found: {self.path}"})
+            return
+        start = time.perf_counter()
+        try:
+            body = self._body()
+            if mode == 'batch':
+                items = body.get('requests') if isinstance(body, dict) else None
+                if not isinstance(items, list):
+                    raise ValueError("Batch body must be {\"requests\": [...]}")
+                keys = [service.parse(item.get('mode') if isinstance(item, dict) else None, item)
+                        for item in items]
+            else:
+                keys = [service.parse(mode, body)]
+            futures = service.submit_all(keys)
+            deadline = time.monotonic() + REQUEST_TIMEOUT
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result(timeout=max(0.0, deadline - time.monotonic())))
+                except FutureTimeout:
+                    raise
+                except ValueError as e:
+                    if mode != 'batch':
+                        raise
+                    results.append({'error': str(e)})
+                except Exception as e:
+                    if mode != 'batch':
+                        raise RuntimeError(f"{type(e).__name__}: {e}")
+                    results.append({'error': f"{type(e).__name__}: {e}"})
+            self._send(200, {'results': results} if mode == 'batch' else results[0])
+        except Overloaded as e:
+            self._send(503, {'error': str(e)}, {'Retry-After': '1'})
+        except OverflowError as e:
+            self._send(413, {'error': str(e)})
+        except FutureTimeout:
+            self._send(504, {'error': f"Solve did not finish within {REQUEST_TIMEOUT:.0f} s"})
+        except ValueError as e:
+            self._send(400, {'error': str(e)})
+        except Exception as e:
+            self._send(500, {'error': str(e)})
+        finally:
+            service.record_latency(time.perf_counter() - start)
+
+
+def make_server(host='127.0.0.1', port=8000, service=None, verbose=False):
+    """
+    Build (but do not start) the HTTP server; port 0 picks a free port, see
+    server.server_address. Run it with server.serve_forever(), e.g. on a thread in tests.
+    """
+    server = ThreadingHTTPServer((host, port), SolverRequestHandler)
+    server.daemon_threads = True
+    server.service = service or SolverService()
+    server.verbose = verbose
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the confusion matrix solvers over HTTP/JSON.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=4, help="Solver threads")
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING,
+                        help="Solves queued or running before requests get 503")
+    parser.add_argument('--method', default='margin', choices=METHODS, help="Default solver method")
+    parser.add_argument('--top-k', type=int, default=CandidateEngine.DEFAULT_TOP_K, help="Default top_k")
+    parser.add_argument('--index', dest='index_path', default=None, help="RationalIndex directory for method=index")
+    parser.add_argument('--verbose', action='store_true', help="Log every request")
+    args = parser.parse_args(argv)
+    service = SolverService(args.workers, args.max_pending, args.method, args.top_k, args.index_path)
+    server = make_server(args.host, args.port, service, args.verbose)
+    print(f"Serving on http://{server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,110 @@
+import time
+
+# Taken before any third-party import, so the cold start includes importing streamlit.
+_rerun_start = time.perf_counter()
+
 import streamlit as st
 st.set_page_config(layout="wide")
-import importlib.util
 import sys
 from pathlib import Path
-import pandas as pd  # Import pandas to fix NameError for pd.DataFrame
-
-# Dynamically import calculate_snspn from SnSpn.py
-snspn_path = Path(__file__).parent / "SnSpn.py"
-spec_snspn = importlib.util.spec_from_file_location("SnSpn", snspn_path)
-snspn = importlib.util.module_from_spec(spec_snspn)
-sys.modules["SnSpn"] = snspn
-spec_snspn.loader.exec_module(snspn)
-
-# Dynamically import calculate_ppvnpv from PPVNPV.py
-ppvnpv_path = Path(__file__).parent / "PPVNPV.py"
-spec_ppvnpv = importlib.util.spec_from_file_location("PPVNPV", ppvnpv_path)
-ppvnpv = importlib.util.module_from_spec(spec_ppvnpv)
-sys.modules["PPVNPV"] = ppvnpv
-spec_ppvnpv.loader.exec_module(ppvnpv)
-
-# Dynamically import calculate_likelihoodratios from LikelihoodRatios.py
-lr_path = Path(__file__).parent / "LikelihoodRatios.py"
-spec_lr = importlib.util.spec_from_file_location("LikelihoodRatios", lr_path)
-lr = importlib.util.module_from_spec(spec_lr)
-sys.modules["LikelihoodRatios"] = lr
-spec_lr.loader.exec_module(lr)
-
-# Dynamically import calculate_metrics_from_counts from CountsToMetrics.py
-counts_path = Path(__file__).parent / "CountsToMetrics.py"
-spec_counts = importlib.util.spec_from_file_location("CountsToMetrics", counts_path)
-counts = importlib.util.module_from_spec(spec_counts)
-sys.modules["CountsToMetrics"] = counts
-spec_counts.loader.exec_module(counts)
+
+# Calculation modules are imported on first use through the registry; make sure they
+# resolve from this directory whatever the working directory is.
+APP_DIR = Path(__file__).parent
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
+import Instrumentation
+import ResultCache
+import SolverRegistry
+
+# Prebuilt rational index (python RationalIndex.py rational_index --n-max N); when it
+# covers n the solvers answer from it, otherwise they use the margin solver.
+INDEX_DIR = APP_DIR / "rational_index"
+
+@st.cache_resource
+def get_index_n_max(mtime):
+    # Loaded once per server process; keyed on meta.json's mtime so a rebuilt index is picked up.
+    import RationalIndex
+    return RationalIndex.load_index(str(INDEX_DIR)).n_max
+
+def solver_options(n_val):
+    meta = INDEX_DIR / "meta.json"
+    if meta.exists() and n_val <= get_index_n_max(meta.stat().st_mtime):
+        return {'method': 'index', 'index_path': INDEX_DIR, 'top_k': 10}
+    return {'method': 'margin', 'top_k': 10}
+
+@st.cache_resource
+def get_startup_report():
+    # Shared by every session: the first (cold) run and the most recent rerun.
+    return {'cold_start': None, 'last_rerun': None, 'reruns': 0}
+
+@st.cache_resource
+def get_result_cache():
+    # One cache per server process, shared by every session.
+    return ResultCache.ResultCache()
+
+result_cache = get_result_cache()
+
+def cached_solve(module, values, n_val, n_path_val, solve):
+    """
+    Solver results keyed on inputs but not on the threshold, which only re-flags Exact_Match,
+    and the Instrumentation of the solve (empty on a cache hit).
+    """
+    options = solver_options(n_val)
+    key = (module, values, n_val, n_path_val, tuple(sorted((k, str(v)) for k, v in options.items())))
+    instrumentation = Instrumentation.Instrumentation()
+    results = result_cache.get_or_compute(key, lambda: solve(instrumentation=instrumentation, **options),
+                                          tolerance=threshold)
+    return results, instrumentation
+
+def show_solver_stats(instrumentation):
+    with st.expander("Solver statistics"):
+        stats = instrumentation.as_dict()
+        if not any(stats['counters'].values()):
+            st.write("Served from the result cache.")
+            return
+        st.write({f"{name} (ms)": round(seconds * 1e3, 3) for name, seconds in stats['timings'].items()})
+        st.write(stats['counters'])
+
+def start_background_solve(solve, *args, **kwargs):
+    """
+    Start an anytime search for this session, replacing (and stopping) any previous one.
+    """
+    import AnytimeSolver
+    previous = st.session_state.get('job')
+    if previous is not None:
+        previous.cancel()
+    st.session_state['job'] = AnytimeSolver.BackgroundSolve(solve, *args, budget=budget, **kwargs)
+    st.session_state['job_recorded'] = False
+
+def show_background_solve():
+    """
+    Live view of the session's anytime search: refreshes the best matrices so far until
+    the search ends or the user stops it (the click reruns the script and cancels it).
+    """
+    job = st.session_state.get('job')
+    if job is None:
+        return
+    st.subheader("Anytime search")
+    if job.running and st.button("Stop search"):
+        job.cancel()
+        job.wait(5)
+    status = st.empty()
+    table = st.empty()
+    while True:
+        done = not job.running
+        latest = job.latest()
+        status.write(f"{job.status()}: {job.progress():.1%} of the search space in {job.elapsed:.1f} s")
+        if latest is not None:
+            table.write(latest.head(10))
+        if done:
+            break
+        time.sleep(0.5)
+    if job.error is not None:
+        st.error(f"Error: {job.error}")
+    elif job.result is not None and not st.session_state.get('job_recorded') and len(job.result):
+        st.session_state['history'].append(job.result.head(1).iloc[0].to_dict())
+        st.session_state['job_recorded'] = True
 
 st.title("Diagnostic Calculator App")
 
@@ -56,6 +129,10 @@ with st.sidebar:
     fp = st.text_input("False Positives (FP)", value="")
     fn = st.text_input("False Negatives (FN)", value="")
     threshold = st.number_input("Exact Match Threshold (error <)", min_value=0.0, max_value=1.0, value=0.001, step=0.001, format="%f")
+    anytime = st.checkbox("Anytime search (exhaustive, live results, stoppable)", value=False)
+    budget = st.number_input("Time budget (seconds)", min_value=1, value=60, step=10, disabled=not anytime)
+    # Filled once this run's solve is done, so the counts include it.
+    cache_caption = st.empty()
     if st.button("Show Usage Instructions"):
         st.markdown("""
         <b>How to use this app:</b><br><br>
@@ -68,7 +145,8 @@ with st.sidebar:
         <span style='color:purple'><b>TP, TN, FP, FN</b></span>:<br>
         Enter values for TP, TN, FP, and FN only. Leave all other fields blank.<br><br>
         <b>Threshold:</b> Use the 'Exact Match Threshold' to set the error tolerance for flagging exact matches.<br><br>
-        Only one set of inputs should be filled at a time. The app will automatically detect which calculation to perform.
+        <b>Cross-check:</b> Enter two or three complete metric pairs with n to run every inversion at once and keep the matrices they all agree on.<br><br>
+        Otherwise only one set of inputs should be filled at a time. The app will automatically detect which calculation to perform.
         """, unsafe_allow_html=True)
 
 # Store previous results in session state
@@ -79,6 +157,9 @@ if 'history' not in st.session_state:
 use_snspn = sensitivity.strip() != "" and specificity.strip() != "" and ppv.strip() == "" and npv.strip() == "" and plr.strip() == "" and nlr.strip() == "" and n.strip() != "" and tp.strip() == "" and tn.strip() == "" and fp.strip() == "" and fn.strip() == ""
 use_ppvnpv = ppv.strip() != "" and npv.strip() != "" and sensitivity.strip() == "" and specificity.strip() == "" and plr.strip() == "" and nlr.strip() == "" and n.strip() != "" and tp.strip() == "" and tn.strip() == "" and fp.strip() == "" and fn.strip() == ""
 use_lr = plr.strip() != "" and nlr.strip() != "" and sensitivity.strip() == "" and specificity.strip() == "" and ppv.strip() == "" and npv.strip() == "" and n.strip() != "" and tp.strip() == "" and tn.strip() == "" and fp.strip() == "" and fn.strip() == ""
+# Two or more complete pairs (and no half-filled one) run every inversion together.
+pair_inputs = [(sensitivity, specificity), (ppv, npv), (plr, nlr)]
+use_crosscheck = sum(a.strip() != "" and b.strip() != "" for a, b in pair_inputs) >= 2 and all((a.strip() == "") == (b.strip() == "") for a, b in pair_inputs) and n.strip() != "" and tp.strip() == "" and tn.strip() == "" and fp.strip() == "" and fn.strip() == ""
 use_counts = tp.strip() != "" and tn.strip() != "" and fp.strip() != "" and fn.strip() != "" and sensitivity.strip() == "" and specificity.strip() == "" and ppv.strip() == "" and npv.strip() == "" and plr.strip() == "" and nlr.strip() == "" and n.strip() == ""
 
 # Set up two columns in the main area: results and history
@@ -95,12 +176,16 @@ if use_snspn:
                 spec_val = float(specificity)
                 n_val = int(float(n))
                 n_path_val = int(float(n_path)) if n_path.strip() else None
-                with st.spinner("Calculating using SnSpn module..."):
-                    results = snspn.calculate_snspn(sens_val, spec_val, n_val, tolerance=threshold, show_progress=False, n_pathology=n_path_val)
-                st.write(results.head(10))
-                st.success("Done!")
-                # Save only the first row as a dict with string keys
-                st.session_state['history'].append(results.iloc[0].to_dict())
+                if anytime:
+                    start_background_solve(SolverRegistry.get_solver('snspn'), sens_val, spec_val, n_val, tolerance=threshold, show_progress=False, n_pathology=n_path_val)
+                else:
+                    with st.spinner("Calculating using SnSpn module..."):
+                        results, instrumentation = cached_solve('SnSpn', (sens_val, spec_val), n_val, n_path_val, lambda **options: SolverRegistry.get_solver('snspn')(sens_val, spec_val, n_val, tolerance=threshold, show_progress=False, n_pathology=n_path_val, **options))
+                    st.write(results.head(10))
+                    show_solver_stats(instrumentation)
+                    st.success("Done!")
+                    # Save only the first row as a dict with string keys
+                    st.session_state['history'].append(results.head(1).iloc[0].to_dict())
             except Exception as e:
                 st.error(f"Error: {e}")
 elif use_ppvnpv:
@@ -112,12 +197,16 @@ elif use_ppvnpv:
                 npv_val = float(npv)
                 n_val = int(float(n))
                 n_path_val = int(float(n_path)) if n_path.strip() else None
-                with st.spinner("Calculating using PPVNPV module..."):
-                    results = ppvnpv.calculate_ppvnpv(ppv_val, npv_val, n_val, tolerance=threshold, n_pathology=n_path_val)
-                st.write(results.head(10))
-                st.success("Done!")
-                # Save only the first row as a dict with string keys
-                st.session_state['history'].append(results.iloc[0].to_dict())
+                if anytime:
+                    start_background_solve(SolverRegistry.get_solver('ppvnpv'), ppv_val, npv_val, n_val, tolerance=threshold, n_pathology=n_path_val)
+                else:
+                    with st.spinner("Calculating using PPVNPV module..."):
+                        results, instrumentation = cached_solve('PPVNPV', (ppv_val, npv_val), n_val, n_path_val, lambda **options: SolverRegistry.get_solver('ppvnpv')(ppv_val, npv_val, n_val, tolerance=threshold, n_pathology=n_path_val, **options))
+                    st.write(results.head(10))
+                    show_solver_stats(instrumentation)
+                    st.success("Done!")
+                    # Save only the first row as a dict with string keys
+                    st.session_state['history'].append(results.head(1).iloc[0].to_dict())
             except Exception as e:
                 st.error(f"Error: {e}")
 elif use_lr:
@@ -129,12 +218,40 @@ elif use_lr:
                 nlr_val = float(nlr)
                 n_val = int(float(n))
                 n_path_val = int(float(n_path)) if n_path.strip() else None
-                with st.spinner("Calculating using LikelihoodRatios module..."):
-                    results = lr.calculate_likelihoodratios(plr_val, nlr_val, n_val, tolerance=threshold, n_pathology=n_path_val)
+                if anytime:
+                    start_background_solve(SolverRegistry.get_solver('lr'), plr_val, nlr_val, n_val, tolerance=threshold, n_pathology=n_path_val)
+                else:
+                    with st.spinner("Calculating using LikelihoodRatios module..."):
+                        results, instrumentation = cached_solve('LikelihoodRatios', (plr_val, nlr_val), n_val, n_path_val, lambda **options: SolverRegistry.get_solver('lr')(plr_val, nlr_val, n_val, tolerance=threshold, n_pathology=n_path_val, **options))
+                    st.write(results.head(10))
+                    show_solver_stats(instrumentation)
+                    st.success("Done!")
+                    # Save only the first row as a dict with string keys
+                    st.session_state['history'].append(results.head(1).iloc[0].to_dict())
+            except Exception as e:
+                st.error(f"Error: {e}")
+elif use_crosscheck:
+    with col2:
+        st.header("Cross-check: Every Reported Metric Pair Together")
+        if st.button("Estimate Confusion Matrix"):
+            try:
+                labels = ['Sensitivity', 'Specificity', 'PPV', 'NPV', '+LR', '-LR']
+                values = [sensitivity, specificity, ppv, npv, plr, nlr]
+                texts = {label: value for label, value in zip(labels, values) if value.strip()}
+                metrics = {label: float(value) for label, value in texts.items()}
+                n_val = int(float(n))
+                n_path_val = int(float(n_path)) if n_path.strip() else None
+                # Each metric matches to half a unit in the last decimal typed.
+                tolerances = SolverRegistry.get_solver('crosscheck_tolerances')(texts)
+                with st.spinner("Running every inversion concurrently..."):
+                    results, report = SolverRegistry.get_solver('crosscheck')(metrics, n_val, n_pathology=n_path_val, tolerances=tolerances, tolerance=threshold)
+                import pandas as pd
+                st.write(f"{report['agreed']} matrices agree with every reported pair")
                 st.write(results.head(10))
+                st.write(pd.DataFrame(report['metrics']).T)
                 st.success("Done!")
-                # Save only the first row as a dict with string keys
-                st.session_state['history'].append(results.iloc[0].to_dict())
+                if len(results):
+                    st.session_state['history'].append(results.head(1).iloc[0].to_dict())
             except Exception as e:
                 st.error(f"Error: {e}")
 elif use_counts:
@@ -147,7 +264,8 @@ elif use_counts:
                 fp_val = int(float(fp))
                 fn_val = int(float(fn))
                 with st.spinner("Calculating metrics from counts..."):
-                    metrics = counts.calculate_metrics_from_counts(tp_val, tn_val, fp_val, fn_val)
+                    metrics = SolverRegistry.get_solver('counts')(tp_val, tn_val, fp_val, fn_val)
+                import pandas as pd
                 st.write(pd.DataFrame([metrics]))
                 st.success("Done!")
                 # Save metrics dict directly
@@ -155,12 +273,17 @@ elif use_counts:
             except Exception as e:
                 st.error(f"Error: {e}")
 else:
-    st.info("Please enter either Sensitivity & Specificity & n, or PPV & NPV & n, or PLR & NLR & n, or TP, TN, FP, FN. Leave the other fields blank.")
+    st.info("Please enter either Sensitivity & Specificity & n, or PPV & NPV & n, or PLR & NLR & n, or TP, TN, FP, FN. Leave the other fields blank. Enter two or more of the metric pairs with n to cross-check them.")
+
+cache_stats = result_cache.stats()
+cache_caption.caption(f"Result cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                      f"{cache_stats['evictions']} evictions, {cache_stats['size']}/{cache_stats['maxsize']} entries")
 
 # In col3, display history as confusion matrix table
 with col3:
     st.markdown("<b>Previous Results</b>", unsafe_allow_html=True)
     if 'history' in st.session_state and st.session_state['history']:
+        import pandas as pd
         for i, res in enumerate(st.session_state['history'][-5:][::-1], 1):
             st.markdown(f"<b>Run {len(st.session_state['history'])-i+1}</b>", unsafe_allow_html=True)
             if isinstance(res, dict):
@@ -171,3 +294,24 @@ with col3:
                 st.write(pd.DataFrame(res))
     else:
         st.info("No previous results yet.")
+
+# Startup-time report: the first run in this server process pays the imports (cold
+# start); later reruns only pay for the script and whatever solver they load.
+report = get_startup_report()
+elapsed = time.perf_counter() - _rerun_start
+if report['cold_start'] is None:
+    report['cold_start'] = elapsed
+else:
+    report['last_rerun'] = elapsed
+report['reruns'] += 1
+with st.sidebar.expander("Startup time"):
+    st.write(f"Cold start (since script start): {report['cold_start']:.3f} s")
+    if report['last_rerun'] is not None:
+        st.write(f"Last rerun (since script start): {report['last_rerun']:.3f} s ({report['reruns']} runs)")
+    for module_name, seconds in SolverRegistry.import_times().items():
+        st.write(f"Import {module_name}: {seconds:.3f} s")
+
+# Live view of the anytime search, last so the rest of the page renders before it polls.
+if use_snspn or use_ppvnpv or use_lr:
+    with col2:
+        show_background_solve()
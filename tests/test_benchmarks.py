@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import Benchmarks
+
+
+def test_every_method_matches_reference():
+    report = Benchmarks.run_suite([10], methods=('enumerate', 'margin', 'pruned', 'rounded', 'parallel'),
+                                  workers=2, log=lambda message: None)
+    assert {check['method'] for check in report['parity']} == {'enumerate', 'margin', 'pruned', 'rounded',
+                                                                'parallel'}
+    assert all(check['match'] for check in report['parity'])
+    # The infinite +LR is reproduced exactly, not only tie-broken among inf errors (with
+    # n_pathology = 3 no matrix has -LR = 0.2).
+    assert all(check['exact_matches'] > 0 for check in report['parity']
+               if check['regime'] == 'infinite_plr' and check['n_pathology'] is None)
@@ -0,0 +1,19 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import SnSpn
+
+
+def test_count_columns_are_signed():
+    results = SnSpn.calculate_snspn(0.2, 0.7, 12)
+    assert results.nbytes < len(results) * (4 * 8 + 8)
+    for name, counts in zip(('TP', 'TN', 'FP', 'FN'), results.counts()):
+        assert results[name].dtype == np.int64
+        np.testing.assert_array_equal(results[name], counts)
+    difference = results['TP'] - results['FN']
+    assert (difference < 0).any()
+    np.testing.assert_array_equal(difference, results.to_frame().eval('TP - FN').to_numpy())
@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import CountsToMetrics
+
+
+def test_clopper_pearson_interval():
+    pytest.importorskip('scipy')
+    lower, upper = CountsToMetrics.clopper_pearson_interval([0, 5, 10, 0], [10, 10, 10, 0])
+    # Closed forms at the edges: alpha/2 ** (1/n); 5 of 10 from published tables.
+    np.testing.assert_allclose(lower[:3], [0.0, 0.187086, 0.025 ** 0.1], atol=1e-6)
+    np.testing.assert_allclose(upper[:3], [1 - 0.025 ** 0.1, 0.812914, 1.0], atol=1e-6)
+    assert np.isnan(lower[3]) and np.isnan(upper[3])
+
+
+def test_bulk_intervals_cover_the_estimate():
+    pytest.importorskip('scipy')
+    counts = np.array([[40, 45, 5, 10], [0, 3, 0, 2], [7, 0, 0, 0]])
+    metrics = CountsToMetrics.calculate_metrics_bulk(counts, interval='clopper-pearson')
+    wilson = CountsToMetrics.calculate_metrics_bulk(counts, interval='wilson')
+    for name in CountsToMetrics.PROPORTIONS:
+        lower, upper = metrics[f'{name}_CI_Lower'], metrics[f'{name}_CI_Upper']
+        valid = ~np.isnan(lower)
+        assert np.all(lower[valid] <= metrics[name][valid]) and np.all(metrics[name][valid] <= upper[valid])
+        # The exact interval is the wider one.
+        assert np.all(upper[valid] - lower[valid]
+                      >= wilson[f'{name}_CI_Upper'][valid] - wilson[f'{name}_CI_Lower'][valid] - 1e-12)
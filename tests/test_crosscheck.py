@@ -0,0 +1,48 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import CrossCheck
+
+
+def _agreed_counts(results):
+    return set(zip(*(column.tolist() for column in results.counts())))
+
+
+def test_rounded_report_recovers_source_matrix():
+    # 40/45/5/10 as a paper would print it: -LR is really 0.2222.
+    texts = {'Sensitivity': '.8', 'Specificity': '.9', 'PPV': '.889', 'NPV': '.818', '+LR': '8.0', '-LR': '0.22'}
+    metrics = {name: float(text) for name, text in texts.items()}
+    results, report = CrossCheck.cross_check(metrics, 100, tolerances=CrossCheck.reported_tolerances(texts))
+    assert (40, 45, 5, 10) in _agreed_counts(results)
+    assert report['agreed'] == len(results)
+    assert all(entry['consistent'] for entry in report['metrics'].values())
+
+
+def test_reported_tolerances_follow_last_decimal():
+    tolerances = CrossCheck.reported_tolerances({'PPV': '0.889', '-LR': '0.22', '+LR': '8', 'NLR': 'inf'})
+    assert tolerances['PPV'] == pytest.approx(5e-4, rel=1e-6)
+    assert tolerances['-LR'] == pytest.approx(5e-3, rel=1e-6)
+    assert tolerances['+LR'] == pytest.approx(0.5, rel=1e-6)
+    assert tolerances['NLR'] == CrossCheck.JointSolver.DEFAULT_METRIC_TOLERANCE
+
+
+def test_inconsistent_metric_is_flagged():
+    texts = {'Sensitivity': '0.80', 'Specificity': '0.90', 'PPV': '0.50', 'NPV': '0.82'}
+    metrics = {name: float(text) for name, text in texts.items()}
+    results, report = CrossCheck.cross_check(metrics, 100, tolerances=CrossCheck.reported_tolerances(texts))
+    assert report['agreed'] == 0
+    assert report['metrics']['PPV']['consistent'] is False
+
+
+def test_infinite_positive_likelihood_ratio_agrees():
+    # Perfect specificity: +LR is infinite and must agree with Sn/Sp, not be blamed.
+    texts = {'Sensitivity': '.8', 'Specificity': '1.0', '+LR': 'inf', '-LR': '.2'}
+    metrics = {name: float(text) for name, text in texts.items()}
+    results, report = CrossCheck.cross_check(metrics, 20, tolerances=CrossCheck.reported_tolerances(texts))
+    assert report['pairs']['lr']['matches'] > 0
+    assert {(4, 15, 0, 1), (8, 10, 0, 2), (12, 5, 0, 3)} <= _agreed_counts(results)
+    assert all(entry['consistent'] for entry in report['metrics'].values())
@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import CandidateEngine
+import Instrumentation
+import RangeSolver
+
+
+def test_enumeration_considers_only_valid_matrices():
+    instrumentation = Instrumentation.Instrumentation()
+    CandidateEngine.solve_pair('snspn', (0.8, 0.6), 20, top_k=5, instrumentation=instrumentation)
+    counters = instrumentation.as_dict()['counters']
+    assert counters['considered'] == CandidateEngine.count_candidates(20) == counters['evaluated']
+    assert counters['pruned'] == 0
+
+
+def test_counters_add_up_across_searches():
+    instrumentation = Instrumentation.Instrumentation()
+    RangeSolver.solve_range('lr', (2.5, 0.4), 10, 14, top_k=3, instrumentation=instrumentation)
+    for n in range(10, 15):
+        CandidateEngine.solve_pair('snspn', (0.8, 0.6), n, top_k=3, instrumentation=instrumentation)
+    counters = instrumentation.as_dict()['counters']
+    space = sum(CandidateEngine.count_candidates(n) for n in range(10, 15))
+    assert counters['considered'] == 2 * space
+    assert 0 <= counters['pruned'] < space
+    assert counters['kept'] == 2 * 5 * 3
+
+
+def test_pruned_matches_pruned_solver_fraction():
+    instrumentation = Instrumentation.Instrumentation()
+    results = CandidateEngine.solve_pair('snspn', (0.8, 0.6), 60, method='pruned', top_k=5,
+                                         instrumentation=instrumentation)
+    counters = instrumentation.as_dict()['counters']
+    assert counters['pruned'] / counters['considered'] == results.summary['pruned']
@@ -0,0 +1,48 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import JitKernels
+import LikelihoodRatios
+import PPVNPV
+import SnSpn
+
+REFERENCES = {
+    'snspn': SnSpn.calculate_snspn,
+    'ppvnpv': PPVNPV.calculate_ppvnpv,
+    'lr': LikelihoodRatios.calculate_likelihoodratios,
+}
+
+
+@pytest.fixture
+def uncompiled(monkeypatch):
+    # The plain-Python kernel, whether or not Numba is installed.
+    monkeypatch.setattr(JitKernels, '_fused_top_k', getattr(JitKernels._fused_top_k, 'py_func',
+                                                            JitKernels._fused_top_k))
+
+
+@pytest.mark.parametrize('pair, targets', [('snspn', (0.8, 0.6)), ('ppvnpv', (0.35, 0.9)), ('lr', (2.5, 0.4))])
+@pytest.mark.parametrize('n_pathology', [None, 4])
+def test_kernel_matches_python_reference(uncompiled, pair, targets, n_pathology):
+    n, top_k = 9, 7
+    reference = REFERENCES[pair](*targets, n, n_pathology=n_pathology, backend='python')
+    results = JitKernels.solve_top_k(pair, targets, n, n_pathology=n_pathology, top_k=top_k)
+    expected = reference.head(top_k)
+    for column in ('TP', 'TN', 'FP', 'FN', 'Total_Error'):
+        np.testing.assert_array_equal(results[column], expected[column].to_numpy())
+    assert results.summary['count'] == len(reference)
+    assert results.summary['exact_matches'] == int(reference['Exact_Match'].sum())
+    assert results.summary['min'] == reference['Total_Error'].min()
+
+
+def test_kernel_leaves_global_rng_alone(uncompiled):
+    np.random.seed(1)
+    expected = np.random.random()
+    np.random.seed(1)
+    # A reservoir smaller than the space exercises the random replacement.
+    JitKernels._fused_top_k(0, 0.5, 0.5, 12, -1, 3, 1e-6, np.empty(10), 0)
+    assert np.random.random() == expected
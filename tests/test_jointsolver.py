@@ -0,0 +1,26 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import JointSolver
+
+
+def _counts(results):
+    return set(zip(*(column.tolist() for column in results.counts())))
+
+
+def test_infinite_likelihood_ratio_matches_perfect_specificity():
+    results = JointSolver.solve_metrics({'PLR': np.inf, 'NLR': 0.2}, 20)
+    assert (4, 15, 0, 1) in _counts(results)
+    assert (8, 10, 0, 2) in _counts(results)
+    assert np.all(results['PLR_Error'] == 0)
+    assert np.all(results['FP'] == 0)
+    assert results['Exact_Match'].all()
+
+
+def test_finite_metrics_unchanged():
+    results = JointSolver.solve_metrics({'Sensitivity': 0.8, 'Specificity': 0.9}, 20, n_pathology=10)
+    assert _counts(results) == {(8, 9, 1, 2)}
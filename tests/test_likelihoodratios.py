@@ -0,0 +1,39 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import LikelihoodRatios
+
+
+def test_infinite_plr_ranks_exact_matches_first():
+    results = LikelihoodRatios.calculate_likelihoodratios(np.inf, 0.2, 20, method='margin', top_k=3)
+    assert list(zip(*(column.tolist() for column in results.counts()))) == [(4, 15, 0, 1), (8, 10, 0, 2),
+                                                                             (12, 5, 0, 3)]
+    assert results['Exact_Match'].all()
+
+
+@pytest.mark.parametrize('targets', [(np.inf, 0.2), (3.0, np.inf), (np.inf, np.inf)])
+@pytest.mark.parametrize('method', ['enumerate', 'margin', 'pruned'])
+def test_infinite_targets_match_reference(targets, method):
+    reference = LikelihoodRatios.calculate_likelihoodratios(*targets, 12, backend='python').head(8)
+    results = LikelihoodRatios.calculate_likelihoodratios(*targets, 12, method=method, top_k=8)
+    for column in ('TP', 'TN', 'FP', 'FN', 'Total_Error'):
+        np.testing.assert_array_equal(results[column], reference[column].to_numpy())
+
+
+def test_python_backend_returns_candidate_results():
+    reference = LikelihoodRatios.calculate_likelihoodratios(2.5, 0.4, 9, n_pathology=4, backend='python')
+    results = LikelihoodRatios.calculate_likelihoodratios(2.5, 0.4, 9, n_pathology=4)
+    assert type(reference) is type(results)
+    assert reference.columns == results.columns
+    for column in results.columns:
+        np.testing.assert_array_equal(reference[column], results[column])
+
+
+def test_python_backend_rejects_solver_options():
+    with pytest.raises(ValueError, match='method, top_k'):
+        LikelihoodRatios.calculate_likelihoodratios(2.5, 0.4, 9, backend='python', method='margin', top_k=3)
@@ -0,0 +1,31 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import CandidateEngine
+import ParallelSolver
+
+
+@pytest.fixture
+def always_parallel(monkeypatch):
+    monkeypatch.setattr(ParallelSolver, 'MIN_PARALLEL_CANDIDATES', 0)
+    monkeypatch.setattr(ParallelSolver, 'MIN_PARALLEL_MARGINS', 0)
+
+
+@pytest.mark.parametrize('pair, targets', [('snspn', (0.83, 0.61)), ('ppvnpv', (0.35, 0.9)), ('lr', (2.5, 0.4))])
+@pytest.mark.parametrize('method, n_pathology', [('enumerate', None), ('enumerate', 17), ('margin', None)])
+def test_sharded_result_equals_serial(always_parallel, pair, targets, method, n_pathology):
+    assert ParallelSolver.should_parallelize(method, pair, 40, n_pathology, 12, 3)
+    serial = CandidateEngine.solve_pair(pair, targets, 40, n_pathology=n_pathology, method=method, top_k=12)
+    sharded = CandidateEngine.solve_pair(pair, targets, 40, n_pathology=n_pathology, method=method, top_k=12,
+                                         workers=3, chunk_size=100)
+    for name in ('TP', 'TN', 'FP', 'FN', 'Total_Error'):
+        np.testing.assert_array_equal(sharded[name], serial[name])
+    if method == 'enumerate':
+        for name in ('count', 'exact_matches', 'min'):
+            assert sharded.summary[name] == serial.summary[name]
+        assert sharded.summary['mean'] == pytest.approx(serial.summary['mean'])
@@ -0,0 +1,113 @@
+import csv
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import BatchCLI
+import CandidateEngine
+import ShardRunner
+
+STUDIES = [
+    ('s0', 'snspn', 0.8, 0.6, 30, ''), ('s1', 'ppvnpv', 0.35, 0.9, 25, ''), ('s2', 'lr', 2.5, 0.4, 20, 8),
+    ('s3', 'bogus', 0.5, 0.5, 10, ''), ('s4', 'snspn', 0.2, 0.7, 12, 5), ('s5', 'lr', 4.0, 0.25, 30, ''),
+    ('s6', 'ppvnpv', 0.9, 0.95, 18, 6), ('s7', 'snspn', 1.0, 1.0, 3, ''), ('s8', 'snspn', 0.7, 0.8, 2, ''),
+]
+
+
+@pytest.fixture
+def studies(tmp_path):
+    path = tmp_path / 'studies.csv'
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'pair', 'value1', 'value2', 'n', 'n_pathology'])
+        writer.writerows(STUDIES)
+    return path
+
+
+def _run_nodes(spec_path, parts, nodes):
+    # One process per node, all at once, as on separate machines.
+    processes = [subprocess.Popen([sys.executable, str(ROOT / 'ShardRunner.py'), 'run', str(spec_path), str(parts),
+                                   '--node', str(node), '--nodes', str(nodes)], cwd=ROOT,
+                                  stderr=subprocess.PIPE) for node in range(nodes)]
+    for process in processes:
+        _, error = process.communicate(timeout=300)
+        assert process.returncode == 0, error.decode()
+
+
+def _batch_reference(studies, tmp_path, top_k):
+    reference = tmp_path / 'single.csv'
+    BatchCLI.run_batch(str(studies), str(reference), workers=0, top_k=top_k, resume=False)
+    return reference.read_bytes()
+
+
+def test_batch_processes_merge_to_single_node_output(studies, tmp_path):
+    spec = ShardRunner.make_batch_spec(studies, shards=5, top_k=4)
+    ShardRunner.save_spec(spec, tmp_path / 'job.json')
+    _run_nodes(tmp_path / 'job.json', tmp_path / 'parts', nodes=3)
+    ShardRunner.merge_shards(spec, tmp_path / 'parts', tmp_path / 'merged.csv')
+    assert (tmp_path / 'merged.csv').read_bytes() == _batch_reference(studies, tmp_path, 4)
+
+
+def test_truncated_batch_shard_resumes(studies, tmp_path):
+    spec = ShardRunner.make_batch_spec(studies, shards=2, top_k=4)
+    parts = tmp_path / 'parts'
+    ShardRunner.run_shards(spec, parts)
+    # A crash mid-write: no status file, and the shard's CSV cut inside a line.
+    records = parts / 'shard-00000.csv'
+    data = records.read_bytes()
+    assert data.count(b'\n') > 5
+    records.write_bytes(data[:len(data) * 2 // 3 + 5])
+    os.remove(parts / 'shard-00000.json')
+    assert ShardRunner.shard_status(spec, parts)[0] == 'partial'
+    assert ShardRunner.run_shards(spec, parts) == [0]
+    assert records.read_bytes() == data
+    ShardRunner.merge_shards(spec, parts, tmp_path / 'merged.csv')
+    assert (tmp_path / 'merged.csv').read_bytes() == _batch_reference(studies, tmp_path, 4)
+
+
+def _assert_same_rows(results, expected):
+    for name in ('TP', 'TN', 'FP', 'FN', 'Total_Error'):
+        np.testing.assert_array_equal(results[name], expected[name])
+
+
+@pytest.mark.parametrize('method, n_pathology', [('enumerate', None), ('enumerate', 20), ('margin', None)])
+def test_search_shards_merge_to_solve_pair(tmp_path, method, n_pathology):
+    spec = ShardRunner.make_search_spec('snspn', (0.83, 0.61), 60, shards=4, n_pathology=n_pathology,
+                                        method=method, top_k=15, chunk_size=500)
+    for node in range(2):
+        ShardRunner.run_shards(spec, tmp_path, node=node, nodes=2)
+    merged = ShardRunner.merge_shards(spec, tmp_path)
+    expected = CandidateEngine.solve_pair('snspn', (0.83, 0.61), 60, n_pathology=n_pathology, method=method,
+                                          top_k=15)
+    _assert_same_rows(merged, expected)
+
+
+def test_interrupted_search_resumes_from_checkpoint(tmp_path, monkeypatch):
+    spec = ShardRunner.make_search_spec('lr', (3.0, 0.3), 40, shards=1, top_k=10, chunk_size=200)
+    monkeypatch.setattr(ShardRunner, 'BLOCK_UNITS', 8)
+    write_json = ShardRunner._write_json
+    saves = []
+
+    def crash_after_two(path, data):
+        if len(saves) == 2:
+            raise KeyboardInterrupt
+        saves.append(data['next'])
+        write_json(path, data)
+
+    monkeypatch.setattr(ShardRunner, '_write_json', crash_after_two)
+    with pytest.raises(KeyboardInterrupt):
+        ShardRunner.run_shards(spec, tmp_path, checkpoint_seconds=0)
+    assert saves == [8, 16]
+    assert ShardRunner.shard_status(spec, tmp_path)[0] == 'partial'
+
+    monkeypatch.setattr(ShardRunner, '_write_json', write_json)
+    ShardRunner.run_shards(spec, tmp_path, checkpoint_seconds=0)
+    merged = ShardRunner.merge_shards(spec, tmp_path)
+    _assert_same_rows(merged, CandidateEngine.solve_pair('lr', (3.0, 0.3), 40, top_k=10, method='enumerate'))
@@ -0,0 +1,104 @@
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import SolverService
+
+
+@pytest.fixture
+def server(monkeypatch):
+    # Solves wait for the gate, so requests can be held in flight; n=13 fails.
+    gate = threading.Event()
+    run_job = SolverService.run_job
+
+    def gated(key, index_path=None):
+        gate.wait(30)
+        if key[0] != 'counts' and key[2] == 13:
+            raise RuntimeError("solver failed")
+        return run_job(key, index_path)
+
+    monkeypatch.setattr(SolverService, 'run_job', gated)
+    service = SolverService.SolverService(workers=1, max_pending=1)
+    server = SolverService.make_server(port=0, service=service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.gate = gate
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    gate.set()
+    server.shutdown()
+    server.server_close()
+    service.shutdown()
+
+
+def _request(server, path, body=None):
+    data = None if body is None else json.dumps(body).encode()
+    request = urllib.request.Request(server.url + path, data=data, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def _metrics(server):
+    return _request(server, '/metrics')[1]
+
+
+def _wait_for(server, **expected):
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        metrics = _metrics(server)
+        if all(metrics[name] == value for name, value in expected.items()):
+            return metrics
+        time.sleep(0.01)
+    raise AssertionError(f"metrics never reached {expected}: {metrics}")
+
+
+def test_coalescing_and_overload(server):
+    body = {'sensitivity': 0.8, 'specificity': 0.6, 'n': 20}
+    responses = []
+    clients = [threading.Thread(target=lambda: responses.append(_request(server, '/snspn', body)))
+               for _ in range(2)]
+    for client in clients:
+        client.start()
+    _wait_for(server, requests=2, in_flight=1)
+
+    status, error = _request(server, '/snspn', dict(body, n=21))
+    assert status == 503
+    assert 'pending' in error['error']
+
+    server.gate.set()
+    for client in clients:
+        client.join(30)
+    assert [status for status, _ in responses] == [200, 200]
+    assert responses[0][1] == responses[1][1]
+    metrics = _wait_for(server, in_flight=0)
+    assert (metrics['computed'], metrics['coalesced'], metrics['rejected']) == (1, 1, 1)
+
+
+def test_max_n_per_method(server):
+    limit = SolverService.MAX_N['enumerate']
+    status, error = _request(server, '/snspn', {'sensitivity': 0.8, 'specificity': 0.6, 'n': limit + 1,
+                                                'method': 'enumerate'})
+    assert status == 400
+    assert str(limit) in error['error']
+    assert _metrics(server)['requests'] == 0
+
+
+def test_failed_solve_not_counted_as_computed(server):
+    server.gate.set()
+    status, _ = _request(server, '/snspn', {'sensitivity': 0.8, 'specificity': 0.6, 'n': 13})
+    assert status == 500
+    status, _ = _request(server, '/counts', {'tp': 1, 'tn': 2, 'fp': 3, 'fn': 4})
+    assert status == 200
+    metrics = _wait_for(server, in_flight=0)
+    assert (metrics['failed'], metrics['computed']) == (1, 1)